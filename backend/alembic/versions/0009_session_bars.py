@@ -0,0 +1,55 @@
+"""Materialized per-session 1d and SESSION_ALIGNED_4H bars.
+
+Revision ID: 0009_session_bars
+Revises: 0008_merge_heads
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "0009_session_bars"
+down_revision = "0008_merge_heads"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+  op.create_table(
+    "session_bars",
+    sa.Column("source", sa.String(length=64), nullable=False),
+    sa.Column("symbol", sa.String(length=16), nullable=False),
+    sa.Column("timeframe", sa.String(length=8), nullable=False),
+    sa.Column("session_date", sa.Date(), nullable=False),
+    sa.Column("seq", sa.SmallInteger(), nullable=False, server_default="0"),
+    sa.Column("bar_start", sa.DateTime(timezone=True), nullable=False),
+    sa.Column("bar_end", sa.DateTime(timezone=True), nullable=False),
+    sa.Column("o", sa.Float(), nullable=True),
+    sa.Column("h", sa.Float(), nullable=True),
+    sa.Column("l", sa.Float(), nullable=True),
+    sa.Column("c", sa.Float(), nullable=True),
+    sa.Column("v", sa.Float(), nullable=True),
+    sa.Column("decision_close", sa.Float(), nullable=True),
+    sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    # Leading (source, symbol) + session_date serves the engine's range read directly.
+    sa.PrimaryKeyConstraint("source", "symbol", "session_date", "timeframe", "seq", name="pk_session_bars"),
+    schema="public",
+  )
+
+  op.execute(
+    """
+    ALTER TABLE public.session_bars ENABLE ROW LEVEL SECURITY;
+    DROP POLICY IF EXISTS session_bars_no_client_access ON public.session_bars;
+    CREATE POLICY session_bars_no_client_access ON public.session_bars
+      FOR ALL USING (false) WITH CHECK (false);
+    GRANT SELECT, INSERT, UPDATE, DELETE ON TABLE public.session_bars TO vibe_backend;
+    """
+  )
+
+
+def downgrade() -> None:
+  op.execute("DROP POLICY IF EXISTS session_bars_no_client_access ON public.session_bars;")
+  op.drop_table("session_bars", schema="public")
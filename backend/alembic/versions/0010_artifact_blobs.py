@@ -0,0 +1,52 @@
+"""Content-addressed artifact blobs referenced from run_artifacts.
+
+Revision ID: 0010_artifact_blobs
+Revises: 0009_session_bars
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0010_artifact_blobs"
+down_revision = "0009_session_bars"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+  op.create_table(
+    "artifact_blobs",
+    sa.Column("hash", sa.String(length=64), primary_key=True, nullable=False),
+    sa.Column("size_bytes", sa.BigInteger(), nullable=False),
+    sa.Column("content", postgresql.JSONB(), nullable=True),
+    sa.Column("uri", sa.Text(), nullable=True),
+    sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    schema="public",
+  )
+  # Existing rows keep their inline content / storage uri; new rows reference blobs instead.
+  op.add_column("run_artifacts", sa.Column("blob_hash", sa.String(length=64), nullable=True))
+  op.add_column("run_artifacts", sa.Column("parts", postgresql.JSONB(), nullable=True))
+  op.create_foreign_key("fk_run_artifacts_blob_hash", "run_artifacts", "artifact_blobs", ["blob_hash"], ["hash"])
+
+  op.execute(
+    """
+    ALTER TABLE public.artifact_blobs ENABLE ROW LEVEL SECURITY;
+    DROP POLICY IF EXISTS artifact_blobs_no_client_access ON public.artifact_blobs;
+    CREATE POLICY artifact_blobs_no_client_access ON public.artifact_blobs
+      FOR ALL USING (false) WITH CHECK (false);
+    GRANT SELECT, INSERT, UPDATE, DELETE ON TABLE public.artifact_blobs TO vibe_backend;
+    """
+  )
+
+
+def downgrade() -> None:
+  op.drop_constraint("fk_run_artifacts_blob_hash", "run_artifacts", type_="foreignkey")
+  op.drop_column("run_artifacts", "parts")
+  op.drop_column("run_artifacts", "blob_hash")
+  op.execute("DROP POLICY IF EXISTS artifact_blobs_no_client_access ON public.artifact_blobs;")
+  op.drop_table("artifact_blobs", schema="public")
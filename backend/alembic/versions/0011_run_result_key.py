@@ -0,0 +1,27 @@
+"""Result cache key on runs.
+
+Revision ID: 0011_run_result_key
+Revises: 0010_artifact_blobs
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "0011_run_result_key"
+down_revision = "0010_artifact_blobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+  op.add_column("runs", sa.Column("result_key", sa.String(length=64), nullable=True))
+  op.create_index("ix_runs_result_key_state", "runs", ["result_key", "state"])
+
+
+def downgrade() -> None:
+  op.drop_index("ix_runs_result_key_state", table_name="runs")
+  op.drop_column("runs", "result_key")
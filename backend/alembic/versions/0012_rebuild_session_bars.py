@@ -0,0 +1,28 @@
+"""Drop materialized session bars computed with half-open sessions.
+
+Sessions include the bar stamped at the close again, so stored closes are stale; the refresh job
+rebuilds them from minute data.
+
+Revision ID: 0012_rebuild_session_bars
+Revises: 0011_run_result_key
+Create Date: 2026-10-19
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "0012_rebuild_session_bars"
+down_revision = "0011_run_result_key"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+  op.execute("DELETE FROM public.session_bars;")
+
+
+def downgrade() -> None:
+  # Derived data; nothing to restore.
+  pass
@@ -6,6 +6,9 @@ import redis.asyncio as redis
 
 from app.core.config import settings
 from app.db.engine import SessionLocal
+from app.services.bar_cache import bar_cache_stats
+from app.services.market_data import market_data_http_stats
+from app.services.rate_limiter import rate_limiter_stats
 
 
 router = APIRouter()
@@ -40,4 +43,7 @@ async def health_deps() -> dict[str, object]:
     "database": db_status,
     "redis": redis_status,
     "market_data_provider": settings.market_data_provider,
+    "market_data_cache": bar_cache_stats(),
+    "market_data_http": market_data_http_stats(),
+    "market_data_rate_limits": rate_limiter_stats(),
   }
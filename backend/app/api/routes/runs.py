@@ -10,6 +10,7 @@ from pydantic import BaseModel
 from fastapi.responses import ORJSONResponse
 from fastapi.responses import PlainTextResponse
 from fastapi.responses import RedirectResponse
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -29,7 +30,10 @@ from app.schemas.contracts import (
   WorkspaceStep,
 )
 from app.services.run_service import create_run, execute_run
-from app.services.storage_service import create_signed_url, download_bytes, download_json, parse_storage_uri
+from app.services.artifact_store import load_artifact_contents, render_trades_csv
+from app.services.run_control import request_cancel
+from app.services.run_events import RunEventSubscription, poll_run_state, run_events_enabled
+from app.services.storage_service import create_signed_url, download_bytes, parse_storage_uri
 from app.services.task_queue import enqueue_run_job_async
 from app.services.user_service import ensure_user_from_claims
 
@@ -37,12 +41,9 @@ from app.services.user_service import ensure_user_from_claims
 router = APIRouter()
 
 
-async def _load_artifact_json(art: RunArtifact) -> dict[str, Any] | None:
-  if isinstance(art.content, dict):
-    return art.content
-  if parse_storage_uri(art.uri) is None:
-    return None
-  return await download_json(art.uri)
+async def _load_artifact_json(db: AsyncSession, art: RunArtifact) -> dict[str, Any] | None:
+  [content] = await load_artifact_contents(db, [art])
+  return content if isinstance(content, dict) else None
 
 
 async def _load_artifact_bytes(art: RunArtifact) -> bytes | None:
@@ -111,12 +112,9 @@ async def _get_user_owned_run(
   return run
 
 
-@router.get("/{run_id}/status", response_model=RunStatusResponse)
-async def get_status(run_id: uuid.UUID, db: AsyncSession = Depends(get_db), claims: tuple[str, dict[str, Any]] = Depends(get_auth_claims)) -> RunStatusResponse:
-  run = await _get_user_owned_run(db, run_id, claims)
-
-  steps = (await db.execute(select(RunStep).where(RunStep.run_id == run_id))).scalars().all()
-  artifacts = (await db.execute(select(RunArtifact).where(RunArtifact.run_id == run_id).order_by(RunArtifact.created_at.asc()))).scalars().all()
+async def _status_response(db: AsyncSession, run: Run) -> RunStatusResponse:
+  steps = (await db.execute(select(RunStep).where(RunStep.run_id == run.id))).scalars().all()
+  artifacts = (await db.execute(select(RunArtifact).where(RunArtifact.run_id == run.id).order_by(RunArtifact.created_at.asc()))).scalars().all()
 
   step_order = {"parse": 0, "plan": 1, "data": 2, "backtest": 3, "report": 4, "deploy": 5}
   steps.sort(key=lambda s: step_order.get(s.step_id, 999))
@@ -131,6 +129,32 @@ async def get_status(run_id: uuid.UUID, db: AsyncSession = Depends(get_db), clai
   return RunStatusResponse(run_id=str(run.id), state=run.state, steps=ws_steps, artifacts=art_refs)  # type: ignore[arg-type]
 
 
+@router.get("/{run_id}/status", response_model=RunStatusResponse)
+async def get_status(run_id: uuid.UUID, db: AsyncSession = Depends(get_db), claims: tuple[str, dict[str, Any]] = Depends(get_auth_claims)) -> RunStatusResponse:
+  run = await _get_user_owned_run(db, run_id, claims)
+  return await _status_response(db, run)
+
+
+@router.get("/{run_id}/events", response_model=None)
+async def get_events(run_id: uuid.UUID, db: AsyncSession = Depends(get_db), claims: tuple[str, dict[str, Any]] = Depends(get_auth_claims)) -> StreamingResponse:
+  run = await _get_user_owned_run(db, run_id, claims)
+  if not run_events_enabled():
+    raise AppError("CONFIG_ERROR", "run event stream is disabled", {"run_id": str(run_id)}, http_status=503)
+  # Subscribe first: events published while the snapshot is read are delivered after it.
+  subscription = RunEventSubscription(run_id)
+  try:
+    await subscription.open()
+    snapshot = (await _status_response(db, run)).model_dump(mode="json")
+  except Exception:
+    await subscription.close()
+    raise
+  return StreamingResponse(
+    subscription.stream(snapshot, poll=lambda: poll_run_state(run_id)),
+    media_type="text/event-stream",
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+  )
+
+
 @router.get("/{run_id}/report", response_model=None)
 async def get_report(
   run_id: uuid.UUID,
@@ -145,7 +169,7 @@ async def get_report(
   if art is None:
     raise AppError("DATA_UNAVAILABLE", "report not ready", {"run_id": str(run_id)}, http_status=404)
 
-  report_content = await _load_artifact_json(art)
+  report_content = await _load_artifact_json(db, art)
   if report_content is None:
     raise AppError("DATA_UNAVAILABLE", "report not ready", {"run_id": str(run_id)}, http_status=404)
 
@@ -153,11 +177,7 @@ async def get_report(
     trades = report_content.get("trades") if isinstance(report_content, dict) else None
     if not isinstance(trades, list):
       return PlainTextResponse("", media_type="text/csv")
-    rows = ["decision_time,fill_time,symbol,side,qty,fill_price"]
-    for t in trades:
-      if isinstance(t, dict):
-        rows.append(f"{t.get('decision_time','')},{t.get('fill_time','')},{t.get('symbol','')},{t.get('side','')},{t.get('qty','')},{t.get('fill_price','')}")
-    return PlainTextResponse("\n".join(rows), media_type="text/csv")
+    return PlainTextResponse(render_trades_csv(trades), media_type="text/csv")
   return BacktestReportResponse.model_validate(report_content)
 
 
@@ -192,36 +212,32 @@ async def get_history(db: AsyncSession = Depends(get_db), claims: tuple[str, dic
 
   kpis_rows = (
     await db.execute(
-      select(RunArtifact.run_id, RunArtifact.name, RunArtifact.content, RunArtifact.uri).where(
+      select(RunArtifact.run_id, RunArtifact.name, RunArtifact.content, RunArtifact.uri, RunArtifact.blob_hash, RunArtifact.parts).where(
         RunArtifact.run_id.in_(run_ids),
         RunArtifact.name.in_(["kpis.json", "report.json"]),
       )
     )
   ).all()
+  # kpis.json when present; report.json only for runs without one (it is far larger).
+  kpis_source: dict[uuid.UUID, Any] = {}
+  for row in kpis_rows:
+    if row.name == "kpis.json" or row.run_id not in kpis_source:
+      kpis_source[row.run_id] = row
+  sources = list(kpis_source.values())
+  try:
+    contents = await load_artifact_contents(db, sources)
+  except Exception:
+    contents = [None] * len(sources)
   kpis_by_run_id: dict[uuid.UUID, BacktestKpis | None] = {}
-  for run_id_value, name, content, uri in kpis_rows:
-    if run_id_value in kpis_by_run_id and kpis_by_run_id[run_id_value] is not None:
-      continue
-
-    resolved_content: dict[str, Any] | None = content if isinstance(content, dict) else None
-    if resolved_content is None and isinstance(uri, str) and parse_storage_uri(uri) is not None:
-      try:
-        resolved_content = await download_json(uri)
-      except Exception:
-        resolved_content = None
+  for row, resolved_content in zip(sources, contents):
     if not isinstance(resolved_content, dict):
       continue
-
     try:
-      if name == "kpis.json":
-        raw = resolved_content.get("kpis")
-      else:
-        raw = resolved_content.get("kpis")
+      raw = resolved_content.get("kpis")
       if isinstance(raw, dict):
-        kpis_by_run_id[run_id_value] = BacktestKpis.model_validate(raw)
+        kpis_by_run_id[row.run_id] = BacktestKpis.model_validate(raw)
     except Exception:
-      if run_id_value not in kpis_by_run_id:
-        kpis_by_run_id[run_id_value] = None
+      kpis_by_run_id[row.run_id] = None
 
   out: list[RunHistoryEntry] = []
   for r in runs:
@@ -263,12 +279,18 @@ async def get_artifact(
       return error_response("DATA_UNAVAILABLE", "artifact signed url unavailable", {"run_id": str(run_id), "name": name}, status=404)
     return RedirectResponse(signed, status_code=307)
 
-  if art.type == "csv" and isinstance(art.content, dict) and isinstance(art.content.get("csv"), str):
-    return PlainTextResponse(art.content["csv"], media_type="text/csv")
-  if art.type == "markdown" and isinstance(art.content, dict) and isinstance(art.content.get("markdown"), str):
-    return PlainTextResponse(art.content["markdown"], media_type="text/markdown")
-
-  if parse_storage_uri(art.uri) is not None and art.content is None:
+  content: Any = art.content
+  if art.blob_hash or art.parts:
+    [content] = await load_artifact_contents(db, [art])
+  if art.type == "csv" and isinstance(content, dict):
+    if isinstance(content.get("csv"), str):
+      return PlainTextResponse(content["csv"], media_type="text/csv")
+    if isinstance(content.get("trades"), list):
+      return PlainTextResponse(render_trades_csv(content["trades"]), media_type="text/csv")
+  if art.type == "markdown" and isinstance(content, dict) and isinstance(content.get("markdown"), str):
+    return PlainTextResponse(content["markdown"], media_type="text/markdown")
+
+  if parse_storage_uri(art.uri) is not None and content is None:
     if art.type in ("csv", "markdown"):
       payload = await _load_artifact_bytes(art)
       if payload is None:
@@ -276,12 +298,12 @@ async def get_artifact(
       media_type = "text/csv" if art.type == "csv" else "text/markdown"
       return PlainTextResponse(payload.decode("utf-8"), media_type=media_type)
 
-    json_payload = await _load_artifact_json(art)
+    json_payload = await _load_artifact_json(db, art)
     if json_payload is None:
       return ORJSONResponse({"name": art.name, "type": art.type, "uri": art.uri, "content": None})
     return ORJSONResponse({"name": art.name, "type": art.type, "uri": art.uri, "content": json_payload})
 
-  return ORJSONResponse({"name": art.name, "type": art.type, "uri": art.uri, "content": art.content})
+  return ORJSONResponse({"name": art.name, "type": art.type, "uri": art.uri, "content": content})
 
 
 class DeployRequest(BaseModel):
@@ -292,3 +314,13 @@ class DeployRequest(BaseModel):
 async def deploy(run_id: uuid.UUID, _: DeployRequest, db: AsyncSession = Depends(get_db), claims: tuple[str, dict[str, Any]] = Depends(get_auth_claims)) -> dict[str, str]:
   await _get_user_owned_run(db, run_id, claims)
   return {"deployId": str(run_id), "status": "queued"}
+
+
+@router.post("/{run_id}/cancel")
+async def cancel(run_id: uuid.UUID, db: AsyncSession = Depends(get_db), claims: tuple[str, dict[str, Any]] = Depends(get_auth_claims)) -> dict[str, str]:
+  run = await _get_user_owned_run(db, run_id, claims)
+  if run.state != "running":
+    return {"run_id": str(run_id), "state": run.state}
+  # The run stops at its next checkpoint and then reports state "cancelled".
+  await request_cancel(run_id)
+  return {"run_id": str(run_id), "state": "cancelling"}
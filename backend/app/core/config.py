@@ -15,8 +15,23 @@ class Settings(BaseSettings):
   redis_url: str = "redis://localhost:6379/0"
   task_queue_enabled: bool = False
   task_queue_name: str = "vibe-runs"
+  task_queue_background_name: str = "vibe-background"
   task_queue_job_timeout_seconds: int = 7200
   task_queue_recovery_lookback_hours: int = 24
+  run_step_flush_interval_ms: int = 500
+  run_step_max_logs: int = 200
+  result_cache_enabled: bool = True
+  result_cache_version: str = "3"
+  result_cache_attach_timeout_seconds: int = 900
+  result_cache_stale_seconds: int = 120
+  run_deadline_base_seconds: int = 300
+  run_deadline_seconds_per_year: int = 300
+  run_cancel_poll_ms: int = 250
+  run_events_enabled: bool = True
+  run_events_db_flush_interval_ms: int = 30000
+  run_events_progress_interval_ms: int = 50
+  run_events_heartbeat_seconds: int = 15
+  run_events_stream_max_seconds: int = 3600
 
   supabase_secret_key: str | None = Field(default=None, validation_alias=AliasChoices("SUPABASE_SECRET_KEY"))
   supabase_project_url: str | None = None
@@ -28,6 +43,7 @@ class Settings(BaseSettings):
   supabase_storage_enabled: bool = False
   supabase_storage_bucket: str = "run-artifacts"
   supabase_storage_signed_url_ttl_seconds: int = 3600
+  supabase_storage_upload_concurrency: int = 4
 
   llm_base_url: AnyHttpUrl = "https://api.openai.com/v1"
   llm_api_key: str | None = Field(default=None, validation_alias=AliasChoices("LLM_API_KEY", "OPENAI_API_KEY"))
@@ -39,11 +55,41 @@ class Settings(BaseSettings):
 
   market_data_provider: str = "alpaca"
   polygon_api_key: str | None = None
+  market_data_file_dir: str | None = None
   alpaca_data_base_url: AnyHttpUrl = "https://data.alpaca.markets"
   alpaca_data_feed: str = "iex"
   alpaca_paper_api_endpoint: AnyHttpUrl = "https://paper-api.alpaca.markets"
   alpaca_paper_api_key: str | None = None
   alpaca_paper_api_secret: str | None = None
+  market_data_fetch_concurrency: int = 4
+  market_data_shard_months: int = 1
+  market_data_shard_concurrency: int = 4
+  market_data_http_timeout_seconds: float = 30.0
+  market_data_http_max_connections: int = 20
+  market_data_http_max_keepalive_connections: int = 10
+  market_data_http_keepalive_expiry_seconds: float = 60.0
+  market_data_http2: bool = False
+  alpaca_rate_limit_per_minute: int = 200
+  polygon_rate_limit_per_minute: int = 5
+  market_data_shared_rate_limit_enabled: bool = True
+  market_data_cache_enabled: bool = True
+  market_data_cache_dir: str = ".cache/market_data"
+  market_data_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
+  market_data_cache_compact: bool = True
+  market_data_cache_today_ttl_seconds: int = 300
+  market_data_redis_cache_enabled: bool = False
+  market_data_redis_cache_ttl_seconds: int = 7 * 24 * 3600
+  calendar_cache_dir: str = ".cache/calendar"
+  data_health_gap_minutes: int = 15
+  data_health_zero_volume_minutes: int = 10
+  data_health_stale_minutes: int = 30
+  session_bars_enabled: bool = True
+  session_bars_backfill_start: str = "2019-01-01"
+  cache_warm_enabled: bool = True
+  cache_warm_top_symbols: int = 30
+  cache_warm_strategy_lookback_days: int = 30
+  cache_warm_lookback_days: int = 400
+  cache_warm_delay_minutes: int = 20
 
   allowed_origins: str = "http://localhost:5173"
   allowed_origin_regex: str | None = None
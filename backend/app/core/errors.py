@@ -17,6 +17,13 @@ class AppError(Exception):
   http_status: int = 400
 
 
+class RunCancelled(Exception):
+  # Raised at run checkpoints once a cancel was requested or the run's deadline passed.
+  def __init__(self, reason: Literal["cancelled", "deadline"]) -> None:
+    super().__init__(reason)
+    self.reason = reason
+
+
 def error_response(code: ErrorCode, message: str, details: dict[str, Any] | None = None, status: int = 400) -> ORJSONResponse:
   payload: dict[str, Any] = {"code": code, "message": message}
   if details is not None:
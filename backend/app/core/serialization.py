@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+import orjson
+from pydantic import BaseModel
+
+# One JSON encoder for everything the backend persists or uploads. orjson handles datetimes, UUIDs,
+# dataclasses, numpy arrays and scalars, and int keys natively, so payloads are written to bytes in
+# one pass instead of being rebuilt as plain Python first (as jsonable_encoder does). Non-finite
+# floats become null, which JSONB accepts; datetimes keep isoformat() output.
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+  if isinstance(value, BaseModel):
+    return value.model_dump(mode="json")
+  if isinstance(value, Decimal):
+    return int(value) if value == value.to_integral_value() else float(value)
+  if isinstance(value, (set, frozenset)):
+    return list(value)
+  # numpy scalar kinds orjson leaves out (e.g. longdouble, datetime64 scalars).
+  if isinstance(value, np.floating):
+    return float(value)
+  if isinstance(value, np.generic):
+    return value.item()
+  raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any, *, sort_keys: bool = False) -> bytes:
+  # sort_keys gives a canonical form for hashing.
+  return orjson.dumps(value, default=_default, option=(ORJSON_OPTIONS | orjson.OPT_SORT_KEYS) if sort_keys else ORJSON_OPTIONS)
+
+
+def loads(payload: bytes | bytearray | memoryview | str) -> Any:
+  return orjson.loads(payload)
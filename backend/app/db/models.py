@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from typing import Any, Literal
 
-from sqlalchemy import JSON, DateTime, ForeignKey, Index, String, Text, Uuid
+from sqlalchemy import JSON, BigInteger, Date, DateTime, Float, ForeignKey, Index, SmallInteger, String, Text, Uuid
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -62,6 +62,8 @@ class Run(Base):
   mode: Mapped[str] = mapped_column(String(16), nullable=False)
   state: Mapped[str] = mapped_column(String(16), nullable=False, default="running")
   error: Mapped[dict[str, Any] | None] = mapped_column(JsonType, nullable=True)
+  # Hash of everything that determines the backtest result; set once the run starts executing.
+  result_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
   created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
   updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, nullable=False)
 
@@ -71,6 +73,8 @@ class Run(Base):
   artifacts: Mapped[list["RunArtifact"]] = relationship(back_populates="run", cascade="all, delete-orphan")
   trades: Mapped[list["Trade"]] = relationship(back_populates="run", cascade="all, delete-orphan")
 
+  __table_args__ = (Index("ix_runs_result_key_state", "result_key", "state"),)
+
 
 class RunStep(Base):
   __tablename__ = "run_steps"
@@ -98,6 +102,9 @@ class RunArtifact(Base):
   type: Mapped[str] = mapped_column(String(32), nullable=False)
   uri: Mapped[str] = mapped_column(Text, nullable=False)
   content: Mapped[dict[str, Any] | None] = mapped_column(JsonType, nullable=True)
+  # Content-addressed payload: either one blob, or named parts assembled into a dict on read.
+  blob_hash: Mapped[str | None] = mapped_column(ForeignKey("artifact_blobs.hash"), nullable=True)
+  parts: Mapped[dict[str, str] | None] = mapped_column(JsonType, nullable=True)
   created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
 
   run: Mapped["Run"] = relationship(back_populates="artifacts")
@@ -105,6 +112,18 @@ class RunArtifact(Base):
   __table_args__ = (Index("ix_run_artifacts_run_id_name", "run_id", "name", unique=True),)
 
 
+class ArtifactBlob(Base):
+  __tablename__ = "artifact_blobs"
+
+  # Serialized artifact values keyed by the blake2b-256 of their bytes, shared by every run that
+  # produces them. The payload lives inline (content) or in object storage (uri).
+  hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+  size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+  content: Mapped[Any | None] = mapped_column(JsonType, nullable=True)
+  uri: Mapped[str | None] = mapped_column(Text, nullable=True)
+  created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
 class Trade(Base):
   __tablename__ = "trades"
 
@@ -122,3 +141,24 @@ class Trade(Base):
   created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
 
   run: Mapped["Run"] = relationship(back_populates="trades")
+
+
+class SessionBar(Base):
+  __tablename__ = "session_bars"
+
+  # One 1d row per XNYS session and one 4h row per SESSION_ALIGNED_4H segment (seq 0/1).
+  # Sessions without bars are kept with NULL prices so stored ranges are known to be complete.
+  source: Mapped[str] = mapped_column(String(64), primary_key=True)
+  symbol: Mapped[str] = mapped_column(String(16), primary_key=True)
+  timeframe: Mapped[str] = mapped_column(String(8), primary_key=True)
+  session_date: Mapped[date] = mapped_column(Date, primary_key=True)
+  seq: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=0)
+  bar_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+  bar_end: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+  o: Mapped[float | None] = mapped_column(Float, nullable=True)
+  h: Mapped[float | None] = mapped_column(Float, nullable=True)
+  l: Mapped[float | None] = mapped_column(Float, nullable=True)
+  c: Mapped[float | None] = mapped_column(Float, nullable=True)
+  v: Mapped[float | None] = mapped_column(Float, nullable=True)
+  decision_close: Mapped[float | None] = mapped_column(Float, nullable=True)
+  updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, nullable=False)
@@ -8,6 +8,7 @@ from app.core.auth import attach_auth_claims
 from app.core.config import settings
 from app.core.errors import AppError, app_error_handler, unhandled_error_handler
 from app.core.logging import configure_logging
+from app.services.market_data import aclose_market_data_providers, get_market_data_provider
 from app.services.task_queue import recover_running_runs
 
 def create_app() -> FastAPI:
@@ -38,6 +39,18 @@ def create_app() -> FastAPI:
       # Keep API startup resilient even when queue infra is unavailable.
       pass
 
+  @app.on_event("startup")
+  async def _startup_market_data() -> None:
+    try:
+      get_market_data_provider()
+    except Exception:
+      # Misconfigured vendors surface per run; don't block API startup.
+      pass
+
+  @app.on_event("shutdown")
+  async def _shutdown_market_data() -> None:
+    await aclose_market_data_providers()
+
   return app
 
 
@@ -52,7 +52,7 @@ class CreateRunResponse(BaseModel):
 
 class RunStatusResponse(BaseModel):
   run_id: str
-  state: Literal["running", "completed", "failed"]
+  state: Literal["running", "completed", "failed", "cancelled"]
   steps: list[WorkspaceStep]
   artifacts: list[ArtifactRef] = Field(default_factory=list)
 
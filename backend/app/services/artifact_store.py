@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import LargeBinary, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.serialization import dumps, loads
+from app.db.models import ArtifactBlob
+from app.services.storage_service import download_bytes, download_json, parse_storage_uri, storage_enabled, upload_blob
+
+# Artifact values are stored once per content hash in artifact_blobs (inline JSONB, or an object under
+# blobs/ when storage is enabled); run_artifacts rows only reference them. Values shared between
+# artifacts of a run (kpis, trades, divergences, the AI summary) and between runs (identical specs,
+# re-runs of identical work) are written once.
+
+
+@dataclass(frozen=True)
+class ArtifactParts:
+  # An artifact assembled on read into {name: value}, each value stored as its own blob.
+  values: dict[str, Any]
+
+
+def blob_hash(payload: bytes) -> str:
+  return hashlib.blake2b(payload, digest_size=32).hexdigest()
+
+
+class BlobWriter:
+  # Collects the blobs for a batch of artifacts. A value object handed over twice (e.g. the trades
+  # list in report.json and trades.csv) is serialized once.
+  def __init__(self) -> None:
+    self.payloads: dict[str, bytes] = {}
+    self._by_id: dict[int, tuple[Any, str]] = {}
+
+  def _add(self, value: Any) -> str:
+    seen = self._by_id.get(id(value))
+    if seen is not None and seen[0] is value:
+      return seen[1]
+    payload = dumps(value)
+    hash_ = blob_hash(payload)
+    self.payloads.setdefault(hash_, payload)
+    self._by_id[id(value)] = (value, hash_)
+    return hash_
+
+  def ref(self, content: Any) -> tuple[str | None, dict[str, str] | None]:
+    # (blob_hash, parts) for a run_artifacts row.
+    if content is None:
+      return None, None
+    if isinstance(content, ArtifactParts):
+      return None, {name: self._add(value) for name, value in content.values.items()}
+    return self._add(content), None
+
+  async def flush(self, db: AsyncSession) -> int:
+    # Writes the blobs not stored yet, in the caller's transaction. Returns how many were new.
+    if not self.payloads:
+      return 0
+    existing = set((await db.execute(select(ArtifactBlob.hash).where(ArtifactBlob.hash.in_(list(self.payloads))))).scalars().all())
+    new = {hash_: payload for hash_, payload in self.payloads.items() if hash_ not in existing}
+    if not new:
+      return 0
+    uris: dict[str, str | None] = {}
+    if storage_enabled():
+      limit = asyncio.Semaphore(max(1, settings.supabase_storage_upload_concurrency))
+
+      async def _upload(hash_: str, payload: bytes) -> tuple[str, str | None]:
+        async with limit:
+          return hash_, await upload_blob(hash_, payload)
+
+      uris = dict(await asyncio.gather(*(_upload(hash_, payload) for hash_, payload in new.items())))
+    now = datetime.now(timezone.utc)
+    rows = [
+      {
+        "hash": hash_,
+        "size_bytes": len(payload),
+        # Inline payloads are bound as bytea and parsed server-side, so they are never re-encoded.
+        "content": None if uris.get(hash_) else cast(func.convert_from(literal(payload, LargeBinary), "UTF8"), JSONB),
+        "uri": uris.get(hash_),
+        "created_at": now,
+      }
+      for hash_, payload in new.items()
+    ]
+    # Concurrent runs producing the same blob race harmlessly.
+    await db.execute(pg_insert(ArtifactBlob).values(rows).on_conflict_do_nothing(index_elements=[ArtifactBlob.hash]))
+    return len(new)
+
+
+async def _download_value(uri: str) -> Any | None:
+  payload = await download_bytes(uri)
+  if payload is None:
+    return None
+  try:
+    return loads(payload)
+  except Exception:
+    return None
+
+
+async def _load_blobs(db: AsyncSession, hashes: set[str]) -> dict[str, Any]:
+  rows = (await db.execute(select(ArtifactBlob.hash, ArtifactBlob.content, ArtifactBlob.uri).where(ArtifactBlob.hash.in_(list(hashes))))).all()
+  blobs = {hash_: content for hash_, content, uri in rows if uri is None}
+  remote = [(hash_, uri) for hash_, _, uri in rows if uri is not None]
+  values = await asyncio.gather(*(_download_value(uri) for _, uri in remote))
+  for (hash_, _), value in zip(remote, values):
+    if value is not None:
+      blobs[hash_] = value
+  return blobs
+
+
+async def load_artifact_contents(db: AsyncSession, artifacts: list[Any]) -> list[Any | None]:
+  # Resolves run_artifacts rows (ORM objects or rows with content/uri/blob_hash/parts) to their
+  # content, fetching every referenced blob in one query. Rows written before blobs existed keep
+  # their inline content or per-run storage object.
+  hashes: set[str] = set()
+  for art in artifacts:
+    if art.parts:
+      hashes.update(art.parts.values())
+    elif art.blob_hash:
+      hashes.add(art.blob_hash)
+  blobs = await _load_blobs(db, hashes) if hashes else {}
+
+  out: list[Any | None] = []
+  for art in artifacts:
+    if art.parts:
+      missing = any(hash_ not in blobs for hash_ in art.parts.values())
+      out.append(None if missing else {name: blobs[hash_] for name, hash_ in art.parts.items()})
+    elif art.blob_hash:
+      out.append(blobs.get(art.blob_hash))
+    elif art.content is not None:
+      out.append(art.content)
+    elif isinstance(art.uri, str) and parse_storage_uri(art.uri) is not None:
+      out.append(await download_json(art.uri))
+    else:
+      out.append(None)
+  return out
+
+
+def render_trades_csv(trades: list[Any]) -> str:
+  rows = ["decision_time,fill_time,symbol,side,qty,fill_price"]
+  for t in trades:
+    if isinstance(t, dict):
+      rows.append(f"{t.get('decision_time','')},{t.get('fill_time','')},{t.get('symbol','')},{t.get('side','')},{t.get('qty','')},{t.get('fill_price','')}")
+  return "\n".join(rows)
@@ -1,16 +1,48 @@
 from __future__ import annotations
 
+import asyncio
+from bisect import bisect_right
 from collections.abc import Awaitable, Callable
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Any
 import math
 
-import exchange_calendars as xcals
 import numpy as np
 
-from app.core.errors import AppError
-from app.services.market_data import MinuteBar, compute_data_health, get_market_data_provider
+from app.core.errors import AppError, RunCancelled
+from app.services.data_health import analyze_bars
+from app.services.market_data import fetch_bar_arrays, from_epoch_ns, get_market_data_provider
+from app.services.session_bars import SessionBarStore, SessionFrame, build_session_schedule, session_edge_windows, summarize_sessions
+
+
+# 30-minute buckets line up with XNYS opens, 4h splits and closes (09:30, 13:30, 16:00 ET). With
+# the minute bars of a short window per session (the 4h split through the close) added, session
+# candles, segments and decision prices come out identical to the minute path.
+COARSE_BAR_MINUTES = 30
+_COARSE_TIMEFRAMES = frozenset({"1d", "4h"})
+# Trades handed to trade_hook per call, so long backtests write them while still running.
+TRADE_HOOK_BATCH = 500
+
+
+@dataclass(frozen=True)
+class DataRequirements:
+  bar_minutes: int
+
+
+def analyze_data_requirements(strategy_spec: dict[str, Any]) -> DataRequirements:
+  # Specs reading only session candles and 4h segment closes run on coarse bars; any minute
+  # timeframe indicator needs every minute bar.
+  signal_layer = ((strategy_spec.get("dsl") or {}).get("signal") or {})
+  indicators = signal_layer.get("indicators") if isinstance(signal_layer, dict) else None
+  tfs = {
+    str(ind.get("tf") or "").strip().lower()
+    for ind in (indicators if isinstance(indicators, list) else [])
+    if isinstance(ind, dict)
+  }
+  if tfs <= _COARSE_TIMEFRAMES:
+    return DataRequirements(bar_minutes=COARSE_BAR_MINUTES)
+  return DataRequirements(bar_minutes=1)
 
 
 @dataclass(frozen=True)
@@ -99,14 +131,6 @@ def _cross_down(macd_line: list[float], signal_line: list[float], idx: int) -> b
   return macd_line[idx - 1] >= signal_line[idx - 1] and macd_line[idx] < signal_line[idx]
 
 
-def _last_bar_at_or_before(bars: list[MinuteBar], ts: datetime) -> MinuteBar | None:
-  best: MinuteBar | None = None
-  for b in bars:
-    if b.ts <= ts and (best is None or b.ts > best.ts):
-      best = b
-  return best
-
-
 def _session_aligned_4h_segments(session_open: datetime, session_close: datetime) -> list[tuple[datetime, datetime]]:
   seg1_end = session_open + timedelta(hours=4)
   if seg1_end >= session_close:
@@ -114,23 +138,6 @@ def _session_aligned_4h_segments(session_open: datetime, session_close: datetime
   return [(session_open, seg1_end), (seg1_end, session_close)]
 
 
-def _group_bars_by_session_date(
-  bars: list[MinuteBar],
-  session_open_by_date: dict[datetime.date, datetime],
-  session_close_by_date: dict[datetime.date, datetime],
-) -> dict[datetime.date, list[MinuteBar]]:
-  grouped: dict[datetime.date, list[MinuteBar]] = {}
-  for b in bars:
-    d = b.ts.date()
-    so = session_open_by_date.get(d)
-    sc = session_close_by_date.get(d)
-    if so is None or sc is None:
-      continue
-    if so <= b.ts <= sc:
-      grouped.setdefault(d, []).append(b)
-  return grouped
-
-
 def _parse_lookback_days(raw: Any, default: int = 5) -> int:
   if isinstance(raw, (int, float)):
     return max(1, int(raw))
@@ -680,6 +687,8 @@ async def run_backtest_from_spec(
   start_date: str,
   end_date: str,
   progress_hook: Callable[[int, int, datetime], Awaitable[None]] | None = None,
+  session_bar_store: SessionBarStore | None = None,
+  trade_hook: Callable[[list[dict[str, Any]]], Awaitable[None]] | None = None,
 ) -> BacktestResult:
   if strategy_spec.get("timezone") != "America/New_York":
     raise AppError("VALIDATION_ERROR", "timezone must be America/New_York", {"timezone": strategy_spec.get("timezone")})
@@ -696,18 +705,18 @@ async def run_backtest_from_spec(
   if not trade_symbol:
     raise AppError("VALIDATION_ERROR", "universe.trade_symbol is required", {"universe": universe})
 
-  cal = xcals.get_calendar("XNYS")
-  sessions = cal.sessions_in_range(start_date, end_date)
-  if len(sessions) == 0:
+  schedule = build_session_schedule(start_date, end_date)
+  if not schedule.dates:
     raise AppError("DATA_UNAVAILABLE", "No trading sessions in range", {"start": start_date, "end": end_date})
 
   provider = get_market_data_provider()
+  requirements = analyze_data_requirements(strategy_spec)
 
   slippage_bps = float((strategy_spec.get("execution") or {}).get("slippage_bps") or 0.0)
   commission_per_trade = float((strategy_spec.get("execution") or {}).get("commission_per_trade") or 0.0)
   session_rows: list[dict[str, Any]] = []
   market_candles: list[dict[str, Any]] = []
-  total_sessions = len(sessions)
+  total_sessions = len(schedule.dates)
   skipped_sessions: list[dict[str, Any]] = []
 
   four_h_ends: list[datetime] = []
@@ -717,42 +726,54 @@ async def run_backtest_from_spec(
   daily_trade_close: list[float] = []
   daily_close_ts: list[datetime] = []
 
-  session_meta: list[dict[str, Any]] = []
-  session_open_by_date: dict[datetime.date, datetime] = {}
-  session_close_by_date: dict[datetime.date, datetime] = {}
-  for session in sessions:
-    session_open = cal.session_open(session).to_pydatetime().replace(tzinfo=timezone.utc)
-    session_close = cal.session_close(session).to_pydatetime().replace(tzinfo=timezone.utc)
-    d = session_close.date()
-    session_open_by_date[d] = session_open
-    session_close_by_date[d] = session_close
-    session_meta.append({"session_open": session_open, "session_close": session_close, "decision_ts": session_close - timedelta(minutes=2), "session_date": d})
-
-  trade_bars_all = await provider.get_minute_bars(trade_symbol, session_meta[0]["session_open"], session_meta[-1]["session_close"])
-  trade_bars_by_date = _group_bars_by_session_date(trade_bars_all, session_open_by_date, session_close_by_date)
-
-  signal_bars_cache: dict[str, dict[datetime.date, list[MinuteBar]]] = {}
-
-  async def _get_signal_bars_by_date(symbol: str) -> dict[datetime.date, list[MinuteBar]]:
-    cached = signal_bars_cache.get(symbol)
-    if cached is not None:
-      return cached
-    raw = await provider.get_minute_bars(symbol, session_meta[0]["session_open"], session_meta[-1]["session_close"])
-    grouped = _group_bars_by_session_date(raw, session_open_by_date, session_close_by_date)
-    signal_bars_cache[symbol] = grouped
-    return grouped
-
-  primary_signal_bars = await _get_signal_bars_by_date(signal_symbol)
+  session_meta: list[dict[str, Any]] = [
+    {
+      "session_open": from_epoch_ns(int(open_ns)),
+      "session_close": from_epoch_ns(int(close_ns)),
+      "decision_ts": from_epoch_ns(int(decision_ns)),
+      "session_date": d,
+    }
+    for d, open_ns, close_ns, decision_ns in zip(schedule.dates, schedule.opens_ns, schedule.closes_ns, schedule.decision_ns)
+  ]
+
+  symbols = list(dict.fromkeys([trade_symbol, signal_symbol]))
+  frames: dict[str, SessionFrame] = {}
+  if session_bar_store is not None:
+    for symbol in symbols:
+      frame = await session_bar_store.load(provider.cache_namespace, symbol, schedule)
+      if frame is None:
+        break
+      frames[symbol] = frame
+  frames_materialized = len(frames) == len(symbols)
+  quality: dict[str, dict[str, Any]] = {}
+  if not frames_materialized:
+    bars_by_symbol = await fetch_bar_arrays(
+      provider,
+      symbols,
+      session_meta[0]["session_open"],
+      session_meta[-1]["session_close"],
+      requirements.bar_minutes,
+    )
+    edges_by_symbol: dict[str, np.ndarray] = {}
+    if requirements.bar_minutes > 1:
+      windows = session_edge_windows(schedule, requirements.bar_minutes)
+      edges_by_symbol = dict(zip(symbols, await asyncio.gather(*(provider.get_window_bars(symbol, windows) for symbol in symbols))))
+    frames = {
+      symbol: summarize_sessions(bars, schedule, bar_minutes=requirements.bar_minutes, edges=edges_by_symbol.get(symbol))
+      for symbol, bars in bars_by_symbol.items()
+    }
+    quality = {symbol: analyze_bars(bars, schedule, bar_minutes=requirements.bar_minutes).summary for symbol, bars in bars_by_symbol.items()}
+  trade_frame = frames[trade_symbol]
+  signal_frame = frames[signal_symbol]
 
   for session_idx, meta in enumerate(session_meta, start=1):
+    i = session_idx - 1
     session_open = meta["session_open"]
     session_close = meta["session_close"]
     decision_ts = meta["decision_ts"]
     session_date = meta["session_date"]
 
-    bars_signal: list[MinuteBar] | None = primary_signal_bars.get(session_date)
-
-    if not bars_signal:
+    if not signal_frame.day.has[i]:
       skipped_sessions.append(
         {
           "session_date": session_close.date().isoformat(),
@@ -764,12 +785,13 @@ async def run_backtest_from_spec(
       if progress_hook:
         try:
           await progress_hook(session_idx, total_sessions, session_close)
+        except RunCancelled:
+          raise
         except Exception:
           pass
       continue
 
-    bars_trade = trade_bars_by_date.get(session_date)
-    if not bars_trade:
+    if not trade_frame.day.has[i]:
       skipped_sessions.append(
         {
           "session_date": session_date.isoformat(),
@@ -781,20 +803,13 @@ async def run_backtest_from_spec(
       if progress_hook:
         try:
           await progress_hook(session_idx, total_sessions, session_close)
+        except RunCancelled:
+          raise
         except Exception:
           pass
       continue
 
-    session_open_trade = float(bars_trade[0].o)
-    session_high_trade = float(max(b.h for b in bars_trade))
-    session_low_trade = float(min(b.l for b in bars_trade))
-    session_close_trade = float(bars_trade[-1].c)
-
-    decision_bar_signal = _last_bar_at_or_before(bars_signal, decision_ts)
-    decision_bar_trade = _last_bar_at_or_before(bars_trade, decision_ts)
-    close_bar_signal = _last_bar_at_or_before(bars_signal, session_close)
-    close_bar_trade = _last_bar_at_or_before(bars_trade, session_close)
-    if decision_bar_signal is None or decision_bar_trade is None or close_bar_signal is None or close_bar_trade is None:
+    if not signal_frame.has_decision[i] or not trade_frame.has_decision[i]:
       skipped_sessions.append(
         {
           "session_date": session_date.isoformat(),
@@ -806,6 +821,8 @@ async def run_backtest_from_spec(
       if progress_hook:
         try:
           await progress_hook(session_idx, total_sessions, session_close)
+        except RunCancelled:
+          raise
         except Exception:
           pass
       continue
@@ -813,48 +830,47 @@ async def run_backtest_from_spec(
     market_candles.append(
       {
         "t": session_close,
-        "o": session_open_trade,
-        "h": session_high_trade,
-        "l": session_low_trade,
-        "c": session_close_trade,
+        "o": float(trade_frame.day.o[i]),
+        "h": float(trade_frame.day.h[i]),
+        "l": float(trade_frame.day.l[i]),
+        "c": float(trade_frame.day.c[i]),
       }
     )
 
-    daily_signal_close.append(float(close_bar_signal.c))
-    daily_trade_close.append(float(close_bar_trade.c))
+    close_price_signal = float(signal_frame.day.c[i])
+    close_price_trade = float(trade_frame.day.c[i])
+    daily_signal_close.append(close_price_signal)
+    daily_trade_close.append(close_price_trade)
     daily_close_ts.append(session_close)
 
-    for seg_start, seg_end in _session_aligned_4h_segments(session_open, session_close):
-      seg_bars = [b for b in bars_signal if seg_start <= b.ts <= seg_end]
-      if not seg_bars:
+    for segment, (_, seg_end) in zip(signal_frame.segments, _session_aligned_4h_segments(session_open, session_close)):
+      if not segment.has[i]:
         continue
-      seg_close = seg_bars[-1].c
       four_h_ends.append(seg_end)
-      four_h_closes.append(float(seg_close))
+      four_h_closes.append(float(segment.c[i]))
 
     session_rows.append(
       {
         "session_open": session_open,
         "session_close": session_close,
         "decision_ts": decision_ts,
-        "decision_price_signal": float(decision_bar_signal.c),
-        "decision_price_trade": float(decision_bar_trade.c),
-        "close_price_trade": float(close_bar_trade.c),
-        "close_price_signal": float(close_bar_signal.c),
+        "decision_price_signal": float(signal_frame.decision_close[i]),
+        "decision_price_trade": float(trade_frame.decision_close[i]),
+        "close_price_trade": close_price_trade,
+        "close_price_signal": close_price_signal,
       }
     )
     if progress_hook:
       try:
         await progress_hook(session_idx, total_sessions, session_close)
+      except RunCancelled:
+        raise
       except Exception:
         pass
 
   def last_closed_4h_idx(decision_ts: datetime) -> int | None:
-    idx: int | None = None
-    for j, end_ts in enumerate(four_h_ends):
-      if end_ts <= decision_ts:
-        idx = j
-    return idx
+    idx = bisect_right(four_h_ends, decision_ts) - 1
+    return idx if idx >= 0 else None
 
   if not daily_trade_close or not session_rows:
     raise AppError(
@@ -1101,6 +1117,7 @@ async def run_backtest_from_spec(
   initial_equity = cash + position_qty * daily_trade_close[0]
 
   trades: list[dict[str, Any]] = []
+  trades_emitted = 0
   equity: list[dict[str, Any]] = []
   state_flags: dict[str, bool] = {}
   action_last_exec: dict[str, int] = {}
@@ -1235,6 +1252,14 @@ async def run_backtest_from_spec(
           }
         )
 
+    # Unlike progress, trade hook failures are not swallowed: a dropped batch would lose trades.
+    if trade_hook and len(trades) - trades_emitted >= TRADE_HOOK_BATCH:
+      await trade_hook(trades[trades_emitted:])
+      trades_emitted = len(trades)
+
+  if trade_hook and len(trades) > trades_emitted:
+    await trade_hook(trades[trades_emitted:])
+
   final_equity = float(cash + position_qty * daily_trade_close[-1])
   returns = []
   for i in range(1, len(equity)):
@@ -1273,12 +1298,15 @@ async def run_backtest_from_spec(
       "execution": {"model": "MOC"},
     },
     "data_health": {
-      **compute_data_health(provider, signal_symbol),
+      "source": provider.name,
       "total_sessions": total_sessions,
       "used_sessions": len(session_rows),
+      "bar_minutes": requirements.bar_minutes,
+      "session_bars": "materialized" if frames_materialized else "computed",
       "skipped_sessions_count": len(skipped_sessions),
       "missing_ratio": (len(skipped_sessions) / total_sessions) if total_sessions > 0 else 1.0,
       "gaps": skipped_sessions[:50],
+      "quality": quality,
     },
     "divergence_signals": divergence_signals,
   }
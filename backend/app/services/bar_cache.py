@@ -0,0 +1,625 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Protocol
+
+import numpy as np
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.errors import AppError
+from app.services.bar_codec import decode_bars, encode_bars
+from app.services.data_health import analyze_bars
+from app.services.market_data import (
+  BAR_DTYPE,
+  NS_PER_DAY,
+  MarketDataProvider,
+  MinuteBar,
+  array_to_bars,
+  merge_bar_shards,
+  select_windows,
+  to_epoch_ns,
+)
+from app.services.session_bars import build_session_schedule
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+_RECENT_DAYS = 3
+
+
+def _safe_component(raw: str) -> str:
+  return _UNSAFE_PATH_CHARS.sub("_", raw.strip()) or "_"
+
+
+def _utc_today() -> date:
+  return datetime.now(timezone.utc).date()
+
+
+def _day_start(d: date) -> datetime:
+  return datetime.combine(d, dt_time.min, tzinfo=timezone.utc)
+
+
+def _day_end(d: date) -> datetime:
+  return datetime.combine(d, dt_time.max, tzinfo=timezone.utc)
+
+
+def _days_between(start: datetime, end: datetime) -> list[date]:
+  first = start.astimezone(timezone.utc).date()
+  last = end.astimezone(timezone.utc).date()
+  return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def _contiguous_runs(days: list[date]) -> list[tuple[date, date]]:
+  runs: list[tuple[date, date]] = []
+  for d in sorted(days):
+    if runs and (d - runs[-1][1]).days == 1:
+      runs[-1] = (runs[-1][0], d)
+    else:
+      runs.append((d, d))
+  return runs
+
+
+def split_by_utc_day(arr: np.ndarray) -> dict[date, np.ndarray]:
+  if arr.size == 0:
+    return {}
+  if np.any(np.diff(arr["ts"]) < 0):
+    arr = arr[np.argsort(arr["ts"], kind="stable")]
+  day_ids = arr["ts"] // NS_PER_DAY
+  unique_days, starts = np.unique(day_ids, return_index=True)
+  bounds = [*starts.tolist(), int(arr.size)]
+  epoch = date(1970, 1, 1)
+  return {epoch + timedelta(days=int(day_id)): arr[bounds[i] : bounds[i + 1]] for i, day_id in enumerate(unique_days.tolist())}
+
+
+class BarCacheTier(Protocol):
+  async def get_many(self, namespace: str, symbol: str, days: list[date]) -> dict[date, np.ndarray]: ...
+
+  async def put_many(self, namespace: str, symbol: str, parts: dict[date, np.ndarray]) -> None: ...
+
+  def stats(self) -> dict[str, Any]: ...
+
+
+# Minute bars persisted per (namespace, symbol, UTC day), either as `.npy` files served via memmap
+# or, with `compact`, as bar_codec blocks (`.vbar`) that are several times smaller and decoded on read.
+class DiskBarCache:
+  def __init__(self, root: str | Path, *, max_bytes: int, today_ttl_seconds: float, compact: bool = False) -> None:
+    self._root = Path(root)
+    self._suffix = ".vbar" if compact else ".npy"
+    self._max_bytes = max(0, int(max_bytes))
+    self._today_ttl_seconds = max(0.0, float(today_ttl_seconds))
+    self._lock = threading.Lock()
+    self._entries: OrderedDict[Path, int] | None = None
+    self._total_bytes = 0
+    self._hits = 0
+    self._misses = 0
+    self._evictions = 0
+
+  def _path(self, namespace: str, symbol: str, day: date) -> Path:
+    return self._root / _safe_component(namespace) / _safe_component(symbol.upper()) / f"{day.year:04d}" / f"{day.isoformat()}{self._suffix}"
+
+  def _ensure_index(self) -> OrderedDict[Path, int]:
+    if self._entries is not None:
+      return self._entries
+    # Rebuild LRU order from access times so eviction survives process restarts.
+    found: list[tuple[float, Path, int]] = []
+    if self._root.exists():
+      for path in self._root.rglob(f"*{self._suffix}"):
+        try:
+          st = path.stat()
+        except FileNotFoundError:
+          continue
+        found.append((st.st_atime, path, st.st_size))
+    found.sort(key=lambda item: item[0])
+    self._entries = OrderedDict((path, size) for _, path, size in found)
+    self._total_bytes = sum(size for _, _, size in found)
+    return self._entries
+
+  def _is_fresh(self, day: date, path: Path) -> bool:
+    if day < _utc_today():
+      return True
+    try:
+      age = time.time() - path.stat().st_mtime
+    except FileNotFoundError:
+      return False
+    return age <= self._today_ttl_seconds
+
+  def get(self, namespace: str, symbol: str, day: date) -> np.ndarray | None:
+    path = self._path(namespace, symbol, day)
+    with self._lock:
+      entries = self._ensure_index()
+      if not path.exists() or not self._is_fresh(day, path):
+        self._misses += 1
+        return None
+      try:
+        arr = decode_bars(path.read_bytes()) if self._suffix == ".vbar" else np.load(path, mmap_mode="r", allow_pickle=False)
+      except (OSError, ValueError):
+        logger.warning("bar_cache_corrupt_entry", extra={"path": str(path)})
+        self._drop(path)
+        self._misses += 1
+        return None
+      if arr.dtype != BAR_DTYPE:
+        self._drop(path)
+        self._misses += 1
+        return None
+      self._hits += 1
+      if path in entries:
+        entries.move_to_end(path)
+      try:
+        # Bump atime only; mtime drives the freshness check for today's session.
+        st = path.stat()
+        os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+      except OSError:
+        pass
+      return arr
+
+  def put(self, namespace: str, symbol: str, day: date, arr: np.ndarray) -> None:
+    if day > _utc_today():
+      return
+    path = self._path(namespace, symbol, day)
+    payload = np.ascontiguousarray(arr, dtype=BAR_DTYPE)
+    with self._lock:
+      entries = self._ensure_index()
+      path.parent.mkdir(parents=True, exist_ok=True)
+      tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+      with open(tmp, "wb") as fh:
+        if self._suffix == ".vbar":
+          fh.write(encode_bars(payload))
+        else:
+          np.save(fh, payload, allow_pickle=False)
+      os.replace(tmp, path)
+      size = path.stat().st_size
+      self._total_bytes += size - entries.pop(path, 0)
+      entries[path] = size
+      self._evict_locked()
+
+  def _drop(self, path: Path) -> None:
+    entries = self._ensure_index()
+    self._total_bytes -= entries.pop(path, 0)
+    path.unlink(missing_ok=True)
+
+  def _evict_locked(self) -> None:
+    entries = self._ensure_index()
+    while self._total_bytes > self._max_bytes and entries:
+      path, size = entries.popitem(last=False)
+      self._total_bytes -= size
+      self._evictions += 1
+      path.unlink(missing_ok=True)
+
+  def stats(self) -> dict[str, Any]:
+    with self._lock:
+      entries = self._ensure_index()
+      return {
+        "tier": "disk",
+        "root": str(self._root),
+        "format": self._suffix.lstrip("."),
+        "entries": len(entries),
+        "bytes": self._total_bytes,
+        "max_bytes": self._max_bytes,
+        "hits": self._hits,
+        "misses": self._misses,
+        "evictions": self._evictions,
+      }
+
+  async def get_many(self, namespace: str, symbol: str, days: list[date]) -> dict[date, np.ndarray]:
+    out: dict[date, np.ndarray] = {}
+    for d in days:
+      arr = self.get(namespace, symbol, d)
+      if arr is not None:
+        out[d] = arr
+    return out
+
+  async def put_many(self, namespace: str, symbol: str, parts: dict[date, np.ndarray]) -> None:
+    for d, arr in parts.items():
+      self.put(namespace, symbol, d, arr)
+
+
+# Shared tier for the API and worker fleet: bar_codec-encoded per-day blocks keyed by namespace/symbol/day.
+class RedisBarCache:
+  _MGET_CHUNK = 256
+
+  def __init__(self, redis_url: str, *, ttl_seconds: int, today_ttl_seconds: int, key_prefix: str = "vibe:bars") -> None:
+    self._redis_url = redis_url
+    self._ttl_seconds = max(1, int(ttl_seconds))
+    self._today_ttl_seconds = max(1, int(today_ttl_seconds))
+    self._key_prefix = key_prefix
+    self._hits = 0
+    self._misses = 0
+    self._errors = 0
+    self._bytes_read = 0
+    self._bytes_written = 0
+
+  def _client(self) -> Any:
+    # One client per call, closed on exit: redis.asyncio connections are bound to the loop that
+    # opened them, and worker jobs each run their own loop.
+    return redis.from_url(self._redis_url, decode_responses=False)
+
+  def _key(self, namespace: str, symbol: str, day: date) -> str:
+    return f"{self._key_prefix}:{namespace}:{symbol.upper()}:{day.isoformat()}"
+
+  @staticmethod
+  def _encode(arr: np.ndarray) -> bytes:
+    return encode_bars(arr)
+
+  @staticmethod
+  def _decode(payload: bytes) -> np.ndarray:
+    return decode_bars(payload)
+
+  async def get_many(self, namespace: str, symbol: str, days: list[date]) -> dict[date, np.ndarray]:
+    if not days:
+      return {}
+    out: dict[date, np.ndarray] = {}
+    try:
+      async with self._client() as client, client.pipeline(transaction=False) as pipe:
+        for i in range(0, len(days), self._MGET_CHUNK):
+          pipe.mget([self._key(namespace, symbol, d) for d in days[i : i + self._MGET_CHUNK]])
+        chunks = await pipe.execute()
+    except Exception:
+      self._errors += 1
+      logger.warning("bar_cache_redis_get_failed", exc_info=True, extra={"symbol": symbol})
+      return out
+    values = [v for chunk in chunks for v in chunk]
+    for d, payload in zip(days, values):
+      if payload is None:
+        self._misses += 1
+        continue
+      try:
+        out[d] = self._decode(payload)
+      except ValueError:
+        self._misses += 1
+        continue
+      self._hits += 1
+      self._bytes_read += len(payload)
+    return out
+
+  async def put_many(self, namespace: str, symbol: str, parts: dict[date, np.ndarray]) -> None:
+    today = _utc_today()
+    writable = {d: arr for d, arr in parts.items() if d <= today}
+    if not writable:
+      return
+    try:
+      async with self._client() as client, client.pipeline(transaction=False) as pipe:
+        for d, arr in writable.items():
+          payload = self._encode(arr)
+          ttl = self._today_ttl_seconds if d == today else self._ttl_seconds
+          pipe.set(self._key(namespace, symbol, d), payload, ex=ttl)
+          self._bytes_written += len(payload)
+        await pipe.execute()
+    except Exception:
+      self._errors += 1
+      logger.warning("bar_cache_redis_put_failed", exc_info=True, extra={"symbol": symbol})
+
+  def stats(self) -> dict[str, Any]:
+    return {
+      "tier": "redis",
+      "ttl_seconds": self._ttl_seconds,
+      "hits": self._hits,
+      "misses": self._misses,
+      "errors": self._errors,
+      "bytes_read": self._bytes_read,
+      "bytes_written": self._bytes_written,
+    }
+
+
+def _add_interval(intervals: list[list[int]], first: int, last: int) -> list[list[int]]:
+  merged: list[list[int]] = []
+  for a, b in sorted([*intervals, [first, last]]):
+    if merged and a <= merged[-1][1] + 1:
+      merged[-1][1] = max(merged[-1][1], b)
+    else:
+      merged.append([a, b])
+  return merged
+
+
+def _remove_day(intervals: list[list[int]], day: int) -> list[list[int]]:
+  out: list[list[int]] = []
+  for a, b in intervals:
+    if day < a or day > b:
+      out.append([a, b])
+      continue
+    if a < day:
+      out.append([a, day - 1])
+    if day < b:
+      out.append([day + 1, b])
+  return out
+
+
+def _contains(intervals: list[list[int]], day: int) -> bool:
+  return any(a <= day <= b for a, b in intervals)
+
+
+# Which (namespace, symbol) days have been fetched in full, and which of those came back empty
+# (weekends, holidays; never an XNYS session). Kept as interval sets of date ordinals in `coverage.json` beside
+# the disk cache so confirmed-empty days are never requested again, even after a restart.
+class CoverageIndex:
+  def __init__(self, root: str | Path) -> None:
+    self._root = Path(root)
+    self._lock = threading.Lock()
+    self._loaded: dict[tuple[str, str], dict[str, list[list[int]]]] = {}
+
+  def _path(self, namespace: str, symbol: str) -> Path:
+    return self._root / _safe_component(namespace) / _safe_component(symbol.upper()) / "coverage.json"
+
+  def _read(self, path: Path) -> dict[str, list[list[int]]]:
+    try:
+      raw = json.loads(path.read_text())
+      return {"covered": [list(map(int, r)) for r in raw.get("covered", [])], "empty": [list(map(int, r)) for r in raw.get("empty", [])]}
+    except FileNotFoundError:
+      return {"covered": [], "empty": []}
+    except (OSError, ValueError, TypeError):
+      logger.warning("bar_cache_corrupt_coverage", extra={"path": str(path)})
+      return {"covered": [], "empty": []}
+
+  def _entry(self, namespace: str, symbol: str) -> dict[str, list[list[int]]]:
+    key = (namespace, symbol.upper())
+    entry = self._loaded.get(key)
+    if entry is None:
+      entry = self._read(self._path(namespace, symbol))
+      self._loaded[key] = entry
+    return entry
+
+  def _write(self, namespace: str, symbol: str, entry: dict[str, list[list[int]]]) -> None:
+    path = self._path(namespace, symbol)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(entry, separators=(",", ":")))
+    os.replace(tmp, path)
+
+  def empty_days(self, namespace: str, symbol: str, days: list[date]) -> set[date]:
+    with self._lock:
+      empty = self._entry(namespace, symbol)["empty"]
+      return {d for d in days if _contains(empty, d.toordinal())}
+
+  def covered_days(self, namespace: str, symbol: str, days: list[date]) -> set[date]:
+    with self._lock:
+      covered = self._entry(namespace, symbol)["covered"]
+      return {d for d in days if _contains(covered, d.toordinal())}
+
+  def record(self, namespace: str, symbol: str, parts: dict[date, np.ndarray]) -> None:
+    # Today's session is still filling in, so only closed UTC days become coverage.
+    today = _utc_today()
+    closed = {d: arr for d, arr in parts.items() if d < today}
+    if not closed:
+      return
+    with self._lock:
+      # Merge with whatever another process wrote since we loaded it.
+      entry = self._read(self._path(namespace, symbol))
+      current = self._entry(namespace, symbol)
+      for kind in ("covered", "empty"):
+        for a, b in current[kind]:
+          entry[kind] = _add_interval(entry[kind], a, b)
+      for first, last in _contiguous_runs(list(closed)):
+        entry["covered"] = _add_interval(entry["covered"], first.toordinal(), last.toordinal())
+      for first, last in _contiguous_runs([d for d, arr in closed.items() if arr.size == 0]):
+        entry["empty"] = _add_interval(entry["empty"], first.toordinal(), last.toordinal())
+      self._loaded[(namespace, symbol.upper())] = entry
+      self._write(namespace, symbol, entry)
+
+  def forget(self, namespace: str, symbol: str, days: list[date]) -> None:
+    # A covered day whose bars were evicted from every tier has to be fetched again.
+    if not days:
+      return
+    with self._lock:
+      entry = self._entry(namespace, symbol)
+      for d in days:
+        entry["covered"] = _remove_day(entry["covered"], d.toordinal())
+      self._write(namespace, symbol, entry)
+
+  def stats(self) -> dict[str, Any]:
+    with self._lock:
+      return {
+        "root": str(self._root),
+        "series_loaded": len(self._loaded),
+        "intervals": sum(len(e["covered"]) for e in self._loaded.values()),
+      }
+
+
+def _coalesce_gaps(missing: list[date], empty: set[date]) -> list[tuple[date, date]]:
+  # Gaps separated only by confirmed-empty days (a weekend, a holiday) cost nothing to span,
+  # so they go out as a single vendor request.
+  runs: list[tuple[date, date]] = []
+  for first, last in _contiguous_runs(missing):
+    if runs:
+      between = [runs[-1][1] + timedelta(days=i) for i in range(1, (first - runs[-1][1]).days)]
+      if all(d in empty for d in between):
+        runs[-1] = (runs[-1][0], last)
+        continue
+    runs.append((first, last))
+  return runs
+
+
+def _unreliable_days(fetched: dict[date, np.ndarray], first: date, last: date, minutes: int) -> set[date]:
+  # Days not worth persisting, so the next request refetches them: trading days that came back
+  # empty (a vendor gap or a 404 is not proof there were no bars), malformed vendor output, and
+  # sessions cut short within the last few days (vendors backfill the latest sessions late).
+  schedule = build_session_schedule(first, last)
+  unreliable = {d for d in schedule.dates if d in fetched and fetched[d].size == 0}
+  bars = [arr for arr in fetched.values() if arr.size]
+  if not bars:
+    return unreliable
+  report = analyze_bars(np.concatenate(bars), schedule, bar_minutes=minutes)
+  recent = _utc_today() - timedelta(days=_RECENT_DAYS)
+  return unreliable | set(report.malformed_sessions) | {d for d in report.truncated_sessions if d >= recent}
+
+
+class CachedMarketDataProvider(MarketDataProvider):
+  # Tiers are consulted in order (nearest first); a hit in a farther tier is written back to the nearer ones.
+  def __init__(self, inner: MarketDataProvider, tiers: list[BarCacheTier], coverage: CoverageIndex | None = None) -> None:
+    self._inner = inner
+    self._tiers = tiers
+    self._coverage = coverage
+    self.name = inner.name
+
+  @property
+  def cache_namespace(self) -> str:
+    return self._inner.cache_namespace
+
+  async def aclose(self) -> None:
+    await self._inner.aclose()
+
+  def http_stats(self) -> list[dict[str, Any]]:
+    return self._inner.http_stats()
+
+  def _namespace(self, minutes: int) -> str:
+    return self.cache_namespace if minutes == 1 else f"{self.cache_namespace}-{minutes}m"
+
+  async def _fetch_run(self, symbol: str, first: date, last: date, minutes: int) -> dict[date, np.ndarray]:
+    try:
+      fetched = await self._inner.get_bar_array(symbol, _day_start(first), _day_end(last), minutes)
+    except AppError as e:
+      if e.http_status != 404:
+        raise
+      fetched = np.empty(0, dtype=BAR_DTYPE)
+    by_day = split_by_utc_day(fetched)
+    out: dict[date, np.ndarray] = {}
+    d = first
+    while d <= last:
+      # Non-session days come back without bars and are stored empty so they are never re-requested.
+      out[d] = by_day.get(d, np.empty(0, dtype=BAR_DTYPE))
+      d += timedelta(days=1)
+    return out
+
+  async def _from_tiers(self, namespace: str, symbol: str, days: list[date]) -> dict[date, np.ndarray]:
+    out: dict[date, np.ndarray] = {}
+    missing = list(days)
+    for depth, tier in enumerate(self._tiers):
+      if not missing:
+        break
+      found = await tier.get_many(namespace, symbol, missing)
+      if not found:
+        continue
+      for nearer in self._tiers[:depth]:
+        await nearer.put_many(namespace, symbol, found)
+      out.update(found)
+      missing = [d for d in missing if d not in found]
+    return out
+
+  async def get_minute_bar_array(self, symbol: str, start: datetime, end: datetime) -> np.ndarray:
+    return await self.get_bar_array(symbol, start, end, 1)
+
+  async def get_window_bars(self, symbol: str, windows: list[tuple[datetime, datetime]]) -> np.ndarray:
+    # Cached per day in a namespace of their own; a day with no bars in its windows (no closing
+    # print) is stored empty, except within the last few days, which vendors still backfill.
+    namespace = f"{self.cache_namespace}-edges"
+    by_day: dict[date, list[tuple[datetime, datetime]]] = {}
+    for window in windows:
+      by_day.setdefault(window[0].astimezone(timezone.utc).date(), []).append(window)
+    found = await self._from_tiers(namespace, symbol, list(by_day))
+    missing = [d for d in by_day if d not in found]
+    if missing:
+      fetched = split_by_utc_day(await self._inner.get_window_bars(symbol, [w for d in missing for w in by_day[d]]))
+      recent = _utc_today() - timedelta(days=_RECENT_DAYS)
+      stored = {d: fetched.get(d, np.empty(0, dtype=BAR_DTYPE)) for d in missing if d < recent}
+      for tier in self._tiers:
+        await tier.put_many(namespace, symbol, stored)
+      found.update(fetched)
+    return select_windows(merge_bar_shards(list(found.values())), windows)
+
+  async def get_bar_array(self, symbol: str, start: datetime, end: datetime, minutes: int = 1) -> np.ndarray:
+    namespace = self._namespace(minutes)
+    days = _days_between(start, end)
+    empty = self._coverage.empty_days(namespace, symbol, days) if self._coverage else set()
+    by_day: dict[date, np.ndarray] = {d: np.empty(0, dtype=BAR_DTYPE) for d in empty}
+    missing = [d for d in days if d not in empty]
+    found = await self._from_tiers(namespace, symbol, missing)
+    by_day.update(found)
+    missing = [d for d in missing if d not in found]
+
+    if self._coverage:
+      self._coverage.forget(namespace, symbol, sorted(self._coverage.covered_days(namespace, symbol, missing)))
+
+    for first, last in _coalesce_gaps(missing, empty):
+      fetched = await self._fetch_run(symbol, first, last, minutes)
+      by_day.update(fetched)
+      unreliable = _unreliable_days(fetched, first, last, minutes)
+      if unreliable:
+        logger.info("bar_cache_skip_suspicious_days", extra={"symbol": symbol, "days": [d.isoformat() for d in unreliable]})
+        fetched = {d: arr for d, arr in fetched.items() if d not in unreliable}
+      # With a coverage index the empty days live there, not as cache entries.
+      stored = {d: arr for d, arr in fetched.items() if arr.size} if self._coverage else fetched
+      for tier in self._tiers:
+        await tier.put_many(namespace, symbol, stored)
+      if self._coverage:
+        self._coverage.record(namespace, symbol, fetched)
+
+    parts = [by_day[d] for d in days if by_day[d].size]
+    bars = np.concatenate(parts) if parts else np.empty(0, dtype=BAR_DTYPE)
+    lo = np.searchsorted(bars["ts"], to_epoch_ns(start), side="left")
+    hi = np.searchsorted(bars["ts"], to_epoch_ns(end), side="right")
+    bars = bars[lo:hi]
+    if bars.size == 0:
+      raise AppError(
+        "DATA_UNAVAILABLE",
+        "No bars returned",
+        {"symbol": symbol, "start": start.isoformat(), "end": end.isoformat(), "provider": self.name},
+        http_status=404,
+      )
+    return bars
+
+  async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
+    return array_to_bars(await self.get_minute_bar_array(symbol, start, end))
+
+
+_disk_cache: DiskBarCache | None = None
+_coverage_index: CoverageIndex | None = None
+_redis_cache: RedisBarCache | None = None
+
+
+def get_disk_bar_cache() -> DiskBarCache:
+  global _disk_cache
+  if _disk_cache is None:
+    _disk_cache = DiskBarCache(
+      settings.market_data_cache_dir,
+      max_bytes=settings.market_data_cache_max_bytes,
+      today_ttl_seconds=settings.market_data_cache_today_ttl_seconds,
+      compact=settings.market_data_cache_compact,
+    )
+  return _disk_cache
+
+
+def get_coverage_index() -> CoverageIndex:
+  global _coverage_index
+  if _coverage_index is None:
+    _coverage_index = CoverageIndex(settings.market_data_cache_dir)
+  return _coverage_index
+
+
+def get_redis_bar_cache() -> RedisBarCache | None:
+  global _redis_cache
+  if not settings.market_data_redis_cache_enabled or not settings.redis_url:
+    return None
+  if _redis_cache is None:
+    _redis_cache = RedisBarCache(
+      settings.redis_url,
+      ttl_seconds=settings.market_data_redis_cache_ttl_seconds,
+      today_ttl_seconds=settings.market_data_cache_today_ttl_seconds,
+    )
+  return _redis_cache
+
+
+def get_bar_cache_tiers() -> list[BarCacheTier]:
+  tiers: list[BarCacheTier] = [get_disk_bar_cache()]
+  redis_tier = get_redis_bar_cache()
+  if redis_tier is not None:
+    tiers.append(redis_tier)
+  return tiers
+
+
+def bar_cache_stats() -> dict[str, Any]:
+  if not settings.market_data_cache_enabled:
+    return {"enabled": False, "tiers": []}
+  tiers = [tier for tier in (_disk_cache, _redis_cache) if tier is not None]
+  return {
+    "enabled": True,
+    "tiers": [tier.stats() for tier in tiers],
+    "coverage": _coverage_index.stats() if _coverage_index is not None else None,
+  }
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import importlib.util
+import struct
+import zlib
+
+import numpy as np
+
+from app.services.market_data import BAR_DTYPE, NS_PER_MINUTE
+
+# Compact lossless encoding for one block of bars (the caches store one UTC day per block):
+#   ts     minute offsets from the first bar, delta + varint (one byte per bar on a regular grid)
+#   prices fixed-point at the smallest exact decimal scale; close as deltas, open/high/low relative
+#          to the neighbouring close/body, all zigzag varints (cents moves are one or two bytes)
+#   volume varints when integral
+# with a float64 fallback for each section that does not fit, and the whole payload compressed
+# with zstd, lz4 or zlib, whichever is installed.
+
+MAGIC = b"VBC1"
+_HEADER = struct.Struct("<4sBBBBIq")
+_SECTION = struct.Struct("<III")
+_CODEC_ZLIB, _CODEC_ZSTD, _CODEC_LZ4 = 1, 2, 3
+_TS_MINUTES, _TS_RAW = 0, 1
+_PRICE_FLOAT = 255
+_VOLUME_VARINT, _VOLUME_FLOAT = 0, 1
+_MAX_PRICE_DECIMALS = 6
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+  v = values.astype(np.int64)
+  return ((v << 1) ^ (v >> 63)).view(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+  v = values.view(np.uint64)
+  return ((v >> np.uint64(1)).view(np.int64)) ^ -((v & np.uint64(1)).view(np.int64))
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+  v = np.asarray(values, dtype=np.uint64)
+  if v.size == 0:
+    return b""
+  nbytes = np.ones(v.size, dtype=np.int64)
+  rest = v >> np.uint64(7)
+  while rest.any():
+    nbytes += rest > 0
+    rest >>= np.uint64(7)
+  starts = np.cumsum(nbytes) - nbytes
+  out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+  for k in range(int(nbytes.max())):
+    m = nbytes > k
+    chunk = ((v[m] >> np.uint64(7 * k)) & np.uint64(0x7F)).astype(np.uint8)
+    out[starts[m] + k] = chunk | ((nbytes[m] > k + 1).astype(np.uint8) << 7)
+  return out.tobytes()
+
+
+def varint_decode(buf: bytes, count: int) -> np.ndarray:
+  raw = np.frombuffer(buf, dtype=np.uint8)
+  ends = np.flatnonzero((raw & 0x80) == 0)
+  if ends.size != count or (count and ends[-1] != raw.size - 1):
+    raise ValueError("corrupt varint section")
+  out = np.zeros(count, dtype=np.uint64)
+  if count == 0:
+    return out
+  starts = np.r_[0, ends[:-1] + 1]
+  lengths = ends - starts + 1
+  for k in range(int(lengths.max())):
+    m = lengths > k
+    out[m] |= (raw[starts[m] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+  return out
+
+
+def _codec() -> int:
+  if importlib.util.find_spec("zstandard") is not None:
+    return _CODEC_ZSTD
+  if importlib.util.find_spec("lz4") is not None:
+    return _CODEC_LZ4
+  return _CODEC_ZLIB
+
+
+def _compress(codec: int, payload: bytes) -> bytes:
+  if codec == _CODEC_ZSTD:
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=3).compress(payload)
+  if codec == _CODEC_LZ4:
+    import lz4.frame
+
+    return lz4.frame.compress(payload)
+  return zlib.compress(payload, 6)
+
+
+def _decompress(codec: int, payload: bytes) -> bytes:
+  try:
+    if codec == _CODEC_ZSTD:
+      import zstandard
+
+      return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == _CODEC_LZ4:
+      import lz4.frame
+
+      return lz4.frame.decompress(payload)
+  except ImportError as e:
+    # Written by a process with a codec this one lacks; callers treat it as a cache miss.
+    raise ValueError(f"bar codec {codec} is not installed") from e
+  if codec == _CODEC_ZLIB:
+    try:
+      return zlib.decompress(payload)
+    except zlib.error as e:
+      raise ValueError("corrupt bar block") from e
+  raise ValueError(f"unknown bar codec {codec}")
+
+
+def _price_scale(bars: np.ndarray) -> int:
+  prices = np.concatenate([bars[k] for k in ("o", "h", "l", "c")])
+  if not np.all(np.isfinite(prices)) or np.abs(prices).max(initial=0.0) >= 1e12:
+    return _PRICE_FLOAT
+  for decimals in range(_MAX_PRICE_DECIMALS + 1):
+    scale = 10.0**decimals
+    if np.array_equal(np.round(prices * scale) / scale, prices):
+      return decimals
+  return _PRICE_FLOAT
+
+
+def encode_bars(bars: np.ndarray) -> bytes:
+  bars = np.ascontiguousarray(bars, dtype=BAR_DTYPE)
+  n = int(bars.size)
+  ts = bars["ts"]
+  base = int(ts[0]) if n else 0
+
+  offsets = ts - base
+  ts_mode = _TS_MINUTES if np.all(offsets % NS_PER_MINUTE == 0) else _TS_RAW
+  step = NS_PER_MINUTE if ts_mode == _TS_MINUTES else 1
+  ts_section = varint_encode(_zigzag(np.diff(offsets // step, prepend=0)))
+
+  decimals = _price_scale(bars)
+  if decimals == _PRICE_FLOAT:
+    price_section = np.column_stack([bars[k] for k in ("o", "h", "l", "c")]).tobytes()
+  else:
+    scale = 10.0**decimals
+    o, h, l, c = (np.round(bars[k] * scale).astype(np.int64) for k in ("o", "h", "l", "c"))
+    prev_c = np.r_[c[:1], c[:-1]]
+    price_section = varint_encode(
+      _zigzag(np.concatenate([np.diff(c, prepend=0), o - prev_c, h - np.maximum(o, c), np.minimum(o, c) - l]))
+    )
+
+  v = bars["v"]
+  integral = np.all(np.isfinite(v)) and np.all(v >= 0) and np.all(v < 2.0**53) and np.array_equal(np.floor(v), v)
+  volume_mode = _VOLUME_VARINT if integral else _VOLUME_FLOAT
+  volume_section = varint_encode(v.astype(np.uint64)) if integral else v.tobytes()
+
+  codec = _codec()
+  body = _SECTION.pack(len(ts_section), len(price_section), len(volume_section)) + ts_section + price_section + volume_section
+  return _HEADER.pack(MAGIC, codec, ts_mode, decimals, volume_mode, n, base) + _compress(codec, body)
+
+
+def decode_bars(payload: bytes) -> np.ndarray:
+  if len(payload) < _HEADER.size or payload[:4] != MAGIC:
+    raise ValueError("not an encoded bar block")
+  _, codec, ts_mode, decimals, volume_mode, n, base = _HEADER.unpack_from(payload)
+  body = _decompress(codec, payload[_HEADER.size :])
+  ts_len, price_len, volume_len = _SECTION.unpack_from(body)
+  pos = _SECTION.size
+  ts_section, pos = body[pos : pos + ts_len], pos + ts_len
+  price_section, pos = body[pos : pos + price_len], pos + price_len
+  volume_section = body[pos : pos + volume_len]
+
+  out = np.empty(n, dtype=BAR_DTYPE)
+  step = NS_PER_MINUTE if ts_mode == _TS_MINUTES else 1
+  out["ts"] = base + np.cumsum(_unzigzag(varint_decode(ts_section, n))) * step
+
+  if decimals == _PRICE_FLOAT:
+    prices = np.frombuffer(price_section, dtype=np.float64).reshape(n, 4)
+    for i, k in enumerate(("o", "h", "l", "c")):
+      out[k] = prices[:, i]
+  else:
+    dc, do, dh, dl = np.split(_unzigzag(varint_decode(price_section, 4 * n)), 4)
+    c = np.cumsum(dc)
+    o = np.r_[c[:1], c[:-1]] + do
+    scale = 10.0**decimals
+    out["c"] = c / scale
+    out["o"] = o / scale
+    out["h"] = (np.maximum(o, c) + dh) / scale
+    out["l"] = (np.minimum(o, c) - dl) / scale
+
+  if volume_mode == _VOLUME_VARINT:
+    out["v"] = varint_decode(volume_section, n).astype(np.float64)
+  else:
+    out["v"] = np.frombuffer(volume_section, dtype=np.float64)
+  return out
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.errors import AppError
+from app.db.models import Strategy
+from app.services.backtest_engine import COARSE_BAR_MINUTES
+from app.services.market_calendar import get_exchange_calendar
+from app.services.market_data import MarketDataProvider, from_epoch_ns
+from app.services.session_bars import SessionBarStore, build_session_schedule, refresh_session_bars, session_edge_windows
+
+logger = logging.getLogger(__name__)
+
+
+def universe_symbols(spec: Any) -> list[str]:
+  universe = spec.get("universe") if isinstance(spec, dict) else None
+  if not isinstance(universe, dict):
+    return []
+  symbols = (str(universe.get(k) or "").strip().upper() for k in ("signal_symbol", "trade_symbol"))
+  return sorted({s for s in symbols if s})
+
+
+async def popular_symbols(session_factory: async_sessionmaker[AsyncSession], *, limit: int, lookback_days: int, now: datetime | None = None) -> list[str]:
+  # Ranked by how many recently created strategies trade or watch each symbol.
+  cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=max(1, lookback_days))
+  async with session_factory() as db:
+    specs = (
+      await db.execute(select(Strategy.spec).where(Strategy.created_at >= cutoff).order_by(Strategy.created_at.desc()).limit(10_000))
+    ).scalars().all()
+  counts: Counter[str] = Counter(symbol for spec in specs for symbol in universe_symbols(spec))
+  return [symbol for symbol, _ in counts.most_common(max(0, limit))]
+
+
+async def warm_symbol(provider: MarketDataProvider, symbol: str, *, store: SessionBarStore | None, now: datetime | None = None) -> dict[str, Any]:
+  # Pulls every bar cache tier up to the last closed session. The cached provider only fetches
+  # days it has never seen, so after the first run this is one session per symbol per day.
+  now = now or datetime.now(timezone.utc)
+  through = get_exchange_calendar("XNYS").last_closed_session(now)
+  if through is None:
+    return {"symbol": symbol, "skipped": "no_closed_session"}
+  schedule = build_session_schedule(through - timedelta(days=max(1, settings.cache_warm_lookback_days)), through)
+  if not schedule.dates:
+    return {"symbol": symbol, "skipped": "no_sessions"}
+  start, end = from_epoch_ns(int(schedule.opens_ns[0])), from_epoch_ns(int(schedule.closes_ns[-1]))
+  out: dict[str, Any] = {"symbol": symbol, "through": through.isoformat()}
+  try:
+    out["minute_bars"] = int((await provider.get_minute_bar_array(symbol, start, end)).size)
+    out["coarse_bars"] = int((await provider.get_bar_array(symbol, start, end, COARSE_BAR_MINUTES)).size)
+    out["edge_bars"] = int((await provider.get_window_bars(symbol, session_edge_windows(schedule, COARSE_BAR_MINUTES))).size)
+  except AppError as e:
+    if e.http_status != 404:
+      raise
+    out["skipped"] = "no_data"
+    return out
+  if store is not None:
+    out["session_bar_rows"] = await refresh_session_bars(store, provider, symbol, since=schedule.dates[0], now=now)
+  return out
+
+
+async def warm_market_data_cache(
+  provider: MarketDataProvider,
+  session_factory: async_sessionmaker[AsyncSession],
+  *,
+  store: SessionBarStore | None,
+  now: datetime | None = None,
+) -> list[dict[str, Any]]:
+  # Loads (and persists) the calendar arrays so the first backtest after a deploy skips the build.
+  get_exchange_calendar("XNYS")
+  if provider.name in ("synthetic", "file"):
+    return []
+  symbols = await popular_symbols(session_factory, limit=settings.cache_warm_top_symbols, lookback_days=settings.cache_warm_strategy_lookback_days, now=now)
+  results: list[dict[str, Any]] = []
+  # Sequential on purpose: vendor calls already queue on the shared rate limiter, and interactive
+  # runs should not have to wait behind a burst of warm-up requests.
+  for symbol in symbols:
+    try:
+      results.append(await warm_symbol(provider, symbol, store=store, now=now))
+    except Exception as e:
+      logger.warning("cache_warm_symbol_failed", exc_info=True, extra={"symbol": symbol})
+      results.append({"symbol": symbol, "error": str(e)[:200]})
+  logger.info("cache_warm_completed", extra={"symbols": len(symbols), "failed": sum(1 for r in results if "error" in r)})
+  return results
+
+
+def next_warm_time(now: datetime | None = None) -> datetime | None:
+  # A fixed delay after the next XNYS close gives vendors time to publish the final minutes.
+  now = now or datetime.now(timezone.utc)
+  close = get_exchange_calendar("XNYS").next_close(now - timedelta(minutes=max(0, settings.cache_warm_delay_minutes)))
+  return None if close is None else close + timedelta(minutes=max(0, settings.cache_warm_delay_minutes))
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.market_data import NS_PER_MINUTE
+from app.services.session_bars import SessionSchedule
+
+
+@dataclass(frozen=True)
+class DataHealthReport:
+  summary: dict[str, Any]
+  # Sessions with duplicate or out-of-order bars: malformed vendor output.
+  malformed_sessions: list[date]
+  # Sessions whose bars stop well before the close; for the latest days that usually means the
+  # vendor is still backfilling rather than that the symbol stopped trading.
+  truncated_sessions: list[date]
+
+
+def _runs(mask: np.ndarray, breaks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+  # Start index and length of each run of True in `mask`; a True in `breaks` starts a new run.
+  if mask.size == 0:
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+  starts_mask = mask & (np.r_[True, ~mask[:-1]] | breaks)
+  run_id = np.cumsum(starts_mask) - 1
+  return np.flatnonzero(starts_mask), np.bincount(run_id[mask], minlength=int(starts_mask.sum()))
+
+
+def analyze_bars(
+  bars: np.ndarray,
+  schedule: SessionSchedule,
+  *,
+  bar_minutes: int = 1,
+  gap_minutes: int | None = None,
+  zero_volume_minutes: int | None = None,
+  stale_minutes: int | None = None,
+  worst: int = 10,
+) -> DataHealthReport:
+  # An explicit 0 is a real threshold (flag every occurrence); only None falls back to settings.
+  gap_minutes = max(int(settings.data_health_gap_minutes if gap_minutes is None else gap_minutes), bar_minutes)
+  zero_volume_minutes = int(settings.data_health_zero_volume_minutes if zero_volume_minutes is None else zero_volume_minutes)
+  stale_minutes = int(settings.data_health_stale_minutes if stale_minutes is None else stale_minutes)
+  n = len(schedule.dates)
+  step_ns = bar_minutes * NS_PER_MINUTE
+
+  def _session_of(ts: np.ndarray) -> np.ndarray:
+    # Session index per timestamp, or -1 outside [open, close) (extended hours, non-sessions).
+    idx = np.searchsorted(schedule.opens_ns, ts, side="right") - 1
+    if n == 0:
+      return np.full(ts.size, -1, dtype=np.int64)
+    inside = (idx >= 0) & (ts < schedule.closes_ns[np.clip(idx, 0, n - 1)])
+    return np.where(inside, idx, -1)
+
+  def _count(sessions: np.ndarray, weights: np.ndarray | None = None) -> np.ndarray:
+    valid = sessions >= 0
+    w = weights[valid] if weights is not None else None
+    return np.bincount(sessions[valid], weights=w, minlength=n)[:n]
+
+  raw_ts = bars["ts"]
+  out_of_order_at = np.flatnonzero(np.diff(raw_ts) < 0) + 1
+  out_of_order = _count(_session_of(raw_ts[out_of_order_at]))
+
+  bars = bars[np.argsort(raw_ts, kind="stable")]
+  duplicate = np.r_[False, np.diff(bars["ts"]) == 0]
+  duplicates = _count(_session_of(bars["ts"][duplicate]))
+
+  bars = bars[~duplicate]
+  sessions = _session_of(bars["ts"])
+  bars, sessions = bars[sessions >= 0], sessions[sessions >= 0]
+  ts = bars["ts"]
+
+  gaps = np.zeros(n, dtype=np.int64)
+  max_gap = np.zeros(n, dtype=np.int64)
+  truncated = np.zeros(n, dtype=bool)
+  zero_stretches = stale_stretches = np.zeros(n)
+  zero_minutes = stale_total = np.zeros(n)
+  if ts.size:
+    same = np.r_[False, sessions[1:] == sessions[:-1]]
+    first = np.flatnonzero(~same)
+    last = np.r_[first[1:] - 1, ts.size - 1]
+
+    # Missing minutes between consecutive bars, after the open and before the close.
+    inner = np.diff(ts) // NS_PER_MINUTE - bar_minutes
+    lead = (ts[first] - schedule.opens_ns[sessions[first]]) // NS_PER_MINUTE
+    tail = (schedule.closes_ns[sessions[last]] - step_ns - ts[last]) // NS_PER_MINUTE
+    inner_hit = same[1:] & (inner > gap_minutes)
+    gap_sessions = np.r_[sessions[1:][inner_hit], sessions[first][lead > gap_minutes], sessions[last][tail > gap_minutes]]
+    gap_lengths = np.r_[inner[inner_hit], lead[lead > gap_minutes], tail[tail > gap_minutes]]
+    gaps = _count(gap_sessions).astype(np.int64)
+    np.maximum.at(max_gap, gap_sessions, gap_lengths)
+    truncated[sessions[last][tail > gap_minutes]] = True
+
+    z_start, z_len = _runs(bars["v"] == 0, ~same)
+    z_hit = z_len * bar_minutes >= zero_volume_minutes
+    zero_stretches = _count(sessions[z_start[z_hit]])
+    zero_minutes = _count(sessions[z_start[z_hit]], (z_len[z_hit] * bar_minutes).astype(np.float64))
+
+    # k repeated closes in a row span k + 1 bars.
+    unchanged = same & (bars["c"] == np.r_[np.nan, bars["c"][:-1]])
+    st_start, st_len = _runs(unchanged, ~same)
+    st_hit = (st_len + 1) * bar_minutes >= stale_minutes
+    stale_stretches = _count(sessions[st_start[st_hit]])
+    stale_total = _count(sessions[st_start[st_hit]], ((st_len[st_hit] + 1) * bar_minutes).astype(np.float64))
+
+  severity = max_gap + zero_minutes + stale_total + 10 * (duplicates + out_of_order)
+  flagged = np.flatnonzero(severity > 0)
+  ranked = flagged[np.argsort(-severity[flagged], kind="stable")][:worst]
+  summary = {
+    "bars": int(raw_ts.size),
+    "bar_minutes": bar_minutes,
+    "sessions": n,
+    "sessions_with_bars": int(np.unique(sessions).size),
+    "thresholds": {"gap_minutes": gap_minutes, "zero_volume_minutes": zero_volume_minutes, "stale_minutes": stale_minutes},
+    "issues": {
+      "gaps": int(gaps.sum()),
+      "zero_volume_stretches": int(zero_stretches.sum()),
+      "stale_price_stretches": int(stale_stretches.sum()),
+      "duplicates": int(duplicate.sum()),
+      "out_of_order": int(out_of_order_at.size),
+      "sessions_truncated": int(truncated.sum()),
+      "sessions_flagged": int(flagged.size),
+    },
+    "worst_sessions": [
+      {
+        "session_date": schedule.dates[i].isoformat(),
+        "gaps": int(gaps[i]),
+        "max_gap_minutes": int(max_gap[i]),
+        "zero_volume_minutes": int(zero_minutes[i]),
+        "stale_minutes": int(stale_total[i]),
+        "duplicates": int(duplicates[i]),
+        "out_of_order": int(out_of_order[i]),
+        "truncated": bool(truncated[i]),
+      }
+      for i in ranked.tolist()
+    ],
+  }
+  return DataHealthReport(
+    summary=summary,
+    malformed_sessions=[schedule.dates[i] for i in np.flatnonzero((duplicates > 0) | (out_of_order > 0)).tolist()],
+    truncated_sessions=[schedule.dates[i] for i in np.flatnonzero(truncated).tolist()],
+  )
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from app.core.errors import AppError
+from app.services.market_data import BAR_DTYPE, MarketDataProvider, merge_bar_shards, to_epoch_ns
+
+logger = logging.getLogger(__name__)
+
+NS_PER_DAY = 86_400 * 1_000_000_000
+_SUFFIXES = (".npy", ".parquet", ".csv")
+_SYMBOL_RE = re.compile(r"^[A-Z0-9][A-Z0-9.\-]*$")
+# Accepted spellings per BAR_DTYPE field; only these columns are read from CSV/Parquet files.
+_COLUMN_ALIASES = {
+  "ts": ("ts", "t", "timestamp", "time", "datetime"),
+  "o": ("o", "open"),
+  "h": ("h", "high"),
+  "l": ("l", "low"),
+  "c": ("c", "close"),
+  "v": ("v", "volume"),
+}
+
+
+@dataclass(frozen=True)
+class _BarFile:
+  # One sorted bar file plus the row offset where each UTC day starts, so a date range is one slice.
+  bars: np.ndarray
+  days: np.ndarray
+  offsets: np.ndarray
+
+  def window(self, start_ns: int, end_ns: int) -> np.ndarray:
+    lo = int(self.offsets[np.searchsorted(self.days, start_ns // NS_PER_DAY, side="left")])
+    hi = int(self.offsets[np.searchsorted(self.days, end_ns // NS_PER_DAY, side="right")])
+    day_slice = self.bars[lo:hi]
+    ts = day_slice["ts"]
+    return day_slice[np.searchsorted(ts, start_ns, side="left") : np.searchsorted(ts, end_ns, side="right")]
+
+
+def _index(bars: np.ndarray) -> _BarFile:
+  day = bars["ts"] // NS_PER_DAY
+  starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]]) if day.size else np.empty(0, dtype=np.int64)
+  return _BarFile(bars=bars, days=day[starts], offsets=np.r_[starts, day.size].astype(np.int64))
+
+
+def _epoch_ns_column(values) -> np.ndarray:
+  import pandas as pd
+
+  if pd.api.types.is_numeric_dtype(values):
+    raw = values.to_numpy(dtype=np.int64)
+    # Numeric timestamps: infer the epoch unit from the magnitude of the first value.
+    first = abs(int(raw[0])) if raw.size else 0
+    scale = 1 if first >= 10**17 else 1_000 if first >= 10**14 else 1_000_000 if first >= 10**11 else 1_000_000_000
+    return raw * scale
+  return pd.to_datetime(values, utc=True).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _frame_to_array(frame, path: Path) -> np.ndarray:
+  lookup = {str(c).lower(): c for c in frame.columns}
+  columns = {}
+  for field, aliases in _COLUMN_ALIASES.items():
+    name = next((lookup[a] for a in aliases if a in lookup), None)
+    if name is None and field != "v":
+      raise AppError("DATA_UNAVAILABLE", "Bar file is missing a column", {"path": str(path), "column": field}, http_status=500)
+    columns[field] = name
+  out = np.empty(len(frame), dtype=BAR_DTYPE)
+  out["ts"] = _epoch_ns_column(frame[columns["ts"]])
+  for field in ("o", "h", "l", "c", "v"):
+    name = columns[field]
+    if name is None:
+      out[field] = 0.0
+      continue
+    # As with vendor bars, only volume may be missing; a row without a price is malformed.
+    column = frame[name].to_numpy(dtype=np.float64, na_value=np.nan)
+    missing = np.isnan(column)
+    if field == "v":
+      column[missing] = 0.0
+    elif missing.any():
+      raise AppError(
+        "DATA_UNAVAILABLE",
+        f"Bar file has rows without '{field}'",
+        {"path": str(path), "field": field, "rows": int(missing.sum())},
+        http_status=500,
+      )
+    out[field] = column
+  return out
+
+
+def _wanted_columns(names: list[str]) -> list[str]:
+  lookup = {n.lower(): n for n in names}
+  return [lookup[a] for aliases in _COLUMN_ALIASES.values() for a in aliases if a in lookup]
+
+
+def _read_csv(path: Path) -> np.ndarray:
+  import pandas as pd
+
+  header = pd.read_csv(path, nrows=0).columns.tolist()
+  return _frame_to_array(pd.read_csv(path, usecols=_wanted_columns(header), float_precision="round_trip"), path)
+
+
+def _read_parquet(path: Path) -> np.ndarray:
+  if importlib.util.find_spec("pyarrow") is None:
+    raise AppError("CONFIG_ERROR", "Reading Parquet bar files requires pyarrow", {"path": str(path)}, http_status=500)
+  import pyarrow.parquet as pq
+
+  names = pq.read_schema(path).names
+  return _frame_to_array(pq.read_table(path, columns=_wanted_columns(names)).to_pandas(), path)
+
+
+def _read_npy(path: Path) -> np.ndarray:
+  bars = np.load(path, mmap_mode="r")
+  if bars.dtype != BAR_DTYPE:
+    raise AppError("DATA_UNAVAILABLE", "Bar file has an unexpected dtype", {"path": str(path), "dtype": str(bars.dtype)}, http_status=500)
+  return bars
+
+
+def _load_bar_file(path: Path) -> _BarFile:
+  if path.suffix == ".npy":
+    bars = _read_npy(path)
+  elif path.suffix == ".parquet":
+    bars = _read_parquet(path)
+  else:
+    bars = _read_csv(path)
+  ts = bars["ts"]
+  if ts.size and np.any(ts[1:] < ts[:-1]):
+    # Unsorted dumps lose the memmap: they are sorted once into memory.
+    logger.warning("file_market_data_unsorted", extra={"path": str(path)})
+    bars = merge_bar_shards([np.asarray(bars)])
+  return _index(bars)
+
+
+# Bars from vendor dumps on local disk: `<root>/<SYMBOL>.{npy,parquet,csv}` or a directory of
+# partitions `<root>/<SYMBOL>/**/*.{npy,parquet,csv}`. `.npy` files hold BAR_DTYPE records and are
+# memory-mapped; CSV and Parquet files are decoded once (only the bar columns) and kept in memory.
+class FileProvider(MarketDataProvider):
+  name = "file"
+
+  def __init__(self, root: str | Path) -> None:
+    self._root = Path(root)
+    self._lock = threading.Lock()
+    self._files: dict[Path, tuple[tuple[int, int], _BarFile]] = {}
+
+  @property
+  def cache_namespace(self) -> str:
+    digest = hashlib.blake2b(str(self._root.resolve()).encode(), digest_size=4).hexdigest()
+    return f"{self.name}-{digest}"
+
+  def _symbol_files(self, symbol: str) -> list[Path]:
+    files = [self._root / f"{symbol}{suffix}" for suffix in _SUFFIXES]
+    partitions = self._root / symbol
+    if partitions.is_dir():
+      files.extend(p for p in partitions.rglob("*") if p.suffix in _SUFFIXES)
+    return sorted(p for p in files if p.is_file())
+
+  def _bar_file(self, path: Path) -> _BarFile:
+    stat = path.stat()
+    version = (stat.st_mtime_ns, stat.st_size)
+    with self._lock:
+      cached = self._files.get(path)
+    if cached is not None and cached[0] == version:
+      return cached[1]
+    bar_file = _load_bar_file(path)
+    with self._lock:
+      self._files[path] = (version, bar_file)
+    return bar_file
+
+  def _read(self, symbol: str, start_ns: int, end_ns: int) -> np.ndarray:
+    files = self._symbol_files(symbol) if _SYMBOL_RE.match(symbol) else []
+    if not files:
+      raise AppError("DATA_UNAVAILABLE", "No bar file for symbol", {"symbol": symbol, "root": str(self._root)}, http_status=404)
+    # Copy out of the memmap so callers never hold the file open.
+    windows = [np.array(self._bar_file(path).window(start_ns, end_ns)) for path in files]
+    return windows[0] if len(windows) == 1 else merge_bar_shards(windows)
+
+  async def get_minute_bar_array(self, symbol: str, start: datetime, end: datetime) -> np.ndarray:
+    symbol = symbol.strip().upper()
+    bars = await asyncio.to_thread(self._read, symbol, to_epoch_ns(start), to_epoch_ns(end))
+    if bars.size == 0:
+      raise AppError(
+        "DATA_UNAVAILABLE",
+        "No bars in file for range",
+        {"symbol": symbol, "start": start.date().isoformat(), "end": end.date().isoformat()},
+        http_status=404,
+      )
+    return bars
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+# Rebuild once the cached schedule runs out this close to today; xcals only projects about a year ahead.
+_MIN_LOOKAHEAD = timedelta(days=90)
+
+
+@dataclass(frozen=True)
+class ExchangeCalendar:
+  # Every session of one exchange as parallel arrays (ordinals, epoch-ns opens/closes), sliced per query.
+  name: str
+  ordinals: np.ndarray
+  opens_ns: np.ndarray
+  closes_ns: np.ndarray
+  dates: list[date]
+
+  @property
+  def first_session(self) -> date:
+    return self.dates[0]
+
+  @property
+  def last_session(self) -> date:
+    return self.dates[-1]
+
+  def session_slice(self, first: date, last: date) -> slice:
+    lo = int(np.searchsorted(self.ordinals, first.toordinal(), side="left"))
+    hi = int(np.searchsorted(self.ordinals, last.toordinal(), side="right"))
+    return slice(lo, max(lo, hi))
+
+  def last_closed_session(self, now: datetime) -> date | None:
+    idx = int(np.searchsorted(self.closes_ns, _epoch_ns(now), side="right")) - 1
+    return self.dates[idx] if idx >= 0 else None
+
+  def next_close(self, now: datetime) -> datetime | None:
+    idx = int(np.searchsorted(self.closes_ns, _epoch_ns(now), side="right"))
+    if idx >= self.closes_ns.size:
+      return None
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(self.closes_ns[idx]) // 1000)
+
+
+def _epoch_ns(ts: datetime) -> int:
+  ts = ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+  delta = ts.astimezone(timezone.utc) - datetime(1970, 1, 1, tzinfo=timezone.utc)
+  return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+
+def _from_arrays(name: str, ordinals: np.ndarray, opens_ns: np.ndarray, closes_ns: np.ndarray) -> ExchangeCalendar:
+  return ExchangeCalendar(
+    name=name,
+    ordinals=ordinals,
+    opens_ns=opens_ns,
+    closes_ns=closes_ns,
+    dates=[date.fromordinal(int(o)) for o in ordinals],
+  )
+
+
+def _build(name: str) -> ExchangeCalendar:
+  import exchange_calendars as xcals
+
+  cal = xcals.get_calendar(name)
+  sessions = cal.sessions
+  opens = cal.opens.loc[sessions].to_numpy(dtype="datetime64[ns]").view(np.int64)
+  closes = cal.closes.loc[sessions].to_numpy(dtype="datetime64[ns]").view(np.int64)
+  ordinals = np.fromiter((d.toordinal() for d in sessions.date), dtype=np.int64, count=len(sessions))
+  return _from_arrays(name, ordinals, opens.copy(), closes.copy())
+
+
+def _path(name: str) -> Path:
+  return Path(settings.calendar_cache_dir) / f"{name.lower()}.npz"
+
+
+def _load(name: str, today: date) -> ExchangeCalendar | None:
+  try:
+    with np.load(_path(name)) as data:
+      if int(data["version"]) != _FORMAT_VERSION:
+        return None
+      cal = _from_arrays(name, data["ordinals"], data["opens_ns"], data["closes_ns"])
+  except FileNotFoundError:
+    return None
+  except (OSError, ValueError, KeyError):
+    logger.warning("calendar_cache_corrupt", extra={"path": str(_path(name))})
+    return None
+  if not cal.dates or cal.last_session < today + _MIN_LOOKAHEAD:
+    return None
+  return cal
+
+
+def _save(cal: ExchangeCalendar) -> None:
+  path = _path(cal.name)
+  try:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with tmp.open("wb") as f:
+      np.savez(f, version=np.int64(_FORMAT_VERSION), ordinals=cal.ordinals, opens_ns=cal.opens_ns, closes_ns=cal.closes_ns)
+    os.replace(tmp, path)
+  except OSError:
+    # A read-only cache dir only costs the next process a rebuild.
+    logger.warning("calendar_cache_write_failed", extra={"path": str(path)})
+
+
+_calendars: dict[str, ExchangeCalendar] = {}
+_lock = threading.Lock()
+
+
+def get_exchange_calendar(name: str = "XNYS") -> ExchangeCalendar:
+  cal = _calendars.get(name)
+  if cal is not None:
+    return cal
+  with _lock:
+    cal = _calendars.get(name)
+    if cal is None:
+      cal = _load(name, datetime.now(timezone.utc).date())
+      if cal is None:
+        cal = _build(name)
+        _save(cal)
+      _calendars[name] = cal
+  return cal
+
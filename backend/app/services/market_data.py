@@ -1,15 +1,24 @@
 from __future__ import annotations
 
-import random
 import asyncio
+import hashlib
+import logging
+from collections.abc import Awaitable, Callable, Hashable
 from dataclasses import dataclass
-from datetime import datetime, timedelta, timezone
-from typing import Any
+from datetime import datetime, time, timedelta, timezone
+from typing import Any, TypeVar
 
 import httpx
+import numpy as np
+import orjson
 
 from app.core.config import settings
 from app.core.errors import AppError
+from app.services.market_calendar import get_exchange_calendar
+from app.services.rate_limiter import LocalRateLimiter, RedisRateLimiter, get_vendor_rate_limiter, parse_retry_after
+from app.services.vendor_http import VendorHttpClient
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True)
@@ -22,51 +31,303 @@ class MinuteBar:
   v: float
 
 
+# Columnar minute bars: ts is epoch nanoseconds (UTC), prices and volume as float64.
+BAR_DTYPE = np.dtype([("ts", "<i8"), ("o", "<f8"), ("h", "<f8"), ("l", "<f8"), ("c", "<f8"), ("v", "<f8")])
+NS_PER_MINUTE = 60_000_000_000
+NS_PER_DAY = 86_400_000_000_000
+
+
+def to_epoch_ns(ts: datetime) -> int:
+  return int(round(ts.timestamp() * 1_000_000)) * 1000
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def from_epoch_ns(ns: int) -> datetime:
+  return _EPOCH + timedelta(microseconds=ns // 1000)
+
+
+def bars_to_array(bars: list[MinuteBar]) -> np.ndarray:
+  out = np.empty(len(bars), dtype=BAR_DTYPE)
+  for i, b in enumerate(bars):
+    out[i] = (to_epoch_ns(b.ts), b.o, b.h, b.l, b.c, b.v)
+  return out
+
+
+def array_to_bars(arr: np.ndarray) -> list[MinuteBar]:
+  return [
+    MinuteBar(ts=from_epoch_ns(int(ts)), o=float(o), h=float(h), l=float(l), c=float(c), v=float(v))
+    for ts, o, h, l, c, v in arr.tolist()
+  ]
+
+
+def resample_bars(bars: np.ndarray, minutes: int) -> np.ndarray:
+  # Clock-aligned buckets stamped at their start, matching vendor aggregate bars.
+  if bars.size == 0:
+    return np.empty(0, dtype=BAR_DTYPE)
+  width = int(minutes) * NS_PER_MINUTE
+  buckets = bars["ts"] // width
+  starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+  ends = np.r_[starts[1:], bars.size] - 1
+  out = np.empty(starts.size, dtype=BAR_DTYPE)
+  out["ts"] = buckets[starts] * width
+  out["o"] = bars["o"][starts]
+  out["h"] = np.maximum.reduceat(bars["h"], starts)
+  out["l"] = np.minimum.reduceat(bars["l"], starts)
+  out["c"] = bars["c"][ends]
+  out["v"] = np.add.reduceat(bars["v"], starts)
+  return out
+
+
 class MarketDataProvider:
+  name = "base"
+
+  @property
+  def cache_namespace(self) -> str:
+    return self.name
+
+  def _require_override(self, name: str) -> None:
+    # The two defaults convert through each other; with neither overridden they would recurse forever.
+    if getattr(type(self), name) is getattr(MarketDataProvider, name):
+      raise TypeError(f"{type(self).__name__} must implement get_minute_bars or get_minute_bar_array")
+
+  # Subclasses implement at least one of the two; the other converts.
   async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
-    raise NotImplementedError
+    self._require_override("get_minute_bar_array")
+    return array_to_bars(await self.get_minute_bar_array(symbol, start, end))
+
+  async def get_minute_bar_array(self, symbol: str, start: datetime, end: datetime) -> np.ndarray:
+    self._require_override("get_minute_bars")
+    return bars_to_array(await self.get_minute_bars(symbol, start, end))
+
+  async def get_bar_array(self, symbol: str, start: datetime, end: datetime, minutes: int = 1) -> np.ndarray:
+    # Vendors override this to request pre-aggregated bars instead of paging every minute.
+    bars = await self.get_minute_bar_array(symbol, start, end)
+    return bars if minutes == 1 else resample_bars(bars, minutes)
+
+  async def get_window_bars(self, symbol: str, windows: list[tuple[datetime, datetime]]) -> np.ndarray:
+    # Minute bars over a few short windows (session_edge_windows); vendors take one range per request.
+    async def _window(start: datetime, end: datetime) -> np.ndarray:
+      try:
+        return await self.get_bar_array(symbol, start, end, 1)
+      except AppError as e:
+        if e.http_status != 404:
+          raise
+        return np.empty(0, dtype=BAR_DTYPE)
+
+    return await _gather_shards(windows, _window)
+
+  async def aclose(self) -> None:
+    return None
+
+  def http_stats(self) -> list[dict[str, Any]]:
+    return []
+
+
+def select_windows(bars: np.ndarray, windows: list[tuple[datetime, datetime]]) -> np.ndarray:
+  # The bars inside any of the (sorted, disjoint) closed windows.
+  if bars.size == 0 or not windows:
+    return bars[:0]
+  ts = bars["ts"]
+  lo = np.searchsorted(ts, [to_epoch_ns(a) for a, _ in windows], side="left")
+  hi = np.searchsorted(ts, [to_epoch_ns(b) for _, b in windows], side="right")
+  depth = np.zeros(ts.size + 1, dtype=np.int64)
+  np.add.at(depth, lo, 1)
+  np.add.at(depth, hi, -1)
+  return bars[np.cumsum(depth)[:-1] > 0]
+
+
+def _stable_seed(*parts: str) -> int:
+  # hash() is salted per process; the API and every worker must generate identical bars.
+  digest = hashlib.blake2b("|".join(parts).encode(), digest_size=8).digest()
+  return int.from_bytes(digest, "big")
+
+
+def _xnys_session_minutes(start: datetime, end: datetime) -> np.ndarray:
+  cal = get_exchange_calendar("XNYS")
+  window = cal.session_slice(start.astimezone(timezone.utc).date(), end.astimezone(timezone.utc).date())
+  opens, closes = cal.opens_ns[window], cal.closes_ns[window]
+  if opens.size == 0:
+    return np.empty(0, dtype=np.int64)
+  # Vendors stamp bars with the minute they open, so a 09:30-16:00 session yields 390 bars.
+  counts = (closes - opens) // NS_PER_MINUTE
+  offsets = np.arange(int(counts.sum()), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+  minutes = np.repeat(opens, counts) + offsets * NS_PER_MINUTE
+  lo = np.searchsorted(minutes, to_epoch_ns(start), side="left")
+  hi = np.searchsorted(minutes, to_epoch_ns(end), side="right")
+  return minutes[lo:hi]
 
 
 class SyntheticProvider(MarketDataProvider):
-  async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
-    seed = hash((symbol, start.date().isoformat(), end.date().isoformat())) & 0xFFFFFFFF
-    rng = random.Random(seed)
-
-    bars: list[MinuteBar] = []
-    t = start
-    price = 100.0 + (seed % 50)
-    while t <= end:
-      drift = 0.00002
-      shock = rng.gauss(0, 0.0012)
-      ret = drift + shock
-      next_price = max(1.0, price * (1.0 + ret))
-      o = price
-      c = next_price
-      h = max(o, c) * (1.0 + abs(rng.gauss(0, 0.0006)))
-      l = min(o, c) * (1.0 - abs(rng.gauss(0, 0.0006)))
-      v = float(1000 + int(abs(rng.gauss(0, 250))))
-      bars.append(MinuteBar(ts=t, o=o, h=h, l=l, c=c, v=v))
-      price = next_price
-      t += timedelta(minutes=1)
-    return bars
+  name = "synthetic"
+
+  async def get_minute_bar_array(self, symbol: str, start: datetime, end: datetime) -> np.ndarray:
+    seed = _stable_seed(symbol, start.date().isoformat(), end.date().isoformat())
+    ts = _xnys_session_minutes(start, end)
+    out = np.empty(ts.size, dtype=BAR_DTYPE)
+    out["ts"] = ts
+    if ts.size == 0:
+      return out
+
+    noise = np.random.default_rng(seed).standard_normal((4, ts.size))
+    returns = 0.00002 + 0.0012 * noise[0]
+    closes = np.maximum(1.0, (100.0 + seed % 50) * np.exp(np.cumsum(np.log1p(returns))))
+    opens = np.empty_like(closes)
+    opens[0] = 100.0 + seed % 50
+    opens[1:] = closes[:-1]
+    out["o"] = opens
+    out["c"] = closes
+    out["h"] = np.maximum(opens, closes) * (1.0 + np.abs(0.0006 * noise[1]))
+    out["l"] = np.minimum(opens, closes) * (1.0 - np.abs(0.0006 * noise[2]))
+    out["v"] = 1000.0 + np.floor(np.abs(250.0 * noise[3]))
+    return out
+
+  async def get_window_bars(self, symbol: str, windows: list[tuple[datetime, datetime]]) -> np.ndarray:
+    # Cut from the series of the whole range (the seed covers its first and last day), so the
+    # windows agree with the bars a full-range request generates.
+    if not windows:
+      return np.empty(0, dtype=BAR_DTYPE)
+    first_day = datetime.combine(windows[0][0].astimezone(timezone.utc).date(), time.min, tzinfo=timezone.utc)
+    return select_windows(await self.get_minute_bar_array(symbol, first_day, windows[-1][1]), windows)
+
+
+def _float_column(rows: list[dict[str, Any]], key: str) -> np.ndarray:
+  # Missing/null values become NaN. Only volume may be absent; a bar without a price is malformed.
+  column = np.array([r.get(key) for r in rows], dtype=np.float64)
+  missing = np.isnan(column)
+  if key == "v":
+    column[missing] = 0.0
+  elif missing.any():
+    first = int(np.flatnonzero(missing)[0])
+    raise AppError(
+      "DATA_UNAVAILABLE",
+      f"Vendor returned bars without '{key}'",
+      {"field": key, "rows": int(missing.sum()), "first_t": rows[first].get("t")},
+    )
+  return column
+
+
+def _parse_rfc3339_ns(values: list[str]) -> np.ndarray:
+  # Vendor timestamps are UTC with a `Z` suffix; numpy parses the naive remainder in bulk.
+  if all(v.endswith("Z") for v in values):
+    return np.array([v[:-1] for v in values], dtype="datetime64[ns]").view(np.int64)
+  return np.fromiter(
+    (to_epoch_ns(datetime.fromisoformat(v.replace("Z", "+00:00"))) for v in values),
+    dtype=np.int64,
+    count=len(values),
+  )
+
+
+def decode_alpaca_bars(rows: list[dict[str, Any]]) -> np.ndarray:
+  out = np.empty(len(rows), dtype=BAR_DTYPE)
+  if not rows:
+    return out
+  out["ts"] = _parse_rfc3339_ns([str(r["t"]) for r in rows])
+  for key in ("o", "h", "l", "c", "v"):
+    out[key] = _float_column(rows, key)
+  return out
+
+
+def decode_polygon_bars(rows: list[dict[str, Any]]) -> np.ndarray:
+  out = np.empty(len(rows), dtype=BAR_DTYPE)
+  if not rows:
+    return out
+  # Polygon `t` is epoch milliseconds.
+  out["ts"] = np.fromiter((r["t"] for r in rows), dtype=np.int64, count=len(rows)) * 1_000_000
+  for key in ("o", "h", "l", "c", "v"):
+    out[key] = _float_column(rows, key)
+  return out
+
+
+def month_shards(start: datetime, end: datetime, months_per_shard: int) -> list[tuple[datetime, datetime]]:
+  step = max(1, int(months_per_shard))
+  start_utc = start.astimezone(timezone.utc)
+  end_utc = end.astimezone(timezone.utc)
+  shards: list[tuple[datetime, datetime]] = []
+  cursor = start_utc
+  while cursor <= end_utc:
+    month_index = cursor.year * 12 + (cursor.month - 1) + step
+    boundary = datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+    shard_end = min(end_utc, boundary - timedelta(microseconds=1))
+    shards.append((cursor, shard_end))
+    cursor = boundary
+  return shards
+
+
+def merge_bar_shards(shards: list[np.ndarray]) -> np.ndarray:
+  parts = [shard for shard in shards if shard.size]
+  if not parts:
+    return np.empty(0, dtype=BAR_DTYPE)
+  merged = np.concatenate(parts)
+  merged = merged[np.argsort(merged["ts"], kind="stable")]
+  keep = np.ones(merged.size, dtype=bool)
+  keep[1:] = merged["ts"][1:] != merged["ts"][:-1]
+  return merged[keep]
+
+
+async def _gather_shards(
+  shards: list[tuple[datetime, datetime]],
+  fetch_shard: Callable[[datetime, datetime], Awaitable[np.ndarray]],
+) -> np.ndarray:
+  semaphore = asyncio.Semaphore(max(1, int(settings.market_data_shard_concurrency)))
+
+  async def _bounded(shard_start: datetime, shard_end: datetime) -> np.ndarray:
+    async with semaphore:
+      return await fetch_shard(shard_start, shard_end)
+
+  results = await asyncio.gather(*(_bounded(a, b) for a, b in shards))
+  return merge_bar_shards(results)
+
+
+async def _rate_limited_get(
+  client: VendorHttpClient,
+  limiter: LocalRateLimiter | RedisRateLimiter,
+  url: str,
+  *,
+  params: dict[str, str],
+  headers: dict[str, str] | None = None,
+  max_attempts: int = 5,
+) -> httpx.Response:
+  resp: httpx.Response | None = None
+  for attempt in range(max_attempts):
+    await limiter.acquire()
+    resp = await client.get(url, params=params, headers=headers)
+    if resp.status_code < 400:
+      return resp
+    # Handle transient throttling/server errors with bounded retries.
+    if resp.status_code in (429, 500, 502, 503, 504) and attempt < max_attempts - 1:
+      backoff = min(0.5 * (2**attempt), 5.0)
+      if resp.status_code == 429:
+        await limiter.penalize(parse_retry_after(resp.headers.get("Retry-After"), backoff))
+      else:
+        await asyncio.sleep(backoff)
+      continue
+    return resp
+  assert resp is not None
+  return resp
 
 
 class PolygonProvider(MarketDataProvider):
+  name = "polygon"
+
   def __init__(self, api_key: str) -> None:
     self._api_key = api_key
+    self._http = VendorHttpClient(self.name)
 
-  async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
-    if not self._api_key:
-      raise AppError("DATA_UNAVAILABLE", "POLYGON_API_KEY is missing", http_status=400)
+  async def aclose(self) -> None:
+    await self._http.aclose()
 
-    start_s = start.date().isoformat()
-    end_s = end.date().isoformat()
-    url = f"https://api.polygon.io/v2/aggs/ticker/{symbol}/range/1/minute/{start_s}/{end_s}"
-    params = {"adjusted": "true", "sort": "asc", "limit": "50000", "apiKey": self._api_key}
+  def http_stats(self) -> list[dict[str, Any]]:
+    return [self._http.stats()]
 
-    timeout = httpx.Timeout(30.0, connect=10.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-      resp = await client.get(url, params=params)
+  async def _fetch_shard(self, symbol: str, start: datetime, end: datetime, minutes: int) -> np.ndarray:
+    limiter = get_vendor_rate_limiter(self.name, self._api_key)
+    url: str | None = f"https://api.polygon.io/v2/aggs/ticker/{symbol}/range/{minutes}/minute/{start.date().isoformat()}/{end.date().isoformat()}"
+    params = {"adjusted": "true", "sort": "asc", "limit": "50000", "apiKey": self._api_key}
+    pages: list[np.ndarray] = []
+    while url:
+      resp = await _rate_limited_get(self._http, limiter, url, params=params)
       if resp.status_code >= 400:
         raise AppError(
           "DATA_UNAVAILABLE",
@@ -74,106 +335,240 @@ class PolygonProvider(MarketDataProvider):
           {"status": resp.status_code, "body": resp.text[:2000]},
           http_status=502,
         )
-      payload = resp.json()
-
-    results = payload.get("results") or []
-    bars: list[MinuteBar] = []
-    for r in results:
-      ts = datetime.fromtimestamp(r["t"] / 1000, tz=timezone.utc)
-      bars.append(
-        MinuteBar(
-          ts=ts,
-          o=float(r["o"]),
-          h=float(r["h"]),
-          l=float(r["l"]),
-          c=float(r["c"]),
-          v=float(r.get("v") or 0),
-        )
-      )
-    if not bars:
+      payload = orjson.loads(resp.content)
+      pages.append(decode_polygon_bars(payload.get("results") or []))
+      # Polygon truncates at `limit` and hands back a cursor URL for the remainder.
+      url = payload.get("next_url")
+      params = {"apiKey": self._api_key}
+    return merge_bar_shards(pages)
+
+  async def get_minute_bar_array(self, symbol: str, start: datetime, end: datetime) -> np.ndarray:
+    return await self.get_bar_array(symbol, start, end, 1)
+
+  async def get_bar_array(self, symbol: str, start: datetime, end: datetime, minutes: int = 1) -> np.ndarray:
+    if not self._api_key:
+      raise AppError("DATA_UNAVAILABLE", "POLYGON_API_KEY is missing", http_status=400)
+
+    start_s = start.date().isoformat()
+    end_s = end.date().isoformat()
+    bars = await _gather_shards(
+      month_shards(start, end, settings.market_data_shard_months),
+      lambda a, b: self._fetch_shard(symbol, a, b, minutes),
+    )
+    if bars.size == 0:
       raise AppError("DATA_UNAVAILABLE", "No bars returned", {"symbol": symbol, "start": start_s, "end": end_s}, http_status=404)
     return bars
 
 
 class AlpacaProvider(MarketDataProvider):
+  name = "alpaca"
+  _MAX_PAGES_PER_SHARD = 500
+
   def __init__(self, base_url: str, api_key: str, api_secret: str, feed: str) -> None:
     self._base_url = base_url.rstrip("/")
     self._api_key = api_key
     self._api_secret = api_secret
     self._feed = feed
+    self._http = VendorHttpClient(self.name)
 
-  async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
-    if not self._api_key or not self._api_secret:
-      raise AppError("CONFIG_ERROR", "Alpaca credentials are missing", {"required": ["ALPACA_PAPER_API_KEY", "ALPACA_PAPER_API_SECRET"]}, http_status=500)
+  @property
+  def cache_namespace(self) -> str:
+    # IEX and SIP feeds return different prints; never share cached days across feeds.
+    return f"{self.name}-{self._feed}"
 
+  async def aclose(self) -> None:
+    await self._http.aclose()
+
+  def http_stats(self) -> list[dict[str, Any]]:
+    return [self._http.stats()]
+
+  async def _fetch_shard(self, symbol: str, start: datetime, end: datetime, minutes: int) -> np.ndarray:
+    limiter = get_vendor_rate_limiter(self.name, self._api_key)
     headers = {
       "APCA-API-KEY-ID": self._api_key,
       "APCA-API-SECRET-KEY": self._api_secret,
     }
-    bars: list[MinuteBar] = []
-    next_page_token: str | None = None
-
     start_s = start.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
     end_s = end.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+    pages: list[np.ndarray] = []
+    next_page_token: str | None = None
+    for _ in range(self._MAX_PAGES_PER_SHARD):
+      params: dict[str, str] = {
+        "symbols": symbol,
+        "timeframe": f"{minutes}Min",
+        "start": start_s,
+        "end": end_s,
+        "adjustment": "all",
+        "sort": "asc",
+        "limit": "10000",
+        "feed": self._feed,
+      }
+      if next_page_token:
+        params["page_token"] = next_page_token
+
+      resp = await _rate_limited_get(self._http, limiter, f"{self._base_url}/v2/stocks/bars", params=params, headers=headers)
+      if resp.status_code >= 400:
+        raise AppError(
+          "DATA_UNAVAILABLE",
+          "Alpaca request failed",
+          {"status": resp.status_code, "body": resp.text[:2000], "symbol": symbol},
+          http_status=502,
+        )
+      payload = orjson.loads(resp.content)
+      pages.append(decode_alpaca_bars((payload.get("bars") or {}).get(symbol) or []))
+
+      next_page_token = payload.get("next_page_token")
+      if not next_page_token:
+        return merge_bar_shards(pages)
+    # Never hand back a silently truncated range.
+    raise AppError(
+      "DATA_UNAVAILABLE",
+      "Alpaca pagination limit exceeded",
+      {"symbol": symbol, "start": start_s, "end": end_s, "max_pages": self._MAX_PAGES_PER_SHARD},
+      http_status=502,
+    )
+
+  async def get_minute_bar_array(self, symbol: str, start: datetime, end: datetime) -> np.ndarray:
+    return await self.get_bar_array(symbol, start, end, 1)
+
+  async def get_bar_array(self, symbol: str, start: datetime, end: datetime, minutes: int = 1) -> np.ndarray:
+    if not self._api_key or not self._api_secret:
+      raise AppError("CONFIG_ERROR", "Alpaca credentials are missing", {"required": ["ALPACA_PAPER_API_KEY", "ALPACA_PAPER_API_SECRET"]}, http_status=500)
 
-    timeout = httpx.Timeout(30.0, connect=10.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-      for _ in range(20):
-        params: dict[str, str] = {
-          "symbols": symbol,
-          "timeframe": "1Min",
-          "start": start_s,
-          "end": end_s,
-          "adjustment": "all",
-          "sort": "asc",
-          "limit": "10000",
-          "feed": self._feed,
-        }
-        if next_page_token:
-          params["page_token"] = next_page_token
-
-        resp: httpx.Response | None = None
-        for attempt in range(5):
-          resp = await client.get(f"{self._base_url}/v2/stocks/bars", params=params, headers=headers)
-          if resp.status_code < 400:
-            break
-          # Handle transient throttling/server errors with bounded retries.
-          if resp.status_code in (429, 500, 502, 503, 504) and attempt < 4:
-            await asyncio.sleep(min(0.5 * (2**attempt), 5.0))
-            continue
-          raise AppError(
-            "DATA_UNAVAILABLE",
-            "Alpaca request failed",
-            {"status": resp.status_code, "body": resp.text[:2000], "symbol": symbol},
-            http_status=502,
-          )
-        if resp is None:
-          raise AppError("DATA_UNAVAILABLE", "Alpaca request failed", {"symbol": symbol}, http_status=502)
-        payload = resp.json()
-        raw = (payload.get("bars") or {}).get(symbol) or []
-        for r in raw:
-          bars.append(
-            MinuteBar(
-              ts=datetime.fromisoformat(str(r["t"]).replace("Z", "+00:00")).astimezone(timezone.utc),
-              o=float(r["o"]),
-              h=float(r["h"]),
-              l=float(r["l"]),
-              c=float(r["c"]),
-              v=float(r.get("v") or 0),
-            )
-          )
-
-        next_page_token = payload.get("next_page_token")
-        if not next_page_token:
-          break
-
-    if not bars:
+    bars = await _gather_shards(
+      month_shards(start, end, settings.market_data_shard_months),
+      lambda a, b: self._fetch_shard(symbol, a, b, minutes),
+    )
+    if bars.size == 0:
+      start_s = start.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+      end_s = end.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
       raise AppError("DATA_UNAVAILABLE", "No Alpaca bars returned", {"symbol": symbol, "start": start_s, "end": end_s}, http_status=404)
-    bars.sort(key=lambda b: b.ts)
     return bars
 
 
+T = TypeVar("T")
+
+
+class SingleFlight:
+  # Concurrent callers with the same key share one in-flight call instead of each hitting the vendor.
+  def __init__(self) -> None:
+    self._inflight: dict[Hashable, asyncio.Task[Any]] = {}
+
+  def __len__(self) -> int:
+    return len(self._inflight)
+
+  def _finish(self, scoped_key: Hashable, task: asyncio.Task[Any]) -> None:
+    if self._inflight.get(scoped_key) is task:
+      del self._inflight[scoped_key]
+    if not task.cancelled():
+      # Mark retrieved so a flight whose callers all left does not log "exception never retrieved".
+      task.exception()
+
+  async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+    loop = asyncio.get_running_loop()
+    scoped_key = (id(loop), key)
+    task = self._inflight.get(scoped_key)
+    if task is None:
+      # A task of its own, so cancelling one caller (a cancelled run) never fails the others' fetch.
+      task = asyncio.ensure_future(fn())
+      self._inflight[scoped_key] = task
+      task.add_done_callback(lambda t: self._finish(scoped_key, t))
+    return await asyncio.shield(task)
+
+
+_bar_flights = SingleFlight()
+
+
+class _LoopSemaphore:
+  # One process-wide limit per event loop, like the vendor_http pools: every run in the API process
+  # shares it, and RQ jobs (each under a fresh asyncio.run()) get a new one bound to their loop.
+  def __init__(self, limit: Callable[[], int]) -> None:
+    self._limit = limit
+    self._semaphore: asyncio.Semaphore | None = None
+    self._loop: asyncio.AbstractEventLoop | None = None
+    self._size = 0
+
+  def get(self) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    size = max(1, int(self._limit()))
+    if self._semaphore is None or self._loop is not loop or self._size != size:
+      self._semaphore = asyncio.Semaphore(size)
+      self._loop = loop
+      self._size = size
+    return self._semaphore
+
+
+_fetch_slots = _LoopSemaphore(lambda: settings.market_data_fetch_concurrency)
+
+
+async def fetch_bar_arrays(
+  provider: MarketDataProvider,
+  symbols: list[str],
+  start: datetime,
+  end: datetime,
+  minutes: int = 1,
+) -> dict[str, np.ndarray]:
+  unique_symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+  semaphore = _fetch_slots.get()
+
+  async def _fetch(symbol: str) -> np.ndarray:
+    async with semaphore:
+      key = (provider.cache_namespace, symbol, start.isoformat(), end.isoformat(), minutes)
+      return await _bar_flights.do(key, lambda: provider.get_bar_array(symbol, start, end, minutes))
+
+  results = await asyncio.gather(*(_fetch(symbol) for symbol in unique_symbols))
+  return dict(zip(unique_symbols, results))
+
+
+_providers: dict[tuple[Any, ...], MarketDataProvider] = {}
+
+
+def _provider_settings_key() -> tuple[Any, ...]:
+  return (
+    settings.market_data_provider.lower(),
+    str(settings.alpaca_data_base_url),
+    settings.alpaca_data_feed,
+    settings.alpaca_paper_api_key,
+    settings.alpaca_paper_api_secret,
+    settings.polygon_api_key,
+    settings.market_data_file_dir,
+    settings.market_data_cache_enabled,
+    settings.market_data_redis_cache_enabled,
+  )
+
+
 def get_market_data_provider() -> MarketDataProvider:
+  # Process-level singleton so vendor connection pools and caches outlive a single run.
+  key = _provider_settings_key()
+  cached = _providers.get(key)
+  if cached is not None:
+    return cached
+
+  provider = _build_market_data_provider()
+  if settings.market_data_cache_enabled and provider.name not in ("synthetic", "file"):
+    from app.services.bar_cache import CachedMarketDataProvider, get_bar_cache_tiers, get_coverage_index
+
+    provider = CachedMarketDataProvider(provider, get_bar_cache_tiers(), get_coverage_index())
+  _providers[key] = provider
+  return provider
+
+
+async def aclose_market_data_providers() -> None:
+  for provider in list(_providers.values()):
+    try:
+      await provider.aclose()
+    except Exception:
+      logger.exception("market_data_provider_close_failed", extra={"provider": provider.name})
+
+
+def market_data_http_stats() -> list[dict[str, Any]]:
+  stats: list[dict[str, Any]] = []
+  for provider in _providers.values():
+    stats.extend(provider.http_stats())
+  return stats
+
+
+def _build_market_data_provider() -> MarketDataProvider:
   provider = settings.market_data_provider.lower()
   if provider == "alpaca":
     if not settings.alpaca_paper_api_key or not settings.alpaca_paper_api_secret:
@@ -193,10 +588,12 @@ def get_market_data_provider() -> MarketDataProvider:
     if settings.polygon_api_key:
       return PolygonProvider(settings.polygon_api_key)
     return SyntheticProvider()
+  if provider == "file":
+    from app.services.file_market_data import FileProvider
+
+    if not settings.market_data_file_dir:
+      raise AppError("CONFIG_ERROR", "File provider selected but MARKET_DATA_FILE_DIR is not set", {"required": ["MARKET_DATA_FILE_DIR"]}, http_status=500)
+    return FileProvider(settings.market_data_file_dir)
   if provider == "synthetic":
     return SyntheticProvider()
   return SyntheticProvider()
-
-
-def compute_data_health(provider: MarketDataProvider, signal_symbol: str) -> dict[str, Any]:
-  return {"source": "primary", "missing_ratio": 0.0, "gaps": []}
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalRateLimiter:
+  # Async token bucket: `rate_per_minute` steady throughput with bursts up to `burst` requests.
+  def __init__(self, name: str, rate_per_minute: float, burst: int | None = None) -> None:
+    self.name = name
+    self._rate_per_second = max(0.01, float(rate_per_minute) / 60.0)
+    self._capacity = float(max(1, burst if burst is not None else int(rate_per_minute) // 4 or 1))
+    self._tokens = self._capacity
+    self._updated_at = time.monotonic()
+    self._blocked_until = 0.0
+    self._lock: asyncio.Lock | None = None
+    self._lock_loop: asyncio.AbstractEventLoop | None = None
+    self._acquired = 0
+    self._throttled = 0
+    self._wait_seconds_total = 0.0
+
+  def _refill(self, now: float) -> None:
+    # _updated_at sits in the future while penalized; nothing refills until the block ends.
+    if now <= self._updated_at:
+      return
+    self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate_per_second)
+    self._updated_at = now
+
+  def _loop_lock(self) -> asyncio.Lock:
+    # asyncio.Lock binds to one loop; worker jobs and tests each run their own.
+    loop = asyncio.get_running_loop()
+    if self._lock is None or self._lock_loop is not loop:
+      self._lock = asyncio.Lock()
+      self._lock_loop = loop
+    return self._lock
+
+  async def acquire(self) -> float:
+    waited = 0.0
+    async with self._loop_lock():
+      while True:
+        now = time.monotonic()
+        self._refill(now)
+        delay = max(0.0, self._blocked_until - now)
+        if delay <= 0.0 and self._tokens >= 1.0:
+          self._tokens -= 1.0
+          break
+        if delay <= 0.0:
+          delay = (1.0 - self._tokens) / self._rate_per_second
+        waited += delay
+        await asyncio.sleep(delay)
+    self._acquired += 1
+    self._wait_seconds_total += waited
+    return waited
+
+  async def penalize(self, retry_after_seconds: float) -> None:
+    # Vendor said slow down: drain the bucket and hold all callers until Retry-After elapses.
+    now = time.monotonic()
+    self._refill(now)
+    self._tokens = 0.0
+    self._blocked_until = max(self._blocked_until, now + max(0.0, float(retry_after_seconds)))
+    self._updated_at = max(self._updated_at, self._blocked_until)
+    self._throttled += 1
+
+  def stats(self) -> dict[str, Any]:
+    now = time.monotonic()
+    self._refill(now)
+    return {
+      "name": self.name,
+      "scope": "local",
+      "rate_per_minute": round(self._rate_per_second * 60.0, 3),
+      "tokens": round(self._tokens, 3),
+      "blocked_for_seconds": round(max(0.0, self._blocked_until - now), 3),
+      "acquired": self._acquired,
+      "throttled": self._throttled,
+      "wait_seconds_total": round(self._wait_seconds_total, 3),
+    }
+
+
+# Token bucket state lives in one hash per (vendor, API key); time comes from the Redis server so
+# worker clocks never disagree about refills. Returns {wait_ms, tokens}: wait_ms == 0 means granted.
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'blocked_until')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+local blocked = tonumber(state[3]) or 0
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if blocked > now then
+  wait = blocked - now
+elseif tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', math.max(ts, now), 'blocked_until', blocked)
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[3]))
+return {wait, tostring(tokens)}
+"""
+
+_PENALIZE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local blocked = math.max(tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0, now + tonumber(ARGV[1]))
+-- Refill restarts when the block lifts, so the bucket comes back empty rather than full.
+redis.call('HSET', KEYS[1], 'tokens', '0', 'ts', blocked, 'blocked_until', blocked)
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+
+class RedisRateLimiter:
+  # Fleet-wide token bucket shared by every API and worker process through Redis, so concurrent
+  # backtests split one vendor quota instead of each bursting into it. Falls back to a local bucket
+  # while Redis is unreachable.
+  _FALLBACK_SECONDS = 30.0
+
+  def __init__(self, name: str, rate_per_minute: float, redis_url: str, key: str, burst: int | None = None) -> None:
+    self.name = name
+    self._redis_url = redis_url
+    self._key = key
+    self._rate_per_ms = max(0.01, float(rate_per_minute) / 60.0) / 1000.0
+    self._capacity = float(max(1, burst if burst is not None else int(rate_per_minute) // 4 or 1))
+    # Idle buckets refill to capacity anyway; let Redis drop them.
+    self._ttl_ms = int(max(60_000, self._capacity / self._rate_per_ms * 2))
+    self._local = LocalRateLimiter(name, rate_per_minute, burst)
+    self._fallback_until = 0.0
+    self._acquired = 0
+    self._throttled = 0
+    self._wait_seconds_total = 0.0
+    self._last_tokens: float | None = None
+    self._last_wait_seconds = 0.0
+    self._redis_errors = 0
+
+  async def _eval(self, script: str, *args: Any) -> Any:
+    # Client per call: redis.asyncio pools are bound to the loop that opened them and worker jobs
+    # each run their own loop, so a cached client would leak a pool per job.
+    async with redis.from_url(self._redis_url, decode_responses=True) as client:
+      return await client.eval(script, 1, self._key, *args)
+
+  def _redis_failed(self) -> None:
+    self._redis_errors += 1
+    self._fallback_until = time.monotonic() + self._FALLBACK_SECONDS
+    logger.warning("rate_limiter_redis_unavailable", exc_info=True, extra={"vendor": self.name})
+
+  async def acquire(self) -> float:
+    waited = 0.0
+    while True:
+      if time.monotonic() < self._fallback_until:
+        waited += await self._local.acquire()
+        break
+      try:
+        wait_ms, tokens = await self._eval(_ACQUIRE_LUA, repr(self._rate_per_ms), repr(self._capacity), self._ttl_ms)
+      except Exception:
+        self._redis_failed()
+        continue
+      self._last_tokens = float(tokens)
+      self._last_wait_seconds = int(wait_ms) / 1000.0
+      if int(wait_ms) <= 0:
+        break
+      waited += self._last_wait_seconds
+      await asyncio.sleep(self._last_wait_seconds)
+    self._acquired += 1
+    self._wait_seconds_total += waited
+    return waited
+
+  async def penalize(self, retry_after_seconds: float) -> None:
+    # Retry-After from one process drains the shared bucket and holds every caller in the fleet.
+    self._throttled += 1
+    await self._local.penalize(retry_after_seconds)
+    if time.monotonic() < self._fallback_until:
+      return
+    try:
+      await self._eval(_PENALIZE_LUA, int(max(0.0, float(retry_after_seconds)) * 1000), self._ttl_ms)
+    except Exception:
+      self._redis_failed()
+
+  def stats(self) -> dict[str, Any]:
+    return {
+      "name": self.name,
+      "scope": "redis" if time.monotonic() >= self._fallback_until else "local_fallback",
+      "rate_per_minute": round(self._rate_per_ms * 60_000.0, 3),
+      "tokens": None if self._last_tokens is None else round(self._last_tokens, 3),
+      "last_wait_seconds": round(self._last_wait_seconds, 3),
+      "acquired": self._acquired,
+      "throttled": self._throttled,
+      "wait_seconds_total": round(self._wait_seconds_total, 3),
+      "redis_errors": self._redis_errors,
+      "local": self._local.stats(),
+    }
+
+
+_limiters: dict[tuple[str, str], LocalRateLimiter | RedisRateLimiter] = {}
+
+
+def _vendor_rate_per_minute(vendor: str) -> int:
+  if vendor == "alpaca":
+    return int(settings.alpaca_rate_limit_per_minute)
+  if vendor == "polygon":
+    return int(settings.polygon_rate_limit_per_minute)
+  return 60
+
+
+def get_vendor_rate_limiter(vendor: str, api_key: str | None = None) -> LocalRateLimiter | RedisRateLimiter:
+  # Vendors meter per API key, so processes sharing a key share one bucket.
+  key_hash = hashlib.blake2b((api_key or "").encode(), digest_size=6).hexdigest()
+  limiter = _limiters.get((vendor, key_hash))
+  if limiter is None:
+    rate = _vendor_rate_per_minute(vendor)
+    if settings.market_data_shared_rate_limit_enabled and settings.redis_url:
+      limiter = RedisRateLimiter(vendor, rate, settings.redis_url, f"vibe:ratelimit:{vendor}:{key_hash}")
+    else:
+      limiter = LocalRateLimiter(vendor, rate)
+    _limiters[(vendor, key_hash)] = limiter
+  return limiter
+
+
+def parse_retry_after(raw: str | None, default: float) -> float:
+  if not raw:
+    return default
+  try:
+    return max(0.0, float(raw.strip()))
+  except ValueError:
+    return default
+
+
+def rate_limiter_stats() -> list[dict[str, Any]]:
+  return [limiter.stats() for limiter in _limiters.values()]
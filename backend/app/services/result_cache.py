@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import exists, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.db.models import Run, RunStep
+from app.services.market_calendar import get_exchange_calendar
+
+# Identical backtests (same spec, dates, provider and closed data) produce identical results, so a
+# run whose key matches a completed run copies that run's artifact references and trades instead of
+# fetching data and running the engine; one matching a run still executing waits for it.
+
+_CLONE_ARTIFACTS_SQL = text(
+  """
+INSERT INTO run_artifacts (id, run_id, name, type, uri, content, blob_hash, parts, created_at)
+SELECT gen_random_uuid(), CAST(:run_id AS uuid), a.name, a.type,
+       CASE WHEN a.uri LIKE '/api/runs/%' THEN replace(a.uri, :source_text, :run_text) ELSE a.uri END,
+       a.content, a.blob_hash, a.parts, now()
+FROM run_artifacts AS a
+WHERE a.run_id = CAST(:source_id AS uuid) AND a.name <> 'request.json'
+ON CONFLICT (run_id, name) DO UPDATE
+SET type = excluded.type, uri = excluded.uri, content = excluded.content, blob_hash = excluded.blob_hash, parts = excluded.parts
+"""
+)
+_CLONE_TRADES_SQL = text(
+  """
+INSERT INTO trades (id, run_id, action_id, decision_time, fill_time, symbol, side, qty, fill_price, cost, why, created_at)
+SELECT gen_random_uuid(), CAST(:run_id AS uuid), action_id, decision_time, fill_time, symbol, side, qty, fill_price, cost, why, now()
+FROM trades
+WHERE run_id = CAST(:source_id AS uuid)
+"""
+)
+
+
+@dataclass(frozen=True)
+class ResultMatch:
+  run_id: uuid.UUID
+  completed: bool
+
+
+def result_key(
+  spec: dict[str, Any],
+  start_date: str,
+  end_date: str,
+  *,
+  provider_namespace: str,
+  bar_minutes: int,
+  now: datetime | None = None,
+) -> str:
+  # The LLM bookkeeping under "meta" does not affect results.
+  canonical_spec = {k: v for k, v in spec.items() if k != "meta"}
+  last_closed = get_exchange_calendar().last_closed_session(now or datetime.now(timezone.utc))
+  # A range reaching past the last closed session gains data as sessions close.
+  data_through = min(end_date, last_closed.isoformat()) if last_closed is not None else end_date
+  payload = dumps(
+    {
+      "version": settings.result_cache_version,
+      "spec": canonical_spec,
+      "start_date": start_date,
+      "end_date": end_date,
+      "provider": provider_namespace,
+      # Which data path (minute or coarse bars) the engine takes for this spec.
+      "bar_minutes": bar_minutes,
+      "data_through": data_through,
+    },
+    sort_keys=True,
+  )
+  return hashlib.blake2b(payload, digest_size=32).hexdigest()
+
+
+def _lock_id(key: str) -> int:
+  return int.from_bytes(bytes.fromhex(key)[:8], "big", signed=True)
+
+
+def _live(run_id_col: Any, cutoff: datetime) -> Any:
+  # Executing runs write their steps at least every few flush intervals while making progress.
+  return exists(select(RunStep.id).where(RunStep.run_id == run_id_col, RunStep.updated_at >= cutoff))
+
+
+async def claim_result_key(db: AsyncSession, run: Run, key: str, *, now: datetime | None = None) -> ResultMatch | None:
+  # Serialized per key by a transaction-scoped advisory lock, so of two identical runs starting
+  # together one executes and the other attaches to it.
+  now = now or datetime.now(timezone.utc)
+  await db.execute(select(func.pg_advisory_xact_lock(_lock_id(key))))
+  match: ResultMatch | None = None
+  completed = (
+    await db.execute(
+      select(Run.id).where(Run.result_key == key, Run.state == "completed", Run.id != run.id).order_by(Run.updated_at.desc()).limit(1)
+    )
+  ).scalar_one_or_none()
+  if completed is not None:
+    match = ResultMatch(completed, True)
+  else:
+    cutoff = now - timedelta(seconds=settings.result_cache_stale_seconds)
+    leader = (
+      await db.execute(
+        select(Run.id)
+        .where(Run.result_key == key, Run.state == "running", Run.id != run.id, _live(Run.id, cutoff))
+        .order_by(Run.created_at.asc())
+        .limit(1)
+      )
+    ).scalar_one_or_none()
+    if leader is not None:
+      match = ResultMatch(leader, False)
+  run.result_key = key
+  await db.commit()
+  return match
+
+
+async def wait_for_run(
+  db: AsyncSession,
+  run_id: uuid.UUID,
+  *,
+  timeout_seconds: float,
+  poll_seconds: float = 1.0,
+  checkpoint: Callable[[], Awaitable[None]] | None = None,
+) -> bool:
+  # True once the run completes; False when it fails, goes quiet or the timeout passes.
+  # `checkpoint` runs before every poll so the waiting run can itself be cancelled.
+  deadline = time.monotonic() + timeout_seconds
+  while True:
+    if checkpoint is not None:
+      await checkpoint()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.result_cache_stale_seconds)
+    state, live = (await db.execute(select(Run.state, _live(Run.id, cutoff)).where(Run.id == run_id))).one()
+    # Do not sit idle in a transaction between polls.
+    await db.commit()
+    if state == "completed":
+      return True
+    if state != "running" or not live or time.monotonic() >= deadline:
+      return False
+    await asyncio.sleep(poll_seconds)
+
+
+async def clone_run_results(db: AsyncSession, source_id: uuid.UUID, run_id: uuid.UUID) -> None:
+  # Server-side copies in the caller's transaction: artifact rows keep pointing at the same blobs.
+  params = {"run_id": str(run_id), "source_id": str(source_id), "run_text": str(run_id), "source_text": str(source_id)}
+  await db.execute(_CLONE_ARTIFACTS_SQL, params)
+  await db.execute(text("DELETE FROM trades WHERE run_id = CAST(:run_id AS uuid)"), {"run_id": str(run_id)})
+  await db.execute(_CLONE_TRADES_SQL, params)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import Awaitable
+from datetime import date
+from typing import TypeVar
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.errors import AppError, RunCancelled
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Cancel requests are a Redis key when runs execute on queue workers, and an in-process set when
+# they run as API background tasks. Runs poll them at their checkpoints (between stages, on every
+# backtest progress/trade batch) through RunControl.check, which costs a set lookup and a clock
+# read except for one Redis GET per poll interval. RunControl.watch also checks once per poll
+# interval while a stage is waiting on I/O (a vendor fetch, the LLM summary, an upload).
+
+_local_cancels: set[uuid.UUID] = set()
+
+
+def _cancel_key(run_id: uuid.UUID) -> str:
+  return f"vibe:run:cancel:{run_id}"
+
+
+def _use_redis() -> bool:
+  return bool(settings.task_queue_enabled and settings.redis_url)
+
+
+async def request_cancel(run_id: uuid.UUID) -> None:
+  if not _use_redis():
+    _local_cancels.add(run_id)
+    return
+  client = redis.from_url(settings.redis_url, decode_responses=True)
+  try:
+    # Outlives any job that could still pick the run up.
+    await client.set(_cancel_key(run_id), "1", ex=max(300, int(settings.task_queue_job_timeout_seconds) * 2))
+  finally:
+    await client.aclose()
+
+
+def run_deadline_seconds(start_date: str, end_date: str) -> float:
+  # Scales with the requested range and stays under the queue's hard job timeout, so an overlong
+  # run is stopped cleanly instead of the worker being killed.
+  try:
+    years = max(0, (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days) / 365.25
+  except ValueError:
+    years = 1.0
+  deadline = settings.run_deadline_base_seconds + settings.run_deadline_seconds_per_year * years
+  return float(min(deadline, max(60, int(settings.task_queue_job_timeout_seconds) - 60)))
+
+
+class RunControl:
+  def __init__(self, run_id: uuid.UUID, *, deadline_seconds: float, poll_seconds: float | None = None) -> None:
+    self.run_id = run_id
+    self._deadline = time.monotonic() + deadline_seconds
+    self._poll = settings.run_cancel_poll_ms / 1000.0 if poll_seconds is None else poll_seconds
+    self._last_poll = float("-inf")
+    self._redis: redis.Redis | None = redis.from_url(settings.redis_url, decode_responses=True) if _use_redis() else None
+
+  async def check(self) -> None:
+    if self.run_id in _local_cancels:
+      raise RunCancelled("cancelled")
+    now = time.monotonic()
+    if now >= self._deadline:
+      raise RunCancelled("deadline")
+    if self._redis is None or now - self._last_poll < self._poll:
+      return
+    self._last_poll = now
+    try:
+      cancelled = bool(await self._redis.exists(_cancel_key(self.run_id)))
+    except Exception:
+      # Redis trouble must not fail the run; the deadline still applies.
+      logger.warning("run_cancel_poll_failed", exc_info=True, extra={"run_id": str(self.run_id)})
+      return
+    if cancelled:
+      _local_cancels.add(self.run_id)
+      raise RunCancelled("cancelled")
+
+  async def watch(self, stages: Awaitable[T]) -> T:
+    # Runs `stages` as a task and cancels it from outside once check() raises, so a stage stuck
+    # between checkpoints is interrupted within a poll interval too.
+    task = asyncio.ensure_future(stages)
+    try:
+      while True:
+        done, _ = await asyncio.wait({task}, timeout=self._poll)
+        if done:
+          if task.cancelled():
+            # Nothing here asked for it; surfaced as a failure so the run is cleaned up, not left running.
+            raise AppError("INTERNAL", "Run stage was cancelled unexpectedly", http_status=500)
+          return task.result()
+        await self.check()
+    except BaseException:
+      if not task.done():
+        task.cancel()
+        try:
+          await task
+        except (asyncio.CancelledError, Exception):
+          # The stage's own unwinding; what stopped it is what the caller sees.
+          pass
+      raise
+
+  async def close(self) -> None:
+    _local_cancels.discard(self.run_id)
+    if self._redis is None:
+      return
+    try:
+      await self._redis.delete(_cancel_key(self.run_id))
+      await self._redis.aclose()
+    except Exception:
+      logger.warning("run_cancel_cleanup_failed", exc_info=True, extra={"run_id": str(self.run_id)})
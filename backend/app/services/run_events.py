@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import redis.asyncio as redis
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.serialization import dumps, loads
+from app.db.engine import SessionLocal
+from app.db.models import Run, RunStep
+
+logger = logging.getLogger(__name__)
+
+# Live run progress travels over one Redis channel per run: executing runs publish every step
+# change, log and (throttled) progress line, and GET /api/runs/{id}/events relays them as
+# Server-Sent Events. Postgres keeps the durable state, written on step transitions and a slow
+# heartbeat, and serves the snapshot a stream starts from.
+
+_TERMINAL_STATES = {"completed", "failed", "cancelled"}
+
+
+def run_events_enabled() -> bool:
+  return bool(settings.run_events_enabled and settings.redis_url)
+
+
+def run_events_channel(run_id: uuid.UUID) -> str:
+  return f"vibe:run:events:{run_id}"
+
+
+class RunEventPublisher:
+  def __init__(self, run_id: uuid.UUID) -> None:
+    self.run_id = run_id
+    self._channel = run_events_channel(run_id)
+    self._redis: redis.Redis | None = None
+    self._progress_interval = settings.run_events_progress_interval_ms / 1000.0
+    self._last_progress = float("-inf")
+
+  @property
+  def enabled(self) -> bool:
+    return self._redis is not None
+
+  async def connect(self) -> bool:
+    # Without a reachable Redis the run falls back to frequent step flushes for polling clients.
+    if not run_events_enabled():
+      return False
+    client = redis.from_url(settings.redis_url)
+    try:
+      await client.ping()
+    except Exception:
+      logger.warning("run_events_unavailable", exc_info=True, extra={"run_id": str(self.run_id)})
+      await client.aclose()
+      return False
+    self._redis = client
+    return True
+
+  async def publish(self, event: dict[str, Any]) -> None:
+    if self._redis is None:
+      return
+    if event.get("type") == "progress":
+      # Progress can fire per session; one line per interval is plenty for a live view.
+      now = time.monotonic()
+      if now - self._last_progress < self._progress_interval:
+        return
+      self._last_progress = now
+    try:
+      await self._redis.publish(self._channel, dumps(event))
+    except Exception:
+      # Events are best effort; the durable state is still written to Postgres.
+      logger.warning("run_event_publish_failed", exc_info=True, extra={"run_id": str(self.run_id)})
+
+  async def close(self) -> None:
+    if self._redis is None:
+      return
+    client, self._redis = self._redis, None
+    try:
+      await client.aclose()
+    except Exception:
+      pass
+
+
+async def poll_run_state(run_id: uuid.UUID, *, now: datetime | None = None) -> dict[str, Any] | None:
+  # Heartbeat check for open streams, which otherwise only end on a published terminal event: the
+  # closing event when the run has ended or its worker stopped writing steps, else None.
+  now = now or datetime.now(timezone.utc)
+  async with SessionLocal() as db:
+    state = (await db.execute(select(Run.state).where(Run.id == run_id))).scalar_one_or_none()
+    if state in _TERMINAL_STATES:
+      return {"type": "run", "state": state}
+    last_step = (await db.execute(select(func.max(RunStep.updated_at)).where(RunStep.run_id == run_id))).scalar_one_or_none()
+  if state is None or last_step is None or last_step < now - timedelta(seconds=settings.result_cache_stale_seconds):
+    return {"type": "stale", "state": state}
+  return None
+
+
+def _sse(event: str, data: bytes) -> bytes:
+  return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+class RunEventSubscription:
+  # Subscribed before the snapshot is read, so no event published in between is lost.
+  def __init__(self, run_id: uuid.UUID) -> None:
+    self._client = redis.from_url(settings.redis_url)
+    self._pubsub = self._client.pubsub()
+    self._channel = run_events_channel(run_id)
+
+  async def open(self) -> None:
+    await self._pubsub.subscribe(self._channel)
+
+  async def close(self) -> None:
+    try:
+      await self._pubsub.unsubscribe(self._channel)
+      await self._pubsub.aclose()
+      await self._client.aclose()
+    except Exception:
+      pass
+
+  async def stream(
+    self,
+    snapshot: dict[str, Any],
+    poll: Callable[[], Awaitable[dict[str, Any] | None]] | None = None,
+  ) -> AsyncIterator[bytes]:
+    # A "snapshot" event, then every published event until the run reaches a terminal state, `poll`
+    # reports it ended or went stale (a dead worker publishes nothing), or the stream's lifetime is
+    # up; clients reconnect and resume from a fresh snapshot.
+    deadline = time.monotonic() + float(settings.run_events_stream_max_seconds)
+    try:
+      yield _sse("snapshot", dumps(snapshot))
+      if snapshot.get("state") in _TERMINAL_STATES:
+        return
+      while (remaining := deadline - time.monotonic()) > 0:
+        timeout = min(float(settings.run_events_heartbeat_seconds), remaining)
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+          closing = await poll() if poll is not None else None
+          if closing is not None:
+            yield _sse(str(closing["type"]), dumps(closing))
+            return
+          # Keeps proxies from closing an idle stream.
+          yield b": keepalive\n\n"
+          continue
+        data = message["data"]
+        event = loads(data)
+        yield _sse(str(event.get("type") or "message"), data)
+        if event.get("type") == "run" and event.get("state") in _TERMINAL_STATES:
+          return
+    finally:
+      await self.close()
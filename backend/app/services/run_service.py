@@ -1,23 +1,32 @@
 ﻿from __future__ import annotations
 
+import asyncio
 import logging
 import uuid
 from datetime import datetime, timezone
 from typing import Any, Literal
 
-from fastapi.encoders import jsonable_encoder
 import redis.asyncio as redis
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.errors import AppError
+from app.core.errors import AppError, RunCancelled
 from app.core.config import settings
 from app.db.engine import SessionLocal
-from app.db.models import Run, RunArtifact, RunStep, Strategy, Trade
+from app.db.models import Run, RunArtifact, RunStep, Strategy
 from app.schemas.contracts import NaturalLanguageStrategyRequest
-from app.services.backtest_engine import run_backtest_from_spec
+from app.services.artifact_store import ArtifactParts, BlobWriter
+from app.services.backtest_engine import analyze_data_requirements, run_backtest_from_spec
 from app.services.llm_client import llm_client
-from app.services.storage_service import upload_artifact_content, storage_enabled
+from app.services.market_data import get_market_data_provider
+from app.services.result_cache import claim_result_key, clone_run_results, result_key, wait_for_run
+from app.services.run_control import RunControl, run_deadline_seconds
+from app.services.run_events import RunEventPublisher
+from app.services.run_steps import StepStateBuffer
+from app.services.session_bars import SessionBarStore
+from app.services.task_queue import enqueue_session_bars_refresh_async
+from app.services.trade_writer import TradeWriter
 from app.services.spec_builder import nl_to_strategy_spec
 
 logger = logging.getLogger(__name__)
@@ -139,47 +148,83 @@ async def _clear_queue_lock(run_id: uuid.UUID) -> None:
     logger.exception("run_queue_lock_clear_failed", extra={"run_id": str(run_id)})
 
 
-async def _set_step_state(
-  db: AsyncSession,
-  run_id: uuid.UUID,
-  step_id: StepId,
-  state: str,
-  log: dict[str, Any] | None = None,
-) -> None:
-  step = (await db.execute(select(RunStep).where(RunStep.run_id == run_id, RunStep.step_id == step_id))).scalar_one()
-  step.state = state
-  if log is not None:
-    step.logs = [*step.logs, log]
-  await db.commit()
-
-
-async def _upsert_artifact(db: AsyncSession, run_id: uuid.UUID, name: str, type_: str, uri: str, content: dict[str, Any] | None = None) -> None:
-  persisted_uri = uri
-  # Normalize datetimes/numpy scalars before DB JSON persistence or storage upload.
-  persisted_content: dict[str, Any] | None = jsonable_encoder(content) if content is not None else None
-  if storage_enabled() and content is not None:
-    storage_uri = await upload_artifact_content(run_id=run_id, name=name, type_=type_, content=persisted_content)
-    if storage_uri is not None:
-      persisted_uri = storage_uri
-      persisted_content = None
-
-  row = (
-    await db.execute(select(RunArtifact).where(RunArtifact.run_id == run_id, RunArtifact.name == name))
-  ).scalar_one_or_none()
-  if row is None:
-    row = RunArtifact(run_id=run_id, name=name, type=type_, uri=persisted_uri, content=persisted_content)
-    db.add(row)
-  else:
-    row.type = type_
-    row.uri = persisted_uri
-    row.content = persisted_content
+async def _upsert_artifacts(db: AsyncSession, run_id: uuid.UUID, artifacts: list[tuple[str, str, str, Any]]) -> None:
+  # Content goes to artifact_blobs by hash (only blobs not stored yet are uploaded/inserted), then
+  # every row lands in one INSERT ... ON CONFLICT, all in one commit.
+  blobs = BlobWriter()
+  now = datetime.now(timezone.utc)
+  rows: list[dict[str, Any]] = []
+  for name, type_, uri, content in artifacts:
+    blob_hash, parts = blobs.ref(content)
+    rows.append(
+      {
+        "id": uuid.uuid4(),
+        "run_id": run_id,
+        "name": name,
+        "type": type_,
+        "uri": uri,
+        "content": None,
+        "blob_hash": blob_hash,
+        "parts": parts,
+        "created_at": now,
+      }
+    )
+  if not rows:
+    return
+  stmt = pg_insert(RunArtifact).values(rows)
+  stmt = stmt.on_conflict_do_update(
+    index_elements=[RunArtifact.run_id, RunArtifact.name],
+    set_={name: stmt.excluded[name] for name in ("type", "uri", "content", "blob_hash", "parts")},
+  )
   try:
+    await blobs.flush(db)
+    await db.execute(stmt)
     await db.commit()
   except Exception:
     await db.rollback()
     raise
 
 
+async def _upsert_artifact(db: AsyncSession, run_id: uuid.UUID, name: str, type_: str, uri: str, content: Any = None) -> None:
+  await _upsert_artifacts(db, run_id, [(name, type_, uri, content)])
+
+
+async def _reuse_cached_result(
+  db: AsyncSession,
+  run: Run,
+  spec: dict[str, Any],
+  steps: StepStateBuffer,
+  control: RunControl,
+  start_date: str,
+  end_date: str,
+) -> bool:
+  key = result_key(
+    spec,
+    start_date,
+    end_date,
+    provider_namespace=get_market_data_provider().cache_namespace,
+    bar_minutes=analyze_data_requirements(spec).bar_minutes,
+  )
+  match = await claim_result_key(db, run, key)
+  if match is None:
+    return False
+  if not match.completed:
+    await steps.set(db, "parse", "RUNNING", _log("INFO", "Waiting for identical run", {"source_run_id": str(match.run_id)}))
+    if not await wait_for_run(db, match.run_id, timeout_seconds=settings.result_cache_attach_timeout_seconds, checkpoint=control.check):
+      return False
+
+  await clone_run_results(db, match.run_id, run.id)
+  reused = _log("INFO", "Reused result of identical run", {"source_run_id": str(match.run_id)})
+  for step_id in ("parse", "plan", "data", "backtest", "report"):
+    await steps.set(db, step_id, "DONE", reused, flush=False)
+  if run.mode != "BACKTEST_ONLY":
+    await steps.set(db, "deploy", "PENDING", _log("INFO", "Awaiting confirm"), flush=False)
+  run.state = "completed"
+  await steps.flush(db)
+  await db.commit()
+  return True
+
+
 async def create_run(db: AsyncSession, req: NaturalLanguageStrategyRequest, *, user_id: uuid.UUID) -> Run:
   spec = await nl_to_strategy_spec(
     req.nl,
@@ -239,22 +284,38 @@ async def execute_run(
 ) -> None:
   async with SessionLocal() as db:
     run = (await db.execute(select(Run).where(Run.id == run_id))).scalar_one_or_none()
-    if run is None:
+    # Cancelled (or otherwise finished) runs picked up again by a retried job stay as they are.
+    if run is None or run.state != "running":
       return
 
     strategy = (await db.execute(select(Strategy).where(Strategy.id == run.strategy_id))).scalar_one()
     spec = strategy.spec
+    events = RunEventPublisher(run_id)
+    # Live clients follow the event stream, so Postgres only needs step logs for durability.
+    flush_interval_ms = settings.run_events_db_flush_interval_ms if await events.connect() else settings.run_step_flush_interval_ms
+    steps = StepStateBuffer(
+      run_id,
+      flush_interval_seconds=flush_interval_ms / 1000.0,
+      max_logs=settings.run_step_max_logs,
+      publish=events.publish if events.enabled else None,
+    )
+    await steps.load(db)
+    control = RunControl(run_id, deadline_seconds=run_deadline_seconds(start_date, end_date))
 
-    try:
-      await _set_step_state(
+    # Run under control.watch, so a cancel or the deadline also interrupts a stage mid-await.
+    async def _stages() -> None:
+      await control.check()
+      if settings.result_cache_enabled and await _reuse_cached_result(db, run, spec, steps, control, start_date, end_date):
+        return
+
+      await steps.set(
         db,
-        run_id,
         "parse",
         "RUNNING",
         _log("INFO", "Parsing strategy spec", {"model": settings.llm_model}),
       )
       await _upsert_artifact(db, run_id, "dsl.json", "json", f"/api/runs/{run_id}/artifacts/dsl.json", content=spec)
-      await _set_step_state(db, run_id, "parse", "RUNNING", _log("INFO", "DSL artifact persisted"))
+      await steps.set(db, "parse", "RUNNING", _log("INFO", "DSL artifact persisted"))
       inputs_snapshot = {
         "strategy_version": strategy.strategy_version,
         "resolved_universe": spec.get("universe"),
@@ -269,10 +330,9 @@ async def execute_run(
         f"/api/runs/{run_id}/artifacts/inputs_snapshot.json",
         content=inputs_snapshot,
       )
-      await _set_step_state(db, run_id, "parse", "RUNNING", _log("INFO", "Input snapshot generated"))
-      await _set_step_state(
+      await steps.set(db, "parse", "RUNNING", _log("INFO", "Input snapshot generated"))
+      await steps.set(
         db,
-        run_id,
         "parse",
         "DONE",
         _log(
@@ -287,61 +347,64 @@ async def execute_run(
         ),
       )
 
-      await _set_step_state(db, run_id, "plan", "RUNNING", _log("INFO", "Building execution plan"))
+      await control.check()
+      await steps.set(db, "plan", "RUNNING", _log("INFO", "Building execution plan"))
       plan = {
         "version": "v0",
         "decision_schedule": {"type": "MARKET_CLOSE_OFFSET", "offset": "-2m", "timezone": "America/New_York"},
         "nodes": [],
       }
       await _upsert_artifact(db, run_id, "plan.json", "json", f"/api/runs/{run_id}/artifacts/plan.json", content=plan)
-      await _set_step_state(db, run_id, "plan", "DONE", _log("INFO", "ExecutionPlan compiled"))
+      await steps.set(db, "plan", "DONE", _log("INFO", "ExecutionPlan compiled"))
 
-      await _set_step_state(db, run_id, "data", "RUNNING", _log("INFO", "Fetching minute data"))
-      await _set_step_state(db, run_id, "data", "RUNNING", _log("INFO", "Validating session coverage"))
-      await _set_step_state(
+      await control.check()
+      await steps.set(db, "data", "RUNNING", _log("INFO", "Fetching minute data"))
+      await steps.set(db, "data", "RUNNING", _log("INFO", "Validating session coverage"))
+      await steps.set(
         db,
-        run_id,
         "data",
         "DONE",
         _log("INFO", "Data ready", {"start_date": start_date, "end_date": end_date}),
       )
 
-      await _set_step_state(
+      await control.check()
+      await steps.set(
         db,
-        run_id,
         "backtest",
         "RUNNING",
         _log("INFO", "Running backtest", {"start_date": start_date, "end_date": end_date}),
       )
-      backtest_step = (await db.execute(select(RunStep).where(RunStep.run_id == run_id, RunStep.step_id == "backtest"))).scalar_one()
-      last_persisted = 0
 
       async def _on_backtest_progress(done: int, total: int, session_close: datetime) -> None:
-        nonlocal last_persisted
+        await control.check()
         if total <= 0:
           return
         ratio = min(max(done / total, 0.0), 1.0)
-        target = int(ratio * 100.0)
-        should_persist = done == total or done == 1 or done - last_persisted >= 5
-        if not should_persist:
-          return
-
-        pct = round(ratio * 100.0, 1)
         progress_log = _log(
           "INFO",
           "Backtest progress",
-          {"session_date": session_close.date().isoformat(), "processed": done, "total": total, "pct": pct},
+          {"session_date": session_close.date().isoformat(), "processed": done, "total": total, "pct": round(ratio * 100.0, 1)},
         )
-        logs = list(backtest_step.logs or [])
-        if logs and isinstance(logs[-1], dict) and logs[-1].get("msg") == "Backtest progress":
-          logs[-1] = progress_log
-        else:
-          logs = [*logs[-20:], progress_log]
-        backtest_step.logs = logs
-        last_persisted = done
-        await db.commit()
-
-      result = await run_backtest_from_spec(spec, start_date=start_date, end_date=end_date, progress_hook=_on_backtest_progress)
+        # Buffered: written at most once per flush interval and on the next state change.
+        await steps.progress(db, "backtest", progress_log)
+
+      trade_writer = TradeWriter(run_id)
+      await trade_writer.clear(db)
+
+      async def _on_trades(batch: list[dict[str, Any]]) -> None:
+        # COPYed into the run's transaction; committed with the next step flush or the final commit.
+        await trade_writer.write(db, batch)
+        await control.check()
+
+      result = await run_backtest_from_spec(
+        spec,
+        start_date=start_date,
+        end_date=end_date,
+        progress_hook=_on_backtest_progress,
+        session_bar_store=SessionBarStore(SessionLocal) if settings.session_bars_enabled else None,
+        trade_hook=_on_trades,
+      )
+      await control.check()
       ai_summary = await _generate_ai_summary(
         prompt=str(strategy.prompt or ""),
         strategy_name=str(strategy.name or "Untitled"),
@@ -351,9 +414,8 @@ async def execute_run(
       )
       resolved = (result.artifacts or {}).get("resolved") if isinstance(result.artifacts, dict) else {}
       universe = (resolved or {}).get("universe") if isinstance(resolved, dict) else {}
-      await _set_step_state(
+      await steps.set(
         db,
-        run_id,
         "backtest",
         "DONE",
         _log(
@@ -369,106 +431,112 @@ async def execute_run(
         ),
       )
 
-      await _set_step_state(db, run_id, "report", "RUNNING", _log("INFO", "Generating report"))
-      report = jsonable_encoder(
+      await control.check()
+      await steps.set(db, "report", "RUNNING", _log("INFO", "Generating report"))
+      divergences = ((result.artifacts or {}).get("divergence_signals") if isinstance(result.artifacts, dict) else []) or []
+      # report.json, kpis.json, divergence_signals.json and trades.csv are assembled on read from
+      # shared parts, so the kpis, trades and divergences are each stored once.
+      report = ArtifactParts(
         {
           "kpis": result.kpis,
           "equity": result.equity,
           "market": result.market,
           "trades": result.trades,
-          "divergences": ((result.artifacts or {}).get("divergence_signals") if isinstance(result.artifacts, dict) else []) or [],
+          "divergences": divergences,
           "ai_summary": ai_summary,
         }
       )
-      await _upsert_artifact(db, run_id, "report.json", "json", f"/api/runs/{run_id}/report", content=report)
-      await _set_step_state(db, run_id, "report", "RUNNING", _log("INFO", "Report artifact persisted"))
-      await _upsert_artifact(
-        db,
-        run_id,
-        "kpis.json",
-        "json",
-        f"/api/runs/{run_id}/artifacts/kpis.json",
-        content={"kpis": result.kpis},
-      )
-      await _upsert_artifact(
-        db,
-        run_id,
-        "ai_summary.json",
-        "json",
-        f"/api/runs/{run_id}/artifacts/ai_summary.json",
-        content=ai_summary,
-      )
-      await _upsert_artifact(
-        db,
-        run_id,
-        "divergence_signals.json",
-        "json",
-        f"/api/runs/{run_id}/artifacts/divergence_signals.json",
-        content={"divergences": ((result.artifacts or {}).get("divergence_signals") if isinstance(result.artifacts, dict) else []) or []},
-      )
-      await _set_step_state(db, run_id, "report", "RUNNING", _log("INFO", "KPI snapshot generated"))
       report_md = f"# Backtest Report\n\n- Trades: {len(result.trades)}\n- Return%: {result.kpis.get('return_pct'):.2f}\n- Sharpe: {result.kpis.get('sharpe'):.2f}\n- MaxDD%: {result.kpis.get('max_dd_pct'):.2f}\n"
-      await _upsert_artifact(db, run_id, "report.md", "markdown", f"/api/runs/{run_id}/artifacts/report.md", content={"markdown": report_md})
-      await _upsert_artifact(db, run_id, "equity.png", "image", f"/api/runs/{run_id}/artifacts/equity.png", content=None)
-      csv_lines = ["decision_time,fill_time,symbol,side,qty,fill_price"]
-      for t in result.trades:
-        csv_lines.append(
-          f"{t['decision_time'].isoformat()},{t['fill_time'].isoformat()},{t['symbol']},{t['side']},{t['qty']},{t['fill_price']}"
-        )
-      await _upsert_artifact(
+      await _upsert_artifacts(
         db,
         run_id,
-        "trades.csv",
-        "csv",
-        f"/api/runs/{run_id}/artifacts/trades.csv",
-        content={"csv": "\n".join(csv_lines)},
+        [
+          ("report.json", "json", f"/api/runs/{run_id}/report", report),
+          ("kpis.json", "json", f"/api/runs/{run_id}/artifacts/kpis.json", ArtifactParts({"kpis": result.kpis})),
+          ("ai_summary.json", "json", f"/api/runs/{run_id}/artifacts/ai_summary.json", ai_summary),
+          ("divergence_signals.json", "json", f"/api/runs/{run_id}/artifacts/divergence_signals.json", ArtifactParts({"divergences": divergences})),
+          ("report.md", "markdown", f"/api/runs/{run_id}/artifacts/report.md", {"markdown": report_md}),
+          ("equity.png", "image", f"/api/runs/{run_id}/artifacts/equity.png", None),
+          ("trades.csv", "csv", f"/api/runs/{run_id}/artifacts/trades.csv", ArtifactParts({"trades": result.trades})),
+        ],
       )
-      await _set_step_state(db, run_id, "report", "DONE", _log("INFO", "Report ready"))
-
-      for t in result.trades:
-        tr = Trade(
-          run_id=run_id,
-          decision_time=t["decision_time"],
-          fill_time=t["fill_time"],
-          symbol=t["symbol"],
-          side=t["side"],
-          qty=float(t["qty"]),
-          fill_price=float(t["fill_price"]),
-          cost=t["cost"],
-          why=t["why"],
-        )
-        db.add(tr)
+      await steps.set(db, "report", "RUNNING", _log("INFO", "Report artifact persisted"))
+      await steps.set(db, "report", "RUNNING", _log("INFO", "KPI snapshot generated"))
+      await steps.set(db, "report", "DONE", _log("INFO", "Report ready"))
+
       await db.commit()
 
       if run.mode != "BACKTEST_ONLY":
-        await _set_step_state(db, run_id, "deploy", "PENDING", _log("INFO", "Awaiting confirm"))
+        await steps.set(db, "deploy", "PENDING", _log("INFO", "Awaiting confirm"))
 
       run.state = "completed"
+      # Any buffered step logs go out in the same commit as the run state.
+      await steps.flush(db)
+      await db.commit()
+      try:
+        # Materialize this run's symbols so the next backtest over them skips minute data.
+        await enqueue_session_bars_refresh_async(
+          [str((universe or {}).get("signal_symbol") or ""), str((universe or {}).get("trade_symbol") or "")],
+          since=start_date,
+        )
+      except Exception:
+        logger.warning("session_bars_refresh_enqueue_failed", exc_info=True, extra={"run_id": str(run_id)})
+
+    try:
+      await control.watch(_stages())
+    except RunCancelled as e:
+      logger.info("run_cancelled", extra={"run_id": str(run_id), "reason": e.reason})
+      # Drop uncommitted work, and the trades already committed, of the unfinished backtest.
+      await db.rollback()
+      await TradeWriter(run_id).clear(db)
+      run.state = "cancelled"
+      if e.reason == "deadline":
+        run.error = {"code": "EXECUTION_GUARD_BLOCKED", "message": "Run exceeded its deadline", "details": {"start_date": start_date, "end_date": end_date}}
       await db.commit()
+      try:
+        message = "Run deadline exceeded" if e.reason == "deadline" else "Run cancelled"
+        for step_id in steps.running_steps():
+          await steps.set(db, step_id, "FAILED", _log("WARN", message), flush=False)
+        await steps.flush(db)
+      except Exception:
+        pass
     except AppError as e:
       logger.exception("run_failed", extra={"run_id": str(run_id), "code": e.code})
+      # A failed run keeps no trades, same as a cancelled one.
+      await db.rollback()
+      await TradeWriter(run_id).clear(db)
       run.state = "failed"
       run.error = {"code": e.code, "message": e.message, "details": e.details or {}}
       await db.commit()
       try:
-        await _set_step_state(
+        await steps.set(
           db,
-          run_id,
           "backtest",
           "FAILED",
           _log("ERROR", "Run failed", {"code": e.code, "message": e.message}),
         )
       except Exception:
         pass
+    except asyncio.CancelledError:
+      # The run itself was cancelled (worker or API shutdown): record it as failed, then let the
+      # cancellation through.
+      logger.warning("run_interrupted", extra={"run_id": str(run_id)})
+      await db.rollback()
+      await TradeWriter(run_id).clear(db)
+      run.state = "failed"
+      run.error = {"code": "INTERNAL", "message": "Run was interrupted", "details": {}}
+      await db.commit()
+      raise
     except Exception as e:
       logger.exception("run_crash", extra={"run_id": str(run_id)})
+      await db.rollback()
+      await TradeWriter(run_id).clear(db)
       run.state = "failed"
       run.error = {"code": "INTERNAL", "message": "Unhandled error", "details": {"error": str(e)}}
       await db.commit()
       try:
-        await _set_step_state(
+        await steps.set(
           db,
-          run_id,
           "backtest",
           "FAILED",
           _log("ERROR", "Unhandled failure", {"error": str(e)}),
@@ -476,4 +544,7 @@ async def execute_run(
       except Exception:
         pass
     finally:
+      await control.close()
       await _clear_queue_lock(run_id)
+      await events.publish({"type": "run", "state": run.state})
+      await events.close()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import RunStep
+
+# Logs are appended server-side, so each flush ships only the new entries whatever the log length.
+# SET only reads the target row `s`, which READ COMMITTED re-evaluates against the latest version,
+# so concurrent writers to one step append to each other's entries instead of clobbering them.
+# `replace_msg` drops the stored last entry first when it is still that message (the live progress
+# line); arrays over :max_logs keep only their newest entries.
+_MERGED = "((CASE WHEN s.logs -> -1 ->> 'msg' = c.replace_msg THEN s.logs - -1 ELSE s.logs END) || c.append)"
+_FLUSH_SQL = text(
+  f"""
+UPDATE run_steps AS s
+SET state = c.state,
+    logs = CASE
+      WHEN jsonb_array_length({_MERGED}) <= :max_logs THEN {_MERGED}
+      ELSE (
+        SELECT jsonb_agg(t.e ORDER BY t.i)
+        FROM jsonb_array_elements({_MERGED}) WITH ORDINALITY AS t(e, i)
+        WHERE t.i > jsonb_array_length({_MERGED}) - :max_logs
+      )
+    END,
+    updated_at = now()
+FROM jsonb_to_recordset(:changes) AS c(step_id text, state text, replace_msg text, append jsonb)
+WHERE s.run_id = :run_id AND s.step_id = c.step_id
+"""
+).bindparams(bindparam("changes", type_=JSONB))
+
+
+class StepStateBuffer:
+  # Pending changes to one run's step rows. State changes flush immediately so clients see every
+  # transition; log-only changes (including per-session progress) flush at most every interval.
+  # Each flush is one multi-row UPDATE plus its COMMIT, however many steps changed. `publish`, when
+  # given, receives every change as it happens (see run_events).
+  def __init__(
+    self,
+    run_id: uuid.UUID,
+    *,
+    flush_interval_seconds: float,
+    max_logs: int = 200,
+    publish: Callable[[dict[str, Any]], Awaitable[None]] | None = None,
+  ) -> None:
+    self.run_id = run_id
+    self._publish = publish
+    self._interval = max(0.0, float(flush_interval_seconds))
+    self._max_logs = max(1, int(max_logs))
+    self._state: dict[str, str] = {}
+    self._last_msg: dict[str, str | None] = {}
+    self._pending: dict[str, dict[str, Any]] = {}
+    self._last_flush = 0.0
+    self.flushes = 0
+
+  async def load(self, db: AsyncSession) -> None:
+    # Only the state and the newest message are needed; the log arrays stay in Postgres.
+    rows = (
+      await db.execute(
+        select(RunStep.step_id, RunStep.state, RunStep.logs[-1]["msg"].as_string()).where(RunStep.run_id == self.run_id)
+      )
+    ).all()
+    self._state = {step_id: state for step_id, state, _ in rows}
+    self._last_msg = {step_id: msg for step_id, _, msg in rows}
+    self._pending.clear()
+    self._last_flush = time.monotonic()
+
+  def _pending_for(self, step_id: str) -> dict[str, Any]:
+    pending = self._pending.get(step_id)
+    if pending is None:
+      pending = {"step_id": step_id, "state": self._state[step_id], "replace_msg": None, "append": []}
+      self._pending[step_id] = pending
+    return pending
+
+  async def set(self, db: AsyncSession, step_id: str, state: str, log: dict[str, Any] | None = None, *, flush: bool = True) -> None:
+    # flush=False lets a caller batch several transitions into its own flush.
+    transition = flush and self._state[step_id] != state
+    self._state[step_id] = state
+    pending = self._pending_for(step_id)
+    pending["state"] = state
+    if log is not None:
+      pending["append"].append(log)
+      self._last_msg[step_id] = log.get("msg")
+    if self._publish is not None:
+      await self._publish({"type": "step", "step_id": step_id, "state": state, "log": log})
+    await self._maybe_flush(db, force=transition)
+
+  async def progress(self, db: AsyncSession, step_id: str, log: dict[str, Any]) -> None:
+    # A run has one live progress line: replace it in place instead of appending one per update.
+    pending = self._pending_for(step_id)
+    msg = log.get("msg")
+    if self._last_msg.get(step_id) == msg:
+      if pending["append"]:
+        pending["append"][-1] = log
+      else:
+        pending["replace_msg"] = msg
+        pending["append"] = [log]
+    else:
+      pending["append"].append(log)
+    self._last_msg[step_id] = msg
+    if self._publish is not None:
+      await self._publish({"type": "progress", "step_id": step_id, "log": log})
+    await self._maybe_flush(db, force=False)
+
+  async def _maybe_flush(self, db: AsyncSession, *, force: bool) -> None:
+    if force or time.monotonic() - self._last_flush >= self._interval:
+      await self.flush(db)
+
+  def running_steps(self) -> list[str]:
+    return [step_id for step_id, state in self._state.items() if state == "RUNNING"]
+
+  def pending_changes(self) -> list[dict[str, Any]]:
+    return [self._pending[step_id] for step_id in sorted(self._pending)]
+
+  async def flush(self, db: AsyncSession) -> None:
+    if not self._pending:
+      return
+    await db.execute(_FLUSH_SQL, {"run_id": self.run_id, "max_logs": self._max_logs, "changes": self.pending_changes()})
+    await db.commit()
+    self._pending.clear()
+    self._last_flush = time.monotonic()
+    self.flushes += 1
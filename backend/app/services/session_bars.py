@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.errors import AppError
+from app.db.models import SessionBar
+from app.services.market_calendar import get_exchange_calendar
+from app.services.market_data import NS_PER_MINUTE, MarketDataProvider, from_epoch_ns
+
+logger = logging.getLogger(__name__)
+
+FOUR_HOURS_NS = 4 * 60 * NS_PER_MINUTE
+# Sessions this close to the newest one are re-materialized on every refresh.
+_RECENT_SESSIONS = 3
+
+
+@dataclass(frozen=True)
+class BarRanges:
+  # OHLCV over one [lo, hi) row range per session; NaN where the range has no bars.
+  has: np.ndarray
+  o: np.ndarray
+  h: np.ndarray
+  l: np.ndarray
+  c: np.ndarray
+  v: np.ndarray
+
+
+@dataclass(frozen=True)
+class SessionFrame:
+  # Everything the engine reads per session: the session candle, the SESSION_ALIGNED_4H
+  # segments and the last price at or before the decision time.
+  day: BarRanges
+  segments: tuple[BarRanges, BarRanges]
+  has_decision: np.ndarray
+  decision_close: np.ndarray
+
+
+@dataclass(frozen=True)
+class SessionSchedule:
+  dates: list[date]
+  opens_ns: np.ndarray
+  closes_ns: np.ndarray
+  decision_ns: np.ndarray
+
+  @property
+  def split_ns(self) -> np.ndarray:
+    # Half days close before open+4h and have a single segment.
+    return np.minimum(self.opens_ns + FOUR_HOURS_NS, self.closes_ns)
+
+
+def _range_ohlcv(bars: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> BarRanges:
+  has = hi > lo
+  nan = np.full(lo.size, np.nan)
+  if bars.size == 0 or not has.any():
+    return BarRanges(has=has, o=nan, h=nan.copy(), l=nan.copy(), c=nan.copy(), v=nan.copy())
+  last = bars.size - 1
+  # reduceat over interleaved [lo, hi) pairs; a sentinel row keeps hi == len(bars) addressable.
+  edges = np.column_stack([lo, hi]).ravel()
+  pad = np.zeros(1, dtype=bars.dtype)
+  padded = np.concatenate([bars, pad])
+  h = np.maximum.reduceat(padded["h"], edges)[::2]
+  l = np.minimum.reduceat(padded["l"], edges)[::2]
+  v = np.add.reduceat(padded["v"], edges)[::2]
+  return BarRanges(
+    has=has,
+    o=np.where(has, bars["o"][np.minimum(lo, last)], np.nan),
+    h=np.where(has, h, np.nan),
+    l=np.where(has, l, np.nan),
+    c=np.where(has, bars["c"][np.clip(hi - 1, 0, last)], np.nan),
+    v=np.where(has, v, np.nan),
+  )
+
+
+def _bar_at(bars: np.ndarray, at_ns: np.ndarray) -> np.ndarray:
+  # Index of the bar stamped exactly at each time, or -1.
+  if bars.size == 0:
+    return np.full(at_ns.size, -1)
+  idx = np.minimum(np.searchsorted(bars["ts"], at_ns, side="left"), bars.size - 1)
+  return np.where(bars["ts"][idx] == at_ns, idx, -1)
+
+
+def _with_bar(ranges: BarRanges, bars: np.ndarray, at: np.ndarray) -> BarRanges:
+  # Extends each range by one more (later) bar, where `at` names one.
+  hit = at >= 0
+  if not hit.any():
+    return ranges
+  bar = bars[np.maximum(at, 0)]
+  return BarRanges(
+    has=ranges.has | hit,
+    o=np.where(ranges.has, ranges.o, np.where(hit, bar["o"], np.nan)),
+    h=np.where(hit, np.fmax(ranges.h, bar["h"]), ranges.h),
+    l=np.where(hit, np.fmin(ranges.l, bar["l"]), ranges.l),
+    c=np.where(hit, bar["c"], ranges.c),
+    v=np.where(hit, np.where(ranges.has, ranges.v, 0.0) + bar["v"], ranges.v),
+  )
+
+
+def session_edge_windows(schedule: SessionSchedule, bar_minutes: int) -> list[tuple[datetime, datetime]]:
+  # The minutes a coarse summary cannot resolve, one window per session: from the 4h split (or the
+  # bucket holding the decision time, if earlier) through the close. See summarize_sessions.
+  bucket = schedule.decision_ns - schedule.decision_ns % (bar_minutes * NS_PER_MINUTE)
+  starts = np.minimum(bucket, schedule.split_ns)
+  return [(from_epoch_ns(a), from_epoch_ns(b)) for a, b in zip(starts.tolist(), schedule.closes_ns.tolist())]
+
+
+def summarize_sessions(bars: np.ndarray, schedule: SessionSchedule, *, bar_minutes: int = 1, edges: np.ndarray | None = None) -> SessionFrame:
+  # Minute sessions run open through close inclusive, so the 16:00 bar (the closing cross print)
+  # is the session close; the first 4h segment likewise ends with the bar stamped at open+4h, which
+  # also opens the second. A coarse bucket stamped at a boundary is almost entirely after it, so
+  # coarse ranges stop before it and `edges`, the minute bars of session_edge_windows, supply the
+  # boundary bar and the decision price; the result then matches the minute path exactly.
+  ts = bars["ts"]
+  end_side = "right" if bar_minutes == 1 else "left"
+  lo = np.searchsorted(ts, schedule.opens_ns, side="left")
+  hi = np.searchsorted(ts, schedule.closes_ns, side=end_side)
+  split_lo = np.clip(np.searchsorted(ts, schedule.split_ns, side="left"), lo, hi)
+  split_hi = np.clip(np.searchsorted(ts, schedule.split_ns, side=end_side), lo, hi)
+  day = _range_ohlcv(bars, lo, hi)
+  segments = (_range_ohlcv(bars, lo, split_hi), _range_ohlcv(bars, split_lo, hi))
+  if bar_minutes == 1:
+    decision_idx = np.searchsorted(ts, schedule.decision_ns, side="right") - 1
+    has_decision = (hi > lo) & (decision_idx >= lo)
+    decision_close = np.where(has_decision, bars["c"][np.maximum(decision_idx, 0)], np.nan) if ts.size else np.full(lo.size, np.nan)
+    return SessionFrame(day=day, segments=segments, has_decision=has_decision, decision_close=decision_close)
+
+  edges = np.empty(0, dtype=bars.dtype) if edges is None else edges
+  at_close = _bar_at(edges, schedule.closes_ns)
+  full_days = schedule.split_ns < schedule.closes_ns
+  day = _with_bar(day, edges, at_close)
+  segments = (
+    _with_bar(segments[0], edges, np.where(full_days, _bar_at(edges, schedule.split_ns), at_close)),
+    _with_bar(segments[1], edges, at_close),
+  )
+  # The decision price is the last minute at or before the decision time: inside the decision
+  # bucket it is an edge bar, and before it the close of the previous coarse bucket.
+  bucket = schedule.decision_ns - schedule.decision_ns % (bar_minutes * NS_PER_MINUTE)
+  decision_close = np.full(lo.size, np.nan)
+  in_bucket = np.zeros(lo.size, dtype=bool)
+  if edges.size:
+    edge_idx = np.searchsorted(edges["ts"], schedule.decision_ns, side="right") - 1
+    edge_idx = np.maximum(edge_idx, 0)
+    in_bucket = (edges["ts"][edge_idx] <= schedule.decision_ns) & (edges["ts"][edge_idx] >= np.maximum(bucket, schedule.opens_ns))
+    decision_close = np.where(in_bucket, edges["c"][edge_idx], decision_close)
+  coarse_idx = np.searchsorted(ts, bucket, side="left") - 1
+  before = ~in_bucket & (coarse_idx >= lo)
+  if ts.size:
+    decision_close = np.where(before, bars["c"][np.maximum(coarse_idx, 0)], decision_close)
+  return SessionFrame(day=day, segments=segments, has_decision=in_bucket | before, decision_close=decision_close)
+
+
+def build_session_schedule(start_date: str | date, end_date: str | date, decision_offset: timedelta = timedelta(minutes=2)) -> SessionSchedule:
+  cal = get_exchange_calendar("XNYS")
+  window = cal.session_slice(date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date)))
+  closes = cal.closes_ns[window]
+  return SessionSchedule(
+    dates=cal.dates[window],
+    opens_ns=cal.opens_ns[window],
+    closes_ns=closes,
+    decision_ns=closes - int(decision_offset.total_seconds()) * 1_000_000_000,
+  )
+
+
+def _float_or_none(value: float) -> float | None:
+  return None if np.isnan(value) else float(value)
+
+
+def session_bar_rows(source: str, symbol: str, schedule: SessionSchedule, frame: SessionFrame) -> list[dict[str, Any]]:
+  rows: list[dict[str, Any]] = []
+  split_ns = schedule.split_ns
+  for i, session_date in enumerate(schedule.dates):
+    open_ns, close_ns = int(schedule.opens_ns[i]), int(schedule.closes_ns[i])
+    # Empty sessions are stored too, so a complete range is distinguishable from an unrefreshed one.
+    spans = [("1d", 0, open_ns, close_ns, frame.day)]
+    spans.append(("4h", 0, open_ns, int(split_ns[i]), frame.segments[0]))
+    if split_ns[i] < close_ns:
+      spans.append(("4h", 1, int(split_ns[i]), close_ns, frame.segments[1]))
+    for timeframe, seq, start_ns, end_ns, ranges in spans:
+      rows.append(
+        {
+          "source": source,
+          "symbol": symbol,
+          "timeframe": timeframe,
+          "session_date": session_date,
+          "seq": seq,
+          "bar_start": from_epoch_ns(start_ns),
+          "bar_end": from_epoch_ns(end_ns),
+          "o": _float_or_none(ranges.o[i]),
+          "h": _float_or_none(ranges.h[i]),
+          "l": _float_or_none(ranges.l[i]),
+          "c": _float_or_none(ranges.c[i]),
+          "v": _float_or_none(ranges.v[i]),
+          "decision_close": _float_or_none(frame.decision_close[i]) if timeframe == "1d" else None,
+        }
+      )
+  return rows
+
+
+def _frame_from_rows(rows: list[SessionBar], schedule: SessionSchedule) -> SessionFrame | None:
+  position = {d: i for i, d in enumerate(schedule.dates)}
+  n = len(schedule.dates)
+
+  def _empty() -> dict[str, np.ndarray]:
+    return {"has": np.zeros(n, dtype=bool), **{k: np.full(n, np.nan) for k in ("o", "h", "l", "c", "v")}}
+
+  day, seg0, seg1 = _empty(), _empty(), _empty()
+  decision_close = np.full(n, np.nan)
+  seen = np.zeros(n, dtype=bool)
+  for row in rows:
+    i = position.get(row.session_date)
+    if i is None:
+      continue
+    target = day if row.timeframe == "1d" else seg0 if row.seq == 0 else seg1
+    if row.timeframe == "1d":
+      seen[i] = True
+      decision_close[i] = np.nan if row.decision_close is None else row.decision_close
+    if row.c is None:
+      continue
+    target["has"][i] = True
+    for k in ("o", "h", "l", "c", "v"):
+      target[k][i] = getattr(row, k)
+  if not seen.all():
+    return None
+  return SessionFrame(
+    day=BarRanges(**day),
+    segments=(BarRanges(**seg0), BarRanges(**seg1)),
+    has_decision=~np.isnan(decision_close),
+    decision_close=decision_close,
+  )
+
+
+class SessionBarStore:
+  # Materialized per-session 1d and SESSION_ALIGNED_4H bars, computed from minute data by the refresh job.
+  def __init__(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+    self._session_factory = session_factory
+
+  async def load(self, source: str, symbol: str, schedule: SessionSchedule) -> SessionFrame | None:
+    if not schedule.dates:
+      return None
+    async with self._session_factory() as db:
+      rows = (
+        await db.execute(
+          select(SessionBar)
+          .where(
+            SessionBar.source == source,
+            SessionBar.symbol == symbol,
+            SessionBar.session_date >= schedule.dates[0],
+            SessionBar.session_date <= schedule.dates[-1],
+          )
+          .order_by(SessionBar.session_date, SessionBar.timeframe, SessionBar.seq)
+        )
+      ).scalars().all()
+    return _frame_from_rows(list(rows), schedule)
+
+  async def last_session_date(self, source: str, symbol: str) -> date | None:
+    async with self._session_factory() as db:
+      return (
+        await db.execute(
+          select(func.max(SessionBar.session_date)).where(
+            SessionBar.source == source,
+            SessionBar.symbol == symbol,
+            SessionBar.timeframe == "1d",
+          )
+        )
+      ).scalar_one_or_none()
+
+  async def upsert(self, rows: list[dict[str, Any]]) -> int:
+    if not rows:
+      return 0
+    async with self._session_factory() as db:
+      for i in range(0, len(rows), 1000):
+        chunk = rows[i : i + 1000]
+        stmt = pg_insert(SessionBar).values(chunk)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+          index_elements=["source", "symbol", "timeframe", "session_date", "seq"],
+          set_={k: getattr(excluded, k) for k in ("bar_start", "bar_end", "o", "h", "l", "c", "v", "decision_close")},
+        )
+        await db.execute(stmt)
+      await db.commit()
+    return len(rows)
+
+
+async def refresh_session_bars(
+  store: SessionBarStore,
+  provider: MarketDataProvider,
+  symbol: str,
+  *,
+  since: date | None = None,
+  now: datetime | None = None,
+) -> int:
+  # Incremental: the newest stored sessions and everything after them, up to the last closed session.
+  # A symbol with nothing stored yet starts at `since` (the range its triggering run used), so the
+  # first refresh costs what that run fetched rather than a backfill from the configured start.
+  if provider.name == "synthetic":
+    # Synthetic bars are generated on demand; there is nothing worth materializing.
+    return 0
+  # data_health imports this module for SessionSchedule.
+  from app.services.data_health import analyze_bars
+
+  symbol = symbol.strip().upper()
+  source = provider.cache_namespace
+  cal = get_exchange_calendar("XNYS")
+  through = cal.last_closed_session(now or datetime.now(timezone.utc))
+  if through is None:
+    return 0
+  last = await store.last_session_date(source, symbol)
+  if last:
+    # Vendors backfill the latest sessions late, so the newest stored ones are redone every time.
+    first = cal.dates[max(0, cal.session_slice(cal.first_session, last).stop - _RECENT_SESSIONS)]
+  else:
+    first = max(date.fromisoformat(settings.session_bars_backfill_start), since or date.min)
+  if first > through:
+    return 0
+  schedule = build_session_schedule(first, through)
+  if not schedule.dates:
+    return 0
+  try:
+    bars = await provider.get_minute_bar_array(symbol, from_epoch_ns(int(schedule.opens_ns[0])), from_epoch_ns(int(schedule.closes_ns[-1])))
+  except AppError as e:
+    if e.http_status != 404:
+      raise
+    logger.info("session_bars_refresh_no_data", extra={"symbol": symbol, "source": source})
+    return 0
+  frame = summarize_sessions(bars, schedule)
+  # Recent sessions that came back empty or cut short are left out until a later refresh fills
+  # them in, as the bar cache does; older empty sessions (halts) are stored as such.
+  recent = build_session_schedule(schedule.dates[-_RECENT_SESSIONS:][0], through)
+  incomplete = set(analyze_bars(bars, recent).truncated_sessions)
+  incomplete |= {d for d, has in zip(recent.dates, frame.day.has[-len(recent.dates) :]) if not has}
+  rows = session_bar_rows(source, symbol, schedule, frame)
+  if incomplete:
+    logger.info("session_bars_skip_incomplete_sessions", extra={"symbol": symbol, "source": source, "days": sorted(d.isoformat() for d in incomplete)})
+    rows = [row for row in rows if row["session_date"] not in incomplete]
+  return await store.upsert(rows)
@@ -1,14 +1,12 @@
 from __future__ import annotations
 
 import asyncio
-import json
-import uuid
 from typing import Any
-from urllib.parse import quote
 
 import httpx
 
 from app.core.config import settings
+from app.core.serialization import loads
 
 
 def storage_enabled() -> bool:
@@ -48,33 +46,9 @@ def parse_storage_uri(uri: str) -> tuple[str, str] | None:
   return payload[:first], payload[first + 1 :]
 
 
-def _object_path(run_id: uuid.UUID, name: str) -> str:
-  safe_name = quote(name, safe="._-")
-  return f"runs/{run_id}/{safe_name}"
-
-
-def _serialize_content(type_: str, content: Any) -> tuple[bytes, str]:
-  if type_ == "json":
-    return json.dumps(content, ensure_ascii=False).encode("utf-8"), "application/json"
-  if type_ == "csv":
-    csv_text = ""
-    if isinstance(content, dict):
-      raw = content.get("csv")
-      if isinstance(raw, str):
-        csv_text = raw
-    elif isinstance(content, str):
-      csv_text = content
-    return csv_text.encode("utf-8"), "text/csv; charset=utf-8"
-  if type_ == "markdown":
-    md_text = ""
-    if isinstance(content, dict):
-      raw = content.get("markdown")
-      if isinstance(raw, str):
-        md_text = raw
-    elif isinstance(content, str):
-      md_text = content
-    return md_text.encode("utf-8"), "text/markdown; charset=utf-8"
-  return json.dumps(content, ensure_ascii=False).encode("utf-8"), "application/octet-stream"
+def _blob_path(hash_: str) -> str:
+  # Content-addressed: the same payload always lands on the same object.
+  return f"blobs/{hash_[:2]}/{hash_}.json"
 
 
 def _upload_bytes(bucket: str, path: str, payload: bytes, content_type: str) -> None:
@@ -86,19 +60,12 @@ def _upload_bytes(bucket: str, path: str, payload: bytes, content_type: str) ->
   )
 
 
-async def upload_artifact_content(
-  *,
-  run_id: uuid.UUID,
-  name: str,
-  type_: str,
-  content: Any,
-) -> str | None:
-  if not storage_enabled() or content is None:
+async def upload_blob(hash_: str, payload: bytes) -> str | None:
+  if not storage_enabled():
     return None
   bucket = settings.supabase_storage_bucket
-  path = _object_path(run_id, name)
-  payload, content_type = _serialize_content(type_, content)
-  await asyncio.to_thread(_upload_bytes, bucket, path, payload, content_type)
+  path = _blob_path(hash_)
+  await asyncio.to_thread(_upload_bytes, bucket, path, payload, "application/json")
   return storage_uri(bucket, path)
 
 
@@ -144,7 +111,7 @@ async def download_json(uri: str) -> dict[str, Any] | None:
   if payload is None:
     return None
   try:
-    data = json.loads(payload.decode("utf-8"))
+    data = loads(payload)
     if isinstance(data, dict):
       return data
     return None
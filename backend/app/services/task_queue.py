@@ -12,6 +12,7 @@ from sqlalchemy import select
 from app.core.config import settings
 from app.db.engine import SessionLocal
 from app.db.models import Run, RunArtifact
+from app.services.cache_warmer import next_warm_time
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +64,66 @@ async def enqueue_run_job_async(run_id: uuid.UUID, start_date: str, end_date: st
   return await asyncio.to_thread(enqueue_run_job, run_id, start_date, end_date)
 
 
+def enqueue_session_bars_refresh(symbols: list[str], since: str | None = None) -> str | None:
+  if not settings.task_queue_enabled or not settings.session_bars_enabled:
+    return None
+  unique = sorted({s.strip().upper() for s in symbols if s and s.strip()})
+  if not unique:
+    return None
+
+  redis_conn = _redis_sync()
+  dedupe_key = f"vibe:session_bars:queued:{','.join(unique)}"
+  if not redis_conn.set(dedupe_key, "1", nx=True, ex=600):
+    return None
+  try:
+    queue = Queue(settings.task_queue_background_name, connection=redis_conn)
+    job = queue.enqueue(
+      "app.services.worker_jobs.refresh_session_bars_job",
+      unique,
+      since,
+      job_timeout=int(settings.task_queue_job_timeout_seconds),
+      result_ttl=3600,
+      failure_ttl=86400,
+    )
+    return str(job.id)
+  except Exception:
+    redis_conn.delete(dedupe_key)
+    raise
+
+
+async def enqueue_session_bars_refresh_async(symbols: list[str], since: str | None = None) -> str | None:
+  return await asyncio.to_thread(enqueue_session_bars_refresh, symbols, since)
+
+
+def schedule_cache_warm(now: datetime | None = None) -> str | None:
+  # One warm-up per XNYS close, run by the worker's RQ scheduler; each run schedules the next.
+  if not settings.task_queue_enabled or not settings.cache_warm_enabled:
+    return None
+  when = next_warm_time(now)
+  if when is None:
+    return None
+
+  redis_conn = _redis_sync()
+  dedupe_key = f"vibe:cache_warm:scheduled:{when.isoformat()}"
+  ttl = int((when - (now or datetime.now(timezone.utc))).total_seconds()) + 3600
+  if not redis_conn.set(dedupe_key, "1", nx=True, ex=max(60, ttl)):
+    return None
+  try:
+    queue = Queue(settings.task_queue_background_name, connection=redis_conn)
+    job = queue.enqueue_at(
+      when,
+      "app.services.worker_jobs.warm_market_data_cache_job",
+      job_timeout=int(settings.task_queue_job_timeout_seconds),
+      result_ttl=86400,
+      failure_ttl=86400,
+    )
+    logger.info("cache_warm_scheduled", extra={"at": when.isoformat(), "job_id": job.id})
+    return str(job.id)
+  except Exception:
+    redis_conn.delete(dedupe_key)
+    raise
+
+
 async def recover_running_runs() -> int:
   if not settings.task_queue_enabled:
     return 0
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.serialization import dumps
+from app.db.models import Trade
+
+# Trades go straight from the engine's dicts to Postgres rows: no ORM objects, and the JSONB
+# payloads are serialized once by orjson. asyncpg streams them with COPY; other drivers get
+# chunked executemany INSERTs of the same records.
+COLUMNS = ("id", "run_id", "action_id", "decision_time", "fill_time", "symbol", "side", "qty", "fill_price", "cost", "why", "created_at")
+_DEFAULT_ACTION_ID = Trade.__table__.c.action_id.default.arg
+_INSERT_CHUNK = 1000
+_INSERT_SQL = (
+  "INSERT INTO {table} (" + ", ".join(COLUMNS) + ") VALUES ("
+  + ", ".join(f"CAST(:{c} AS JSONB)" if c in ("cost", "why") else f":{c}" for c in COLUMNS)
+  + ")"
+)
+
+
+def _json(value: Any) -> str:
+  return dumps(value or {}).decode()
+
+
+def trade_records(run_id: uuid.UUID, trades: list[dict[str, Any]], created_at: datetime | None = None) -> list[tuple[Any, ...]]:
+  created_at = created_at or datetime.now(timezone.utc)
+  return [
+    (
+      uuid.uuid4(),
+      run_id,
+      str(t.get("action_id") or _DEFAULT_ACTION_ID),
+      t["decision_time"],
+      t["fill_time"],
+      t["symbol"],
+      t["side"],
+      float(t["qty"]),
+      float(t["fill_price"]),
+      _json(t.get("cost")),
+      _json(t.get("why")),
+      created_at,
+    )
+    for t in trades
+  ]
+
+
+async def copy_trade_records(db: AsyncSession, records: list[tuple[Any, ...]], table: str = "trades") -> str:
+  # Runs inside the session's transaction; the caller commits.
+  if not records:
+    return "none"
+  raw = await (await db.connection()).get_raw_connection()
+  driver = raw.driver_connection
+  if hasattr(driver, "copy_records_to_table"):
+    await driver.copy_records_to_table(table, records=records, columns=COLUMNS)
+    return "copy"
+  stmt = text(_INSERT_SQL.format(table=table))
+  for start in range(0, len(records), _INSERT_CHUNK):
+    await db.execute(stmt, [dict(zip(COLUMNS, r)) for r in records[start : start + _INSERT_CHUNK]])
+  return "insert"
+
+
+class TradeWriter:
+  # Writes one run's trades in the batches the engine hands over while it is still running.
+  def __init__(self, run_id: uuid.UUID) -> None:
+    self.run_id = run_id
+    self.written = 0
+
+  async def clear(self, db: AsyncSession) -> None:
+    # Drops rows left by an earlier attempt of the same run (queue retries).
+    await db.execute(delete(Trade).where(Trade.run_id == self.run_id))
+    self.written = 0
+
+  async def write(self, db: AsyncSession, trades: list[dict[str, Any]]) -> None:
+    records = trade_records(self.run_id, trades)
+    await copy_trade_records(db, records)
+    self.written += len(records)
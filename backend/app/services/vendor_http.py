@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import time
+from collections import deque
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+  return importlib.util.find_spec("h2") is not None
+
+
+class VendorHttpClient:
+  # One keep-alive connection pool per vendor and event loop, shared by every request in the process.
+  def __init__(self, name: str) -> None:
+    self.name = name
+    self._client: httpx.AsyncClient | None = None
+    self._client_loop: asyncio.AbstractEventLoop | None = None
+    self._requests = 0
+    self._errors = 0
+    self._connections_opened = 0
+    self._latencies_ms: deque[float] = deque(maxlen=512)
+
+  def _build_client(self) -> httpx.AsyncClient:
+    http2 = bool(settings.market_data_http2)
+    if http2 and not _http2_available():
+      logger.warning("vendor_http2_unavailable", extra={"vendor": self.name})
+      http2 = False
+    return httpx.AsyncClient(
+      timeout=httpx.Timeout(float(settings.market_data_http_timeout_seconds), connect=10.0),
+      limits=httpx.Limits(
+        max_connections=max(1, int(settings.market_data_http_max_connections)),
+        max_keepalive_connections=max(1, int(settings.market_data_http_max_keepalive_connections)),
+        keepalive_expiry=float(settings.market_data_http_keepalive_expiry_seconds),
+      ),
+      http2=http2,
+    )
+
+  def client(self) -> httpx.AsyncClient:
+    # Pools are bound to the loop that opened them; RQ jobs each run under a fresh asyncio.run().
+    loop = asyncio.get_running_loop()
+    if self._client is None or self._client.is_closed or self._client_loop is not loop:
+      self._client = self._build_client()
+      self._client_loop = loop
+    return self._client
+
+  async def _trace(self, event_name: str, info: dict[str, Any]) -> None:
+    if event_name == "connection.connect_tcp.complete":
+      self._connections_opened += 1
+
+  async def get(self, url: str, *, params: dict[str, str] | None = None, headers: dict[str, str] | None = None) -> httpx.Response:
+    started = time.perf_counter()
+    self._requests += 1
+    try:
+      resp = await self.client().get(url, params=params, headers=headers, extensions={"trace": self._trace})
+    except httpx.HTTPError:
+      self._errors += 1
+      raise
+    self._latencies_ms.append((time.perf_counter() - started) * 1000.0)
+    if resp.status_code >= 400:
+      self._errors += 1
+    return resp
+
+  async def aclose(self) -> None:
+    client = self._client
+    self._client = None
+    self._client_loop = None
+    if client is None or client.is_closed:
+      return
+    try:
+      await client.aclose()
+    except RuntimeError:
+      # The owning loop is already gone; its sockets went with it.
+      pass
+
+  def stats(self) -> dict[str, Any]:
+    latencies = sorted(self._latencies_ms)
+
+    def _pct(q: float) -> float | None:
+      if not latencies:
+        return None
+      return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2)
+
+    reuse = 1.0 - (self._connections_opened / self._requests) if self._requests else None
+    return {
+      "vendor": self.name,
+      "requests": self._requests,
+      "errors": self._errors,
+      "connections_opened": self._connections_opened,
+      "connection_reuse_ratio": round(max(0.0, reuse), 4) if reuse is not None else None,
+      "latency_ms_p50": _pct(0.50),
+      "latency_ms_p95": _pct(0.95),
+    }
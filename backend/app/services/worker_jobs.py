@@ -2,10 +2,54 @@ from __future__ import annotations
 
 import asyncio
 import uuid
+from datetime import date
 
+from app.core.config import settings
+from app.db.engine import SessionLocal
+from app.services.cache_warmer import warm_market_data_cache
+from app.services.market_data import aclose_market_data_providers, get_market_data_provider
 from app.services.run_service import execute_run
+from app.services.session_bars import SessionBarStore, refresh_session_bars
+from app.services.task_queue import schedule_cache_warm
+
+
+async def _execute_run_and_release(run_id: uuid.UUID, start_date: str, end_date: str) -> None:
+  try:
+    await execute_run(run_id, start_date=start_date, end_date=end_date)
+  finally:
+    # Vendor pools are bound to this job's event loop; close them before asyncio.run() tears it down.
+    await aclose_market_data_providers()
 
 
 def execute_run_job(run_id: str, start_date: str, end_date: str) -> None:
-  asyncio.run(execute_run(uuid.UUID(run_id), start_date=start_date, end_date=end_date))
+  asyncio.run(_execute_run_and_release(uuid.UUID(run_id), start_date, end_date))
+
+
+async def _refresh_session_bars_and_release(symbols: list[str], since: date | None) -> None:
+  try:
+    store = SessionBarStore(SessionLocal)
+    provider = get_market_data_provider()
+    for symbol in symbols:
+      await refresh_session_bars(store, provider, symbol, since=since)
+  finally:
+    await aclose_market_data_providers()
+
+
+def refresh_session_bars_job(symbols: list[str], since: str | None = None) -> None:
+  asyncio.run(_refresh_session_bars_and_release(symbols, date.fromisoformat(since) if since else None))
+
+
+async def _warm_market_data_cache_and_release() -> None:
+  try:
+    store = SessionBarStore(SessionLocal) if settings.session_bars_enabled else None
+    await warm_market_data_cache(get_market_data_provider(), SessionLocal, store=store)
+  finally:
+    await aclose_market_data_providers()
+
 
+def warm_market_data_cache_job() -> None:
+  try:
+    asyncio.run(_warm_market_data_cache_and_release())
+  finally:
+    # Keep the chain alive even when this run failed.
+    schedule_cache_warm()
@@ -1,15 +1,25 @@
 from __future__ import annotations
 
+import logging
+
 from redis import Redis
 from rq import Connection, Worker
 
 from app.core.config import settings
+from app.services.task_queue import schedule_cache_warm
+
+logger = logging.getLogger(__name__)
 
 
 def main() -> None:
   redis_conn = Redis.from_url(settings.redis_url, decode_responses=True)
+  try:
+    schedule_cache_warm()
+  except Exception:
+    logger.exception("cache_warm_schedule_failed")
   with Connection(redis_conn):
-    worker = Worker([settings.task_queue_name])
+    # Listed first, runs always take priority over background jobs.
+    worker = Worker([settings.task_queue_name, settings.task_queue_background_name])
     worker.work(with_scheduler=True)
 
 
@@ -0,0 +1,74 @@
+"""Compare report serialization: jsonable_encoder + json.dumps (the old artifact path) vs app.core.serialization.
+
+Builds a report shaped like run_service's from synthetic trades, equity and market candles.
+Run from backend/: python -m benchmarks.bench_artifact_serialization [sessions]
+"""
+from __future__ import annotations
+
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from app.core.serialization import dumps
+
+
+def _report(sessions: int) -> dict[str, Any]:
+  start = datetime(2010, 1, 4, 21, 0, tzinfo=timezone.utc)
+  rng = np.random.default_rng(7)
+  closes = 100.0 * np.cumprod(1.0 + rng.normal(0.0, 0.01, sessions))
+  times = [start + timedelta(days=i) for i in range(sessions)]
+  trades = [
+    {
+      "decision_time": times[i] - timedelta(minutes=2),
+      "fill_time": times[i],
+      "symbol": "TQQQ",
+      "side": "BUY" if i % 2 else "SELL",
+      "qty": 10.0,
+      "fill_price": float(closes[i]),
+      "cost": {"slippage_bps": 1.0, "commission_per_trade": 0.0},
+      "why": {"rule_id": "r1", "action_id": "a1", "indicators": {f"ind_{k}": float(closes[i] + k) for k in range(12)}},
+      "pnl": None,
+      "pnl_pct": None,
+    }
+    for i in range(0, sessions, 2)
+  ]
+  return {
+    "kpis": {"return_pct": 12.5, "sharpe": 1.1, "max_dd_pct": -8.0, "trades": len(trades)},
+    "equity": [{"t": t, "v": float(c) * 100.0} for t, c in zip(times, closes)],
+    "market": [{"t": t, "o": float(c), "h": float(c) * 1.01, "l": float(c) * 0.99, "c": float(c)} for t, c in zip(times, closes)],
+    "trades": trades,
+    "divergences": [],
+    "ai_summary": {"en": "summary", "zh": "摘要"},
+  }
+
+
+def _measure(fn) -> tuple[float, int, int]:
+  tracemalloc.start()
+  started = time.perf_counter()
+  out = fn()
+  elapsed = time.perf_counter() - started
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return elapsed, peak, len(out)
+
+
+def main() -> None:
+  sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000
+  report = _report(sessions)
+  paths = [
+    ("jsonable+json", lambda: json.dumps(jsonable_encoder(report), ensure_ascii=False).encode("utf-8")),
+    ("orjson", lambda: dumps(report)),
+  ]
+  for name, fn in paths:
+    elapsed, peak, size = _measure(fn)
+    print(f"{name:14s} sessions={sessions} bytes={size / 1e6:.2f}MB time={elapsed * 1000:.1f}ms peak={peak / 1e6:.2f}MB")
+
+
+if __name__ == "__main__":
+  main()
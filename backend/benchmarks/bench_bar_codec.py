@@ -0,0 +1,61 @@
+"""Compare cache block formats (raw .npy, zlib of raw records, bar_codec) on a year of cent-priced minute bars.
+
+Run from backend/: python -m benchmarks.bench_bar_codec [symbol]
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.services.bar_cache import split_by_utc_day
+from app.services.bar_codec import decode_bars, encode_bars
+from app.services.market_data import SyntheticProvider
+
+
+def _best_of(fn, repeat: int = 3) -> float:
+  best = float("inf")
+  for _ in range(repeat):
+    started = time.perf_counter()
+    fn()
+    best = min(best, time.perf_counter() - started)
+  return best
+
+
+def _npy(arr: np.ndarray) -> bytes:
+  buf = io.BytesIO()
+  np.save(buf, arr, allow_pickle=False)
+  return buf.getvalue()
+
+
+def main() -> None:
+  symbol = sys.argv[1] if len(sys.argv) > 1 else "QQQ"
+  bars = asyncio.run(
+    SyntheticProvider().get_minute_bar_array(symbol, datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 12, 31, 23, 59, tzinfo=timezone.utc))
+  )
+  for k in ("o", "h", "l", "c"):
+    bars[k] = np.round(bars[k], 2)
+  days = list(split_by_utc_day(bars).values())
+  formats = [
+    ("npy", _npy, lambda b: np.load(io.BytesIO(b), allow_pickle=False)),
+    ("zlib", lambda a: zlib.compress(a.tobytes(), 1), lambda b: np.frombuffer(zlib.decompress(b), dtype=bars.dtype)),
+    ("bar_codec", encode_bars, decode_bars),
+  ]
+  for name, encode, decode in formats:
+    blocks = [encode(d) for d in days]
+    size = sum(len(b) for b in blocks)
+    encode_s = _best_of(lambda: [encode(d) for d in days])
+    decode_s = _best_of(lambda: [decode(b) for b in blocks])
+    print(
+      f"{name:10s} days={len(days)} bytes={size / 1e6:.2f}MB ratio={bars.nbytes / size:.1f}x "
+      f"encode={encode_s * 1000:.1f}ms decode={decode_s * 1000:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+  main()
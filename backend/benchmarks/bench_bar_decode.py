@@ -0,0 +1,83 @@
+"""Compare per-row MinuteBar decoding with the columnar decoders on a synthetic vendor payload.
+
+Run from backend/: python -m benchmarks.bench_bar_decode [rows]
+"""
+from __future__ import annotations
+
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+from app.services.market_data import MinuteBar, decode_alpaca_bars, decode_polygon_bars
+
+
+def _alpaca_payload(rows: int) -> bytes:
+  start = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+  bars = [
+    {
+      "t": (start + timedelta(minutes=i)).isoformat().replace("+00:00", "Z"),
+      "o": 100.0 + i * 0.01,
+      "h": 100.5 + i * 0.01,
+      "l": 99.5 + i * 0.01,
+      "c": 100.25 + i * 0.01,
+      "v": 1000 + i,
+    }
+    for i in range(rows)
+  ]
+  return json.dumps({"bars": {"QQQ": bars}, "next_page_token": None}).encode()
+
+
+def _polygon_payload(rows: int) -> bytes:
+  start_ms = int(datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc).timestamp() * 1000)
+  results = [
+    {"t": start_ms + i * 60_000, "o": 100.0, "h": 100.5, "l": 99.5, "c": 100.25, "v": 1000 + i}
+    for i in range(rows)
+  ]
+  return json.dumps({"results": results}).encode()
+
+
+def _legacy_alpaca(body: bytes) -> list[MinuteBar]:
+  out: list[MinuteBar] = []
+  for row in json.loads(body)["bars"]["QQQ"]:
+    t = datetime.fromisoformat(str(row["t"]).replace("Z", "+00:00")).astimezone(timezone.utc)
+    out.append(MinuteBar(ts=t, o=float(row["o"]), h=float(row["h"]), l=float(row["l"]), c=float(row["c"]), v=float(row.get("v") or 0.0)))
+  return out
+
+
+def _legacy_polygon(body: bytes) -> list[MinuteBar]:
+  out: list[MinuteBar] = []
+  for row in json.loads(body)["results"]:
+    t = datetime.fromtimestamp(int(row["t"]) / 1000.0, tz=timezone.utc)
+    out.append(MinuteBar(ts=t, o=float(row["o"]), h=float(row["h"]), l=float(row["l"]), c=float(row["c"]), v=float(row.get("v") or 0.0)))
+  return out
+
+
+def _best_of(fn, body: bytes, repeat: int = 5) -> float:
+  best = float("inf")
+  for _ in range(repeat):
+    started = time.perf_counter()
+    fn(body)
+    best = min(best, time.perf_counter() - started)
+  return best
+
+
+def main() -> None:
+  rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+  cases = [
+    ("alpaca", _alpaca_payload(rows), _legacy_alpaca, lambda b: decode_alpaca_bars(orjson.loads(b)["bars"]["QQQ"])),
+    ("polygon", _polygon_payload(rows), _legacy_polygon, lambda b: decode_polygon_bars(orjson.loads(b)["results"])),
+  ]
+  for vendor, body, legacy, columnar in cases:
+    legacy_s = _best_of(legacy, body)
+    columnar_s = _best_of(columnar, body)
+    print(
+      f"{vendor:8s} rows={rows} payload={len(body) / 1e6:.1f}MB "
+      f"legacy={legacy_s * 1000:.1f}ms columnar={columnar_s * 1000:.1f}ms speedup={legacy_s / columnar_s:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,109 @@
+"""Measure the trade write path: ORM object construction vs COPY-ready records, and, when DATABASE_URL
+points at a reachable Postgres, chunked INSERTs vs COPY into a temp copy of the trades table.
+
+Run from backend/: python -m benchmarks.bench_trade_writer [trades]
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import text
+
+from app.db.models import Trade
+from app.services import trade_writer
+from app.services.trade_writer import COLUMNS, copy_trade_records, trade_records
+
+
+def _trades(n: int) -> list[dict[str, Any]]:
+  start = datetime(2020, 1, 2, 20, 58, tzinfo=timezone.utc)
+  return [
+    {
+      "decision_time": start + timedelta(days=i),
+      "fill_time": start + timedelta(days=i, minutes=2),
+      "symbol": "TQQQ",
+      "side": "BUY" if i % 2 else "SELL",
+      "qty": 10.0 + i % 7,
+      "fill_price": 50.0 + (i % 100) * 0.37,
+      "cost": {"slippage_bps": 1.0, "commission_per_trade": 0.0},
+      "why": {
+        "rule_id": f"rule_{i % 4}",
+        "action_id": f"action_{i % 3}",
+        "signal_symbol": "QQQ",
+        "indicators": {f"ind_{k}": {"value": 100.0 + i * 0.01 + k, "prev": 99.5 + k, "window": 14 + k} for k in range(12)},
+      },
+    }
+    for i in range(n)
+  ]
+
+
+def _timed(fn) -> tuple[float, Any]:
+  started = time.perf_counter()
+  out = fn()
+  return time.perf_counter() - started, out
+
+
+def _orm_objects(run_id: uuid.UUID, trades: list[dict[str, Any]]) -> list[Trade]:
+  # What the old path built per trade, plus the json.dumps the flush did for cost/why.
+  rows = [
+    Trade(
+      run_id=run_id,
+      decision_time=t["decision_time"],
+      fill_time=t["fill_time"],
+      symbol=t["symbol"],
+      side=t["side"],
+      qty=float(t["qty"]),
+      fill_price=float(t["fill_price"]),
+      cost=t["cost"],
+      why=t["why"],
+    )
+    for t in trades
+  ]
+  for row in rows:
+    json.dumps(row.cost)
+    json.dumps(row.why)
+  return rows
+
+
+async def _database(records: list[tuple[Any, ...]]) -> None:
+  from app.db.engine import SessionLocal
+
+  insert_sql = text(trade_writer._INSERT_SQL.format(table="bench_trades"))  # type: ignore[attr-defined]
+  async with SessionLocal() as db:
+    await db.execute(text("CREATE TEMP TABLE bench_trades (LIKE trades INCLUDING DEFAULTS) ON COMMIT DROP"))
+    started = time.perf_counter()
+    for i in range(0, len(records), trade_writer._INSERT_CHUNK):  # type: ignore[attr-defined]
+      await db.execute(insert_sql, [dict(zip(COLUMNS, r)) for r in records[i : i + trade_writer._INSERT_CHUNK]])  # type: ignore[attr-defined]
+    insert_s = time.perf_counter() - started
+    await db.execute(text("TRUNCATE bench_trades"))
+    started = time.perf_counter()
+    method = await copy_trade_records(db, records, table="bench_trades")
+    copy_s = time.perf_counter() - started
+    await db.rollback()
+  n = len(records)
+  print(f"db insert   {insert_s * 1000:8.1f}ms {n / insert_s:10.0f} trades/s")
+  print(f"db {method:8s} {copy_s * 1000:8.1f}ms {n / copy_s:10.0f} trades/s")
+
+
+def main() -> None:
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+  trades = _trades(n)
+  run_id = uuid.uuid4()
+  orm_s, _ = _timed(lambda: _orm_objects(run_id, trades))
+  records_s, records = _timed(lambda: trade_records(run_id, trades))
+  print(f"trades={n}")
+  print(f"orm objects {orm_s * 1000:8.1f}ms {n / orm_s:10.0f} trades/s")
+  print(f"records     {records_s * 1000:8.1f}ms {n / records_s:10.0f} trades/s")
+  try:
+    asyncio.run(_database(records))
+  except Exception as e:
+    print(f"db skipped: {type(e).__name__}: {e}")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from datetime import date
+from datetime import date, datetime
 
 import pytest
 
 from app.core.config import settings
-from app.services.backtest_engine import run_backtest_from_spec
+from app.core.errors import RunCancelled
+from app.services import backtest_engine
+from app.services.backtest_engine import analyze_data_requirements, run_backtest_from_spec
 
 
 def _minimal_strategy_spec() -> dict:
@@ -280,6 +282,37 @@ async def test_backtest_executes_date_gated_entry_and_staged_exits(monkeypatch:
   assert all(ts >= first["fill_time"] for ts in sell_times)
 
 
+@pytest.mark.asyncio
+async def test_trade_hook_receives_every_trade_in_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "market_data_provider", "synthetic")
+  monkeypatch.setattr(backtest_engine, "TRADE_HOOK_BATCH", 5)
+  batches: list[list[dict]] = []
+
+  async def _hook(batch: list[dict]) -> None:
+    batches.append(list(batch))
+
+  result = await run_backtest_from_spec(_minimal_strategy_spec(), start_date="2024-01-02", end_date="2024-01-31", trade_hook=_hook)
+
+  # One trade per session here, so batches close at exactly the threshold.
+  assert [len(batch) for batch in batches] == [5, 5, len(result.trades) - 10]
+  assert [t for batch in batches for t in batch] == result.trades
+
+
+@pytest.mark.asyncio
+async def test_cancellation_from_progress_hook_stops_the_backtest(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "market_data_provider", "synthetic")
+  seen: list[int] = []
+
+  async def _hook(done: int, total: int, _: datetime) -> None:
+    seen.append(done)
+    if done == 3:
+      raise RunCancelled("cancelled")
+
+  with pytest.raises(RunCancelled):
+    await run_backtest_from_spec(_minimal_strategy_spec(), start_date="2024-01-02", end_date="2024-01-31", progress_hook=_hook)
+  assert seen == [1, 2, 3]
+
+
 def _divergence_strategy_spec() -> dict:
   return {
     "name": "test-divergence-diagnostics",
@@ -354,3 +387,22 @@ async def test_backtest_outputs_divergence_diagnostics(monkeypatch: pytest.Monke
   spec = _divergence_strategy_spec()
   result = await run_backtest_from_spec(spec, start_date="2024-01-02", end_date="2024-06-28")
   assert isinstance(result.artifacts.get("divergence_signals"), list)
+
+
+@pytest.mark.asyncio
+async def test_coarse_bar_path_matches_minute_path(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "market_data_provider", "synthetic")
+  spec = _divergence_strategy_spec()
+  assert analyze_data_requirements(spec).bar_minutes == backtest_engine.COARSE_BAR_MINUTES
+  assert analyze_data_requirements(_minimal_strategy_spec()).bar_minutes == 1
+
+  coarse = await run_backtest_from_spec(spec, start_date="2024-11-01", end_date="2024-12-31")
+  monkeypatch.setattr(backtest_engine, "COARSE_BAR_MINUTES", 1)
+  minute = await run_backtest_from_spec(spec, start_date="2024-11-01", end_date="2024-12-31")
+
+  assert coarse.artifacts["data_health"]["bar_minutes"] == 30
+  assert minute.artifacts["data_health"]["bar_minutes"] == 1
+  assert coarse.market == minute.market
+  assert coarse.equity == minute.equity
+  assert coarse.trades == minute.trades
+  assert coarse.artifacts["divergence_signals"] == minute.artifacts["divergence_signals"]
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.core.errors import AppError
+from app.services import bar_cache
+from app.services.bar_cache import CachedMarketDataProvider, CoverageIndex, DiskBarCache, RedisBarCache
+from app.services.market_data import BAR_DTYPE, MarketDataProvider, MinuteBar
+
+
+class _CountingProvider(MarketDataProvider):
+  name = "fake"
+
+  def __init__(self) -> None:
+    self.calls: list[tuple[datetime, datetime]] = []
+
+  async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
+    self.calls.append((start, end))
+    bars: list[MinuteBar] = []
+    day = start.date()
+    while day <= end.date():
+      if day.weekday() < 5:
+        for minute in range(3):
+          ts = datetime(day.year, day.month, day.day, 15, minute, tzinfo=timezone.utc)
+          px = 100.0 + day.day + minute
+          if start <= ts <= end:
+            bars.append(MinuteBar(ts=ts, o=px, h=px + 0.5, l=px - 0.5, c=px + 0.25, v=1000.0))
+      day += timedelta(days=1)
+    return bars
+
+
+def _utc(y: int, m: int, d: int, hh: int = 0, mm: int = 0) -> datetime:
+  return datetime(y, m, d, hh, mm, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_cached_provider_serves_repeat_requests_from_disk(tmp_path) -> None:
+  inner = _CountingProvider()
+  provider = CachedMarketDataProvider(inner, [DiskBarCache(tmp_path, max_bytes=10_000_000, today_ttl_seconds=60)])
+
+  first = await provider.get_minute_bars("QQQ", _utc(2024, 1, 2, 14, 30), _utc(2024, 1, 5, 21))
+  second = await provider.get_minute_bars("QQQ", _utc(2024, 1, 2, 14, 30), _utc(2024, 1, 5, 21))
+
+  assert len(inner.calls) == 1
+  assert first == second
+  assert len(first) == 12
+
+
+@pytest.mark.asyncio
+async def test_cached_provider_fetches_only_missing_days(tmp_path) -> None:
+  inner = _CountingProvider()
+  provider = CachedMarketDataProvider(inner, [DiskBarCache(tmp_path, max_bytes=10_000_000, today_ttl_seconds=60)])
+
+  await provider.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 5, 23))
+  extended = await provider.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 12, 23))
+
+  assert len(inner.calls) == 2
+  assert inner.calls[1][0] == _utc(2024, 1, 6)
+  assert extended.size == 27
+  assert np.all(np.diff(extended["ts"]) > 0)
+
+
+class _DictTier:
+  def __init__(self) -> None:
+    self.store: dict[tuple[str, str, object], np.ndarray] = {}
+
+  async def get_many(self, namespace, symbol, days):
+    return {d: self.store[(namespace, symbol, d)] for d in days if (namespace, symbol, d) in self.store}
+
+  async def put_many(self, namespace, symbol, parts):
+    for d, arr in parts.items():
+      self.store[(namespace, symbol, d)] = np.array(arr, copy=True)
+
+  def stats(self):
+    return {"tier": "dict", "entries": len(self.store)}
+
+
+@pytest.mark.asyncio
+async def test_tiered_provider_writes_back_shared_hits_to_local_tier(tmp_path) -> None:
+  shared = _DictTier()
+  warm = CachedMarketDataProvider(_CountingProvider(), [DiskBarCache(tmp_path / "a", max_bytes=10_000_000, today_ttl_seconds=60), shared])
+  await warm.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 5, 23))
+
+  inner = _CountingProvider()
+  local = DiskBarCache(tmp_path / "b", max_bytes=10_000_000, today_ttl_seconds=60)
+  cold = CachedMarketDataProvider(inner, [local, shared])
+  bars = await cold.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 5, 23))
+
+  assert inner.calls == []
+  assert bars.size == 12
+  assert local.stats()["entries"] == 4
+
+
+def test_disk_cache_evicts_least_recently_used_days(tmp_path) -> None:
+  empty = np.empty(0, dtype=BAR_DTYPE)
+  probe = DiskBarCache(tmp_path / "probe", max_bytes=10_000_000, today_ttl_seconds=60)
+  probe.put("fake", "QQQ", _utc(2024, 1, 2).date(), empty)
+  entry_bytes = probe.stats()["bytes"]
+
+  cache = DiskBarCache(tmp_path / "cache", max_bytes=entry_bytes * 2, today_ttl_seconds=60)
+  cache.put("fake", "QQQ", _utc(2024, 1, 2).date(), empty)
+  cache.put("fake", "QQQ", _utc(2024, 1, 3).date(), empty)
+  assert cache.get("fake", "QQQ", _utc(2024, 1, 2).date()) is not None
+  cache.put("fake", "QQQ", _utc(2024, 1, 4).date(), empty)
+
+  assert cache.get("fake", "QQQ", _utc(2024, 1, 3).date()) is None
+  assert cache.get("fake", "QQQ", _utc(2024, 1, 2).date()) is not None
+  assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_coverage_index_skips_confirmed_empty_days_and_coalesces_gaps(tmp_path) -> None:
+  inner = _CountingProvider()
+  disk = DiskBarCache(tmp_path, max_bytes=10_000_000, today_ttl_seconds=60)
+  provider = CachedMarketDataProvider(inner, [disk], CoverageIndex(tmp_path))
+  # Tue 2 .. Mon 8: the weekend comes back empty and is recorded as coverage, not as files.
+  await provider.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 8, 23))
+  assert disk.stats()["entries"] == 5
+
+  # Extending by a week is one request, and a restart keeps the coverage.
+  restarted = CachedMarketDataProvider(inner, [disk], CoverageIndex(tmp_path))
+  bars = await restarted.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 15, 23))
+  assert inner.calls[1:] == [(_utc(2024, 1, 9), datetime.combine(date(2024, 1, 15), time.max, tzinfo=timezone.utc))]
+  assert bars.size == 30
+
+  # Two evicted weekdays either side of a confirmed-empty weekend go out as one request.
+  for d in (5, 8):
+    (tmp_path / "fake" / "QQQ" / "2024" / f"2024-01-{d:02d}.npy").unlink()
+  again = CachedMarketDataProvider(inner, [DiskBarCache(tmp_path, max_bytes=10_000_000, today_ttl_seconds=60)], CoverageIndex(tmp_path))
+  bars = await again.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 15, 23))
+  assert [(a.date(), b.date()) for a, b in inner.calls[2:]] == [(date(2024, 1, 5), date(2024, 1, 8))]
+  assert bars.size == 30
+
+
+@pytest.mark.asyncio
+async def test_window_bars_are_cached_per_day(tmp_path) -> None:
+  inner = _CountingProvider()
+  provider = CachedMarketDataProvider(inner, [DiskBarCache(tmp_path, max_bytes=10_000_000, today_ttl_seconds=60)], CoverageIndex(tmp_path))
+  windows = [(_utc(2024, 1, d, 15, 1), _utc(2024, 1, d, 15, 2)) for d in (2, 3, 4)]
+
+  first = await provider.get_window_bars("QQQ", windows)
+  again = await provider.get_window_bars("QQQ", windows[1:])
+
+  assert len(inner.calls) == 3
+  assert first.size == 6 and np.array_equal(again, first[2:])
+
+
+class _GappyProvider(_CountingProvider):
+  # A vendor missing some trading days; a request with nothing to return is a 404.
+  def __init__(self, missing: set[date]) -> None:
+    super().__init__()
+    self.missing = missing
+
+  async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
+    bars = [b for b in await super().get_minute_bars(symbol, start, end) if b.ts.date() not in self.missing]
+    if not bars:
+      raise AppError("DATA_UNAVAILABLE", "No bars returned", http_status=404)
+    return bars
+
+
+@pytest.mark.asyncio
+async def test_coverage_index_never_confirms_empty_trading_days(tmp_path) -> None:
+  inner = _GappyProvider({date(2024, 1, 3), date(2024, 1, 15), date(2024, 1, 16)})
+  coverage = CoverageIndex(tmp_path)
+  provider = CachedMarketDataProvider(inner, [DiskBarCache(tmp_path, max_bytes=10_000_000, today_ttl_seconds=60)], coverage)
+  week = [date(2024, 1, 2) + timedelta(days=i) for i in range(7)]
+
+  await provider.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 8, 23))
+  assert coverage.empty_days("fake", "QQQ", week) == {date(2024, 1, 6), date(2024, 1, 7)}
+  # Sat 13 .. Tue 16 is a 404: the weekend and the MLK holiday are confirmed, the Tuesday is not.
+  with pytest.raises(AppError):
+    await provider.get_minute_bar_array("QQQ", _utc(2024, 1, 13), _utc(2024, 1, 16, 23))
+  assert coverage.covered_days("fake", "QQQ", [date(2024, 1, d) for d in (13, 14, 15, 16)]) == {date(2024, 1, 13), date(2024, 1, 14), date(2024, 1, 15)}
+
+  inner.missing = set()
+  inner.calls.clear()
+  await provider.get_minute_bar_array("QQQ", _utc(2024, 1, 2), _utc(2024, 1, 16, 23))
+  # The empty Wednesday is fetched again; the Tuesday joins the new week across confirmed-empty days.
+  assert [(a.date(), b.date()) for a, b in inner.calls] == [(date(2024, 1, 3), date(2024, 1, 3)), (date(2024, 1, 9), date(2024, 1, 16))]
+
+
+class _FakePipeline:
+  def __init__(self, store: dict[str, bytes]) -> None:
+    self._store = store
+    self._ops: list = []
+
+  async def __aenter__(self) -> "_FakePipeline":
+    return self
+
+  async def __aexit__(self, *_: object) -> None:
+    pass
+
+  def mget(self, keys: list[str]) -> None:
+    self._ops.append(lambda: [self._store.get(k) for k in keys])
+
+  def set(self, key: str, value: bytes, ex: int) -> None:
+    self._ops.append(lambda: self._store.__setitem__(key, value))
+
+  async def execute(self) -> list:
+    return [op() for op in self._ops]
+
+
+class _FakeRedis:
+  def __init__(self, store: dict[str, bytes]) -> None:
+    self._store = store
+    self.closed = False
+
+  async def __aenter__(self) -> "_FakeRedis":
+    return self
+
+  async def __aexit__(self, *_: object) -> None:
+    self.closed = True
+
+  def pipeline(self, transaction: bool) -> _FakePipeline:
+    return _FakePipeline(self._store)
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_closes_its_client_after_every_call(monkeypatch: pytest.MonkeyPatch) -> None:
+  store: dict[str, bytes] = {}
+  clients: list[_FakeRedis] = []
+
+  def _from_url(*_: object, **__: object) -> _FakeRedis:
+    clients.append(_FakeRedis(store))
+    return clients[-1]
+
+  monkeypatch.setattr(bar_cache.redis, "from_url", _from_url)
+  tier = RedisBarCache("redis://test", ttl_seconds=60, today_ttl_seconds=10)
+  day = date(2024, 1, 2)
+  bars = np.zeros(2, dtype=BAR_DTYPE)
+
+  await tier.put_many("fake", "QQQ", {day: bars})
+  got = await tier.get_many("fake", "QQQ", [day])
+
+  assert got[day].size == 2
+  assert len(clients) == 2 and all(c.closed for c in clients)
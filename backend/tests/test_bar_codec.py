@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.services.bar_cache import DiskBarCache
+from app.services.bar_codec import decode_bars, encode_bars, varint_decode, varint_encode
+from app.services.market_data import BAR_DTYPE, SyntheticProvider
+
+
+async def _session_bars() -> np.ndarray:
+  bars = await SyntheticProvider().get_minute_bar_array("QQQ", datetime(2024, 1, 2, tzinfo=timezone.utc), datetime(2024, 1, 2, 23, 59, tzinfo=timezone.utc))
+  # Vendor prices move in cents.
+  for k in ("o", "h", "l", "c"):
+    bars[k] = np.round(bars[k], 2)
+  bars["h"] = np.maximum(bars["h"], np.maximum(bars["o"], bars["c"]))
+  bars["l"] = np.minimum(bars["l"], np.minimum(bars["o"], bars["c"]))
+  return bars
+
+
+def test_varints_round_trip_across_byte_lengths() -> None:
+  values = np.array([0, 1, 127, 128, 300, 2**35, 2**64 - 1], dtype=np.uint64)
+  encoded = varint_encode(values)
+  assert len(encoded) == 1 + 1 + 1 + 2 + 2 + 6 + 10
+  assert np.array_equal(varint_decode(encoded, values.size), values)
+
+
+@pytest.mark.asyncio
+async def test_codec_is_lossless_and_compact_for_cent_prices() -> None:
+  bars = await _session_bars()
+
+  encoded = encode_bars(bars)
+
+  assert np.array_equal(decode_bars(encoded), bars)
+  assert len(encoded) * 5 <= bars.nbytes
+
+
+@pytest.mark.asyncio
+async def test_codec_falls_back_for_irregular_bars() -> None:
+  bars = await _session_bars()
+  bars["ts"][5] += 1_500_000_000
+  bars["c"][7] = 100.0 / 3.0
+  bars["v"][9] = 12.5
+  assert np.array_equal(decode_bars(encode_bars(bars)), bars)
+  assert decode_bars(encode_bars(np.empty(0, dtype=BAR_DTYPE))).size == 0
+
+  with pytest.raises(ValueError):
+    decode_bars(b"\x78\x9c not a block")
+
+
+@pytest.mark.asyncio
+async def test_compact_disk_cache_round_trips(tmp_path) -> None:
+  bars = await _session_bars()
+  cache = DiskBarCache(tmp_path, max_bytes=10_000_000, today_ttl_seconds=60, compact=True)
+
+  cache.put("alpaca-iex", "QQQ", date(2024, 1, 2), bars)
+
+  assert (tmp_path / "alpaca-iex" / "QQQ" / "2024" / "2024-01-02.vbar").exists()
+  assert np.array_equal(cache.get("alpaca-iex", "QQQ", date(2024, 1, 2)), bars)
+  assert cache.stats()["bytes"] * 5 <= bars.nbytes
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.cache_warmer import next_warm_time, warm_market_data_cache
+from app.services.market_data import SyntheticProvider
+
+
+class _Result:
+  def __init__(self, rows: list) -> None:
+    self._rows = rows
+
+  def scalars(self) -> "_Result":
+    return self
+
+  def all(self) -> list:
+    return self._rows
+
+
+class _Session:
+  def __init__(self, specs: list[dict]) -> None:
+    self._specs = specs
+
+  async def __aenter__(self) -> "_Session":
+    return self
+
+  async def __aexit__(self, *exc: object) -> None:
+    return None
+
+  async def execute(self, stmt: object) -> _Result:
+    return _Result(self._specs)
+
+
+class _RecordingProvider(SyntheticProvider):
+  name = "recording"
+
+  def __init__(self) -> None:
+    self.calls: list[tuple[str, int]] = []
+
+  async def get_bar_array(self, symbol: str, start: datetime, end: datetime, minutes: int = 1) -> np.ndarray:
+    self.calls.append((symbol, minutes))
+    return await super().get_bar_array(symbol, start, end, minutes)
+
+
+def test_next_warm_time_follows_the_next_close() -> None:
+  # Black Friday closes at 13:00 ET; the weekend is skipped.
+  assert next_warm_time(datetime(2024, 11, 29, 15, 0, tzinfo=timezone.utc)) == datetime(2024, 11, 29, 18, 20, tzinfo=timezone.utc)
+  assert next_warm_time(datetime(2024, 11, 29, 18, 30, tzinfo=timezone.utc)) == datetime(2024, 12, 2, 21, 20, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_warmer_prefetches_most_used_symbols(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "cache_warm_top_symbols", 2)
+  monkeypatch.setattr(settings, "cache_warm_lookback_days", 10)
+  specs = [
+    {"universe": {"signal_symbol": "QQQ", "trade_symbol": "TQQQ"}},
+    {"universe": {"signal_symbol": "qqq", "trade_symbol": "QQQ"}},
+    {"universe": {"signal_symbol": "SPY", "trade_symbol": "SOXL"}},
+    {"universe": {"signal_symbol": "SOXL", "trade_symbol": "SOXL"}},
+    {"name": "no universe"},
+  ]
+  provider = _RecordingProvider()
+
+  results = await warm_market_data_cache(provider, lambda: _Session(specs), store=None, now=datetime(2024, 12, 3, 22, 0, tzinfo=timezone.utc))
+
+  assert [r["symbol"] for r in results] == ["QQQ", "SOXL"]
+  assert all(r["through"] == "2024-12-03" and r["minute_bars"] > 0 for r in results)
+  assert sorted(provider.calls) == [("QQQ", 30), ("SOXL", 30)]
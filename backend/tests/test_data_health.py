@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.services.data_health import analyze_bars
+from app.services.market_data import SyntheticProvider
+from app.services.session_bars import build_session_schedule
+
+
+@pytest.mark.asyncio
+async def test_analyze_bars_flags_injected_issues_per_session() -> None:
+  schedule = build_session_schedule("2024-01-02", "2024-01-05")
+  bars = await SyntheticProvider().get_minute_bar_array(
+    "QQQ", datetime(2024, 1, 2, tzinfo=timezone.utc), datetime(2024, 1, 5, 23, 59, tzinfo=timezone.utc)
+  )
+  clean = analyze_bars(bars, schedule, gap_minutes=15, zero_volume_minutes=10, stale_minutes=30)
+  assert clean.summary["issues"]["sessions_flagged"] == 0
+  assert clean.summary["sessions_with_bars"] == 4
+
+  day = bars["ts"].astype("datetime64[ns]").astype("datetime64[D]").astype(str)
+  jan2, jan3, jan4, jan5 = (np.flatnonzero(day == d) for d in ("2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"))
+  bars = bars.copy()
+  bars["v"][jan3[100:112]] = 0.0
+  bars["c"][jan4[200:240]] = bars["c"][jan4[200]]
+  broken = np.concatenate([bars[jan2[:60]], bars[jan2[120:]], bars[jan3], bars[jan4], bars[jan5[:300]], bars[jan5[10:11]]])
+
+  report = analyze_bars(broken, schedule, gap_minutes=15, zero_volume_minutes=10, stale_minutes=30)
+  issues = report.summary["issues"]
+
+  assert issues["gaps"] == 2
+  assert issues["zero_volume_stretches"] == 1
+  assert issues["stale_price_stretches"] == 1
+  assert issues["duplicates"] == 1
+  assert issues["out_of_order"] == 1
+  assert issues["sessions_truncated"] == 1
+  assert issues["sessions_flagged"] == 4
+  assert report.malformed_sessions == [schedule.dates[3]]
+  assert report.truncated_sessions == [schedule.dates[3]]
+  worst = report.summary["worst_sessions"]
+  assert [(w["session_date"], w["max_gap_minutes"]) for w in worst[:2]] == [("2024-01-05", 90), ("2024-01-02", 60)]
+  assert worst[0]["truncated"] and worst[0]["duplicates"] == 1
+
+
+@pytest.mark.asyncio
+async def test_analyze_bars_honours_explicit_zero_thresholds() -> None:
+  schedule = build_session_schedule("2024-01-02", "2024-01-02")
+  bars = await SyntheticProvider().get_minute_bar_array(
+    "QQQ", datetime(2024, 1, 2, tzinfo=timezone.utc), datetime(2024, 1, 2, 23, 59, tzinfo=timezone.utc)
+  )
+  bars = bars.copy()
+  bars["v"][100] = 0.0
+
+  report = analyze_bars(bars, schedule, gap_minutes=0, zero_volume_minutes=0, stale_minutes=0)
+
+  assert report.summary["thresholds"] == {"gap_minutes": 1, "zero_volume_minutes": 0, "stale_minutes": 0}
+  assert report.summary["issues"]["zero_volume_stretches"] == 1
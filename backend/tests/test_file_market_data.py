@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.core.errors import AppError
+from app.services.file_market_data import FileProvider
+from app.services.market_data import SyntheticProvider, get_market_data_provider, to_epoch_ns
+
+
+@pytest.mark.asyncio
+async def test_file_provider_slices_npy_and_csv_partitions(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+  start = datetime(2024, 1, 2, tzinfo=timezone.utc)
+  end = datetime(2024, 1, 31, 23, 59, tzinfo=timezone.utc)
+  bars = await SyntheticProvider().get_minute_bar_array("QQQ", start, end)
+  np.save(tmp_path / "QQQ.npy", bars)
+  # TQQQ as two monthly CSV partitions with vendor-style column names and ISO timestamps.
+  (tmp_path / "TQQQ").mkdir()
+  halves = np.array_split(bars, 2)
+  for i, part in enumerate(halves):
+    iso = part["ts"].astype("datetime64[ns]").astype(str)
+    lines = ["timestamp,open,high,low,close,volume,vwap"]
+    lines += [",".join([f"{t}Z", *(repr(float(r[k])) for k in "ohlcv"), "0"]) for t, r in zip(iso, part)]
+    (tmp_path / "TQQQ" / f"part-{i}.csv").write_text("\n".join(lines))
+
+  monkeypatch.setattr(settings, "market_data_provider", "file")
+  monkeypatch.setattr(settings, "market_data_file_dir", str(tmp_path))
+  provider = get_market_data_provider()
+  assert isinstance(provider, FileProvider)
+
+  lo = datetime(2024, 1, 10, 15, 0, tzinfo=timezone.utc)
+  hi = datetime(2024, 1, 22, 16, 0, tzinfo=timezone.utc)
+  expected = bars[(bars["ts"] >= to_epoch_ns(lo)) & (bars["ts"] <= to_epoch_ns(hi))]
+  qqq = await provider.get_minute_bar_array("qqq", lo, hi)
+  tqqq = await provider.get_minute_bar_array("TQQQ", lo, hi)
+
+  assert np.array_equal(qqq, expected)
+  assert np.array_equal(tqqq, expected)
+  assert not isinstance(qqq, np.memmap)
+  daily = await provider.get_bar_array("QQQ", lo, hi, 30)
+  assert daily["ts"][0] == expected["ts"][0] - expected["ts"][0] % (30 * 60 * 1_000_000_000)
+
+  with pytest.raises(AppError) as exc:
+    await provider.get_minute_bar_array("../QQQ", lo, hi)
+  assert exc.value.http_status == 404
+
+
+@pytest.mark.asyncio
+async def test_file_provider_rejects_rows_without_prices(tmp_path) -> None:
+  lines = [
+    "timestamp,open,high,low,close,volume",
+    "2024-01-02T14:30:00Z,100.0,100.5,99.5,100.25,",
+    "2024-01-02T14:31:00Z,100.25,100.5,99.5,,1000",
+  ]
+  (tmp_path / "QQQ.csv").write_text("\n".join(lines))
+  provider = FileProvider(str(tmp_path))
+
+  with pytest.raises(AppError) as exc:
+    await provider.get_minute_bar_array("QQQ", datetime(2024, 1, 2, tzinfo=timezone.utc), datetime(2024, 1, 3, tzinfo=timezone.utc))
+  assert exc.value.details == {"path": str(tmp_path / "QQQ.csv"), "field": "c", "rows": 1}
+
+  (tmp_path / "QQQ.csv").write_text("\n".join(lines[:2]))
+  bars = await FileProvider(str(tmp_path)).get_minute_bar_array("QQQ", datetime(2024, 1, 2, tzinfo=timezone.utc), datetime(2024, 1, 3, tzinfo=timezone.utc))
+  assert bars["c"].tolist() == [100.25] and bars["v"].tolist() == [0.0]
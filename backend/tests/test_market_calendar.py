@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import market_calendar
+from app.services.market_calendar import get_exchange_calendar
+
+
+def test_exchange_calendar_persists_and_matches_xcals(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+  import exchange_calendars as xcals
+
+  monkeypatch.setattr(settings, "calendar_cache_dir", str(tmp_path))
+  monkeypatch.setattr(market_calendar, "_calendars", {})
+  built = get_exchange_calendar("XNYS")
+  assert (tmp_path / "xnys.npz").exists()
+
+  monkeypatch.setattr(market_calendar, "_calendars", {})
+  monkeypatch.setattr(market_calendar, "_build", lambda name: pytest.fail("expected the persisted calendar"))
+  cal = get_exchange_calendar("XNYS")
+  assert np.array_equal(cal.closes_ns, built.closes_ns)
+
+  window = cal.session_slice(date(2024, 11, 27), date(2024, 12, 2))
+  assert cal.dates[window] == [date(2024, 11, 27), date(2024, 11, 29), date(2024, 12, 2)]
+  reference = xcals.get_calendar("XNYS")
+  for i, day in zip(range(window.start, window.stop), cal.dates[window]):
+    assert int(cal.opens_ns[i]) == reference.session_open(day.isoformat()).value
+    assert int(cal.closes_ns[i]) == reference.session_close(day.isoformat()).value
+
+  # Black Friday closes at 13:00 ET.
+  assert cal.last_closed_session(datetime(2024, 11, 29, 18, 1, tzinfo=timezone.utc)) == date(2024, 11, 29)
+  assert cal.last_closed_session(datetime(2024, 11, 29, 17, 59, tzinfo=timezone.utc)) == date(2024, 11, 27)
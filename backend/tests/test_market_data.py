@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.core.errors import AppError
+from app.services.market_data import (
+  MarketDataProvider,
+  MinuteBar,
+  SyntheticProvider,
+  array_to_bars,
+  bars_to_array,
+  decode_alpaca_bars,
+  decode_polygon_bars,
+  fetch_bar_arrays,
+  get_market_data_provider,
+  merge_bar_shards,
+  month_shards,
+)
+
+
+class _SlowProvider(MarketDataProvider):
+  name = "slow"
+
+  def __init__(self) -> None:
+    self.calls: list[str] = []
+
+  async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
+    self.calls.append(symbol)
+    await asyncio.sleep(0.05)
+    return [MinuteBar(ts=start, o=1.0, h=1.0, l=1.0, c=1.0, v=1.0)]
+
+
+@pytest.mark.asyncio
+async def test_fetch_bar_arrays_coalesces_identical_requests() -> None:
+  provider = _SlowProvider()
+  start = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+  end = datetime(2024, 1, 2, 21, 0, tzinfo=timezone.utc)
+
+  first, second = await asyncio.gather(
+    fetch_bar_arrays(provider, ["QQQ", "TQQQ", "qqq"], start, end),
+    fetch_bar_arrays(provider, ["TQQQ"], start, end),
+  )
+
+  assert sorted(provider.calls) == ["QQQ", "TQQQ"]
+  assert set(first) == {"QQQ", "TQQQ"}
+  assert second["TQQQ"] is first["TQQQ"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_bar_arrays_limit_is_shared_across_concurrent_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "market_data_fetch_concurrency", 2)
+  active = [0, 0]
+
+  class _CountingProvider(_SlowProvider):
+    async def get_minute_bars(self, symbol: str, start: datetime, end: datetime) -> list[MinuteBar]:
+      active[0] += 1
+      active[1] = max(active[1], active[0])
+      try:
+        return await super().get_minute_bars(symbol, start, end)
+      finally:
+        active[0] -= 1
+
+  provider = _CountingProvider()
+  start = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+  end = datetime(2024, 1, 2, 21, 0, tzinfo=timezone.utc)
+
+  await asyncio.gather(*(fetch_bar_arrays(provider, [symbol], start, end) for symbol in ("QQQ", "TQQQ", "SPY", "IWM")))
+
+  assert len(provider.calls) == 4
+  assert active[1] == 2
+
+
+@pytest.mark.asyncio
+async def test_provider_without_a_minute_bar_method_raises_instead_of_recursing() -> None:
+  class _EmptyProvider(MarketDataProvider):
+    name = "empty"
+
+  start = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+  end = datetime(2024, 1, 2, 21, 0, tzinfo=timezone.utc)
+  with pytest.raises(TypeError, match="_EmptyProvider must implement"):
+    await _EmptyProvider().get_bar_array("QQQ", start, end)
+  with pytest.raises(TypeError):
+    await _EmptyProvider().get_minute_bars("QQQ", start, end)
+
+
+def test_month_shards_split_long_ranges_on_month_boundaries() -> None:
+  start = datetime(2023, 11, 15, 14, 30, tzinfo=timezone.utc)
+  end = datetime(2024, 2, 2, 21, 0, tzinfo=timezone.utc)
+
+  monthly = month_shards(start, end, 1)
+  quarterly = month_shards(start, end, 3)
+
+  assert [s.date().isoformat() for s, _ in monthly] == ["2023-11-15", "2023-12-01", "2024-01-01", "2024-02-01"]
+  assert monthly[0][1] == datetime(2023, 11, 30, 23, 59, 59, 999999, tzinfo=timezone.utc)
+  assert monthly[-1][1] == end
+  assert len(quarterly) == 2
+  assert quarterly[1][0] == datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+
+def test_merge_bar_shards_dedupes_and_orders_by_timestamp() -> None:
+  t0 = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+  t1 = datetime(2024, 1, 2, 14, 31, tzinfo=timezone.utc)
+  a = bars_to_array([MinuteBar(ts=t1, o=2, h=2, l=2, c=2, v=1)])
+  b = bars_to_array([MinuteBar(ts=t0, o=1, h=1, l=1, c=1, v=1), MinuteBar(ts=t1, o=2, h=2, l=2, c=2, v=1)])
+
+  merged = merge_bar_shards([a, b])
+
+  assert [bar.ts for bar in array_to_bars(merged)] == [t0, t1]
+
+
+def test_vendor_decoders_match_row_by_row_parsing() -> None:
+  alpaca = decode_alpaca_bars(
+    [
+      {"t": "2024-01-02T14:30:00Z", "o": 1.5, "h": 2.0, "l": 1.0, "c": 1.75, "v": 300},
+      {"t": "2024-01-02T14:31:00Z", "o": 1.75, "h": 1.8, "l": 1.7, "c": 1.7, "v": None},
+    ]
+  )
+  polygon = decode_polygon_bars([{"t": 1704205800000, "o": 1.5, "h": 2.0, "l": 1.0, "c": 1.75, "v": 300}])
+
+  assert array_to_bars(alpaca)[0] == MinuteBar(ts=datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc), o=1.5, h=2.0, l=1.0, c=1.75, v=300.0)
+  assert alpaca["v"][1] == 0.0
+  assert polygon.tolist() == alpaca[:1].tolist()
+
+
+def test_vendor_decoders_reject_bars_without_prices() -> None:
+  with pytest.raises(AppError) as exc:
+    decode_polygon_bars([{"t": 1704205800000, "o": 1.5, "h": 2.0, "l": 1.0, "c": 1.75}, {"t": 1704205860000, "o": 1.5, "h": 2.0, "l": 1.0, "c": None}])
+  assert exc.value.code == "DATA_UNAVAILABLE"
+  assert exc.value.details == {"field": "c", "rows": 1, "first_t": 1704205860000}
+
+
+def test_get_market_data_provider_reuses_process_singleton(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "market_data_provider", "polygon")
+  monkeypatch.setattr(settings, "polygon_api_key", "test-key")
+  monkeypatch.setattr(settings, "market_data_cache_enabled", False)
+
+  first = get_market_data_provider()
+  second = get_market_data_provider()
+  monkeypatch.setattr(settings, "polygon_api_key", "other-key")
+  third = get_market_data_provider()
+
+  assert first is second
+  assert third is not first
+
+
+@pytest.mark.asyncio
+async def test_synthetic_provider_emits_only_session_minutes_reproducibly() -> None:
+  provider = SyntheticProvider()
+  start = datetime(2024, 11, 29, 0, 0, tzinfo=timezone.utc)
+  end = datetime(2024, 12, 3, 23, 59, tzinfo=timezone.utc)
+
+  bars = await provider.get_minute_bar_array("QQQ", start, end)
+  again = await provider.get_minute_bar_array("QQQ", start, end)
+
+  days = bars["ts"].astype("datetime64[ns]").astype("datetime64[D]")
+  counts = dict(zip(*np.unique(days, return_counts=True)))
+  # Black Friday half day, then two regular sessions; nothing over the weekend.
+  assert {str(d): int(n) for d, n in counts.items()} == {"2024-11-29": 210, "2024-12-02": 390, "2024-12-03": 390}
+  assert np.array_equal(bars, again)
+  assert np.all(bars["l"] <= np.minimum(bars["o"], bars["c"]))
+  assert np.all(bars["h"] >= np.maximum(bars["o"], bars["c"]))
+
+
+def test_synthetic_seed_is_stable_across_processes() -> None:
+  script = "from app.services.market_data import _stable_seed; print(_stable_seed('QQQ', '2024-01-02', '2024-01-05'))"
+  seeds = {
+    subprocess.run(
+      [sys.executable, "-c", script],
+      env={**os.environ, "PYTHONHASHSEED": hash_seed},
+      capture_output=True,
+      text=True,
+      check=True,
+    ).stdout.strip()
+    for hash_seed in ("1", "2")
+  }
+  assert len(seeds) == 1
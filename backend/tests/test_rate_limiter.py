@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.core.config import settings
+from app.services import rate_limiter
+from app.services.rate_limiter import LocalRateLimiter, RedisRateLimiter, get_vendor_rate_limiter
+
+
+def test_vendor_limiters_are_shared_per_api_key(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(rate_limiter, "_limiters", {})
+  monkeypatch.setattr(settings, "market_data_shared_rate_limit_enabled", True)
+  monkeypatch.setattr(settings, "redis_url", "redis://127.0.0.1:1/0")
+
+  first = get_vendor_rate_limiter("alpaca", "key-a")
+  assert isinstance(first, RedisRateLimiter)
+  assert get_vendor_rate_limiter("alpaca", "key-a") is first
+  assert get_vendor_rate_limiter("alpaca", "key-b") is not first
+
+  monkeypatch.setattr(rate_limiter, "_limiters", {})
+  monkeypatch.setattr(settings, "market_data_shared_rate_limit_enabled", False)
+  assert isinstance(get_vendor_rate_limiter("alpaca", "key-a"), LocalRateLimiter)
+
+
+@pytest.mark.asyncio
+async def test_redis_limiter_falls_back_to_local_bucket_when_redis_is_down() -> None:
+  limiter = RedisRateLimiter("alpaca", 600, "redis://127.0.0.1:1/0", "vibe:ratelimit:test", burst=2)
+
+  waits = [await limiter.acquire() for _ in range(3)]
+  await limiter.penalize(0.0)
+  stats = limiter.stats()
+
+  assert waits[:2] == [0.0, 0.0]
+  assert waits[2] > 0.0
+  assert stats["scope"] == "local_fallback"
+  assert stats["redis_errors"] == 1
+  assert stats["acquired"] == 3
+  assert stats["throttled"] == 1
+  assert stats["local"]["tokens"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_penalized_bucket_starts_empty_when_the_block_lifts(monkeypatch: pytest.MonkeyPatch) -> None:
+  clock = [100.0]
+  monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+  limiter = LocalRateLimiter("alpaca", 60, burst=5)
+
+  await limiter.penalize(10.0)
+  clock[0] = 109.0
+  assert limiter.stats()["tokens"] == 0.0
+  clock[0] = 112.0
+  # Two seconds past the block at one token per second, not a bucket refilled during the block.
+  assert limiter.stats()["tokens"] == 2.0
+
+
+class _FakeRedis:
+  def __init__(self, opened: list) -> None:
+    self.closed = False
+    opened.append(self)
+
+  async def __aenter__(self) -> _FakeRedis:
+    return self
+
+  async def __aexit__(self, *exc: object) -> None:
+    self.closed = True
+
+  async def eval(self, script: str, numkeys: int, *args: Any) -> list:
+    return [0, "1.0"]
+
+
+@pytest.mark.asyncio
+async def test_redis_limiter_closes_its_client_after_each_call(monkeypatch: pytest.MonkeyPatch) -> None:
+  opened: list[_FakeRedis] = []
+  monkeypatch.setattr(rate_limiter.redis, "from_url", lambda *a, **k: _FakeRedis(opened))
+  limiter = RedisRateLimiter("alpaca", 600, "redis://fake/0", "vibe:ratelimit:test", burst=2)
+
+  await limiter.acquire()
+  await limiter.penalize(1.0)
+
+  assert len(opened) == 2 and all(client.closed for client in opened)
+  assert limiter.stats()["scope"] == "redis"
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.core.config import settings
+from app.services.result_cache import claim_result_key, clone_run_results, result_key, wait_for_run
+
+_SPEC = {"universe": {"signal_symbol": "QQQ", "trade_symbol": "TQQQ"}, "dsl": {"a": 1, "b": 2}, "meta": {"llm_attempts": 1}}
+_AFTER_CLOSE = datetime(2024, 12, 3, 22, 0, tzinfo=timezone.utc)
+
+
+def test_result_key_ignores_meta_and_key_order_but_not_inputs() -> None:
+  key = result_key(_SPEC, "2024-01-02", "2024-06-28", provider_namespace="alpaca-iex", bar_minutes=1, now=_AFTER_CLOSE)
+  reordered = {"meta": {"llm_attempts": 3}, "dsl": {"b": 2, "a": 1}, "universe": _SPEC["universe"]}
+
+  assert result_key(reordered, "2024-01-02", "2024-06-28", provider_namespace="alpaca-iex", bar_minutes=1, now=_AFTER_CLOSE) == key
+  assert result_key(_SPEC, "2024-01-02", "2024-06-27", provider_namespace="alpaca-iex", bar_minutes=1, now=_AFTER_CLOSE) != key
+  assert result_key(_SPEC, "2024-01-02", "2024-06-28", provider_namespace="polygon", bar_minutes=1, now=_AFTER_CLOSE) != key
+  assert result_key(_SPEC, "2024-01-02", "2024-06-28", provider_namespace="alpaca-iex", bar_minutes=30, now=_AFTER_CLOSE) != key
+
+
+def test_result_key_for_open_ranges_follows_closed_sessions(monkeypatch: pytest.MonkeyPatch) -> None:
+  key = result_key(_SPEC, "2024-01-02", "2024-12-31", provider_namespace="alpaca-iex", bar_minutes=1, now=_AFTER_CLOSE)
+  # Same closed data an hour later; one more closed session the next evening.
+  assert result_key(_SPEC, "2024-01-02", "2024-12-31", provider_namespace="alpaca-iex", bar_minutes=1, now=datetime(2024, 12, 3, 23, 0, tzinfo=timezone.utc)) == key
+  assert result_key(_SPEC, "2024-01-02", "2024-12-31", provider_namespace="alpaca-iex", bar_minutes=1, now=datetime(2024, 12, 4, 22, 0, tzinfo=timezone.utc)) != key
+  monkeypatch.setattr(settings, "result_cache_version", "4")
+  assert result_key(_SPEC, "2024-01-02", "2024-12-31", provider_namespace="alpaca-iex", bar_minutes=1, now=_AFTER_CLOSE) != key
+
+
+class _Result:
+  def __init__(self, value: object) -> None:
+    self._value = value
+
+  def scalar_one_or_none(self) -> object:
+    return self._value
+
+  def one(self) -> object:
+    return self._value
+
+
+class _FakeDb:
+  def __init__(self, results: list[object]) -> None:
+    self._results = list(results)
+    self.statements: list[str] = []
+    self.commits = 0
+
+  async def execute(self, stmt: object, params: object = None) -> _Result:
+    self.statements.append(str(stmt.compile(dialect=asyncpg.dialect())))  # type: ignore[attr-defined]
+    return _Result(self._results.pop(0) if self._results else None)
+
+  async def commit(self) -> None:
+    self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_claim_prefers_completed_runs_then_live_leaders() -> None:
+  source = uuid.uuid4()
+  run = SimpleNamespace(id=uuid.uuid4(), result_key=None)
+
+  db = _FakeDb([None, source])
+  match = await claim_result_key(db, run, "ab" * 32)  # type: ignore[arg-type]
+  assert match is not None and match.run_id == source and match.completed
+  assert run.result_key == "ab" * 32 and db.commits == 1
+  assert db.statements[0].startswith("SELECT pg_advisory_xact_lock(")
+
+  db = _FakeDb([None, None, source])
+  match = await claim_result_key(db, run, "ab" * 32)  # type: ignore[arg-type]
+  assert match is not None and match.run_id == source and not match.completed
+  assert "run_steps.updated_at >=" in db.statements[2]
+
+  assert await claim_result_key(_FakeDb([]), run, "ab" * 32) is None  # type: ignore[arg-type]
+
+
+@pytest.mark.asyncio
+async def test_wait_for_run_stops_on_completion_failure_or_silence() -> None:
+  run_id = uuid.uuid4()
+  assert await wait_for_run(_FakeDb([("running", True), ("completed", True)]), run_id, timeout_seconds=5, poll_seconds=0)  # type: ignore[arg-type]
+  assert not await wait_for_run(_FakeDb([("running", True), ("failed", True)]), run_id, timeout_seconds=5, poll_seconds=0)  # type: ignore[arg-type]
+  assert not await wait_for_run(_FakeDb([("running", False)]), run_id, timeout_seconds=5, poll_seconds=0)  # type: ignore[arg-type]
+
+
+@pytest.mark.asyncio
+async def test_clone_copies_artifact_references_and_trades_server_side() -> None:
+  db = _FakeDb([])
+  await clone_run_results(db, uuid.uuid4(), uuid.uuid4())  # type: ignore[arg-type]
+  artifacts_sql, delete_sql, trades_sql = db.statements
+  assert artifacts_sql.lstrip().startswith("INSERT INTO run_artifacts") and "a.blob_hash, a.parts" in artifacts_sql
+  assert delete_sql.startswith("DELETE FROM trades")
+  assert trades_sql.lstrip().startswith("INSERT INTO trades")
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import orjson
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.services import artifact_store, run_service
+from app.services.artifact_store import ArtifactParts, blob_hash, load_artifact_contents
+
+
+class _Result:
+  def __init__(self, rows: list) -> None:
+    self._rows = rows
+
+  def scalars(self) -> "_Result":
+    return self
+
+  def all(self) -> list:
+    return self._rows
+
+
+class _FakeDb:
+  def __init__(self, stored: dict[str, object] | None = None) -> None:
+    self.stored = stored or {}
+    self.statements: list[tuple[str, dict]] = []
+    self.commits = 0
+
+  async def execute(self, stmt: object) -> _Result:
+    compiled = stmt.compile(dialect=asyncpg.dialect())  # type: ignore[attr-defined]
+    sql = str(compiled)
+    self.statements.append((sql, compiled.params))
+    if sql.startswith("SELECT artifact_blobs.hash, artifact_blobs.content"):
+      return _Result([(h, c, None) for h, c in self.stored.items()])
+    if sql.startswith("SELECT"):
+      return _Result(list(self.stored))
+    return _Result([])
+
+  async def commit(self) -> None:
+    self.commits += 1
+
+
+def _report_artifacts(trades: list[dict], kpis: dict) -> list[tuple]:
+  return [
+    ("report.json", "json", "/report", ArtifactParts({"kpis": kpis, "trades": trades})),
+    ("kpis.json", "json", "/kpis", ArtifactParts({"kpis": kpis})),
+    ("trades.csv", "csv", "/trades", ArtifactParts({"trades": trades})),
+    ("report.md", "markdown", "/md", {"markdown": "# r"}),
+    ("equity.png", "image", "/equity", None),
+  ]
+
+
+@pytest.mark.asyncio
+async def test_shared_values_are_stored_once_and_uploaded_concurrently(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "supabase_storage_upload_concurrency", 2)
+  monkeypatch.setattr(artifact_store, "storage_enabled", lambda: True)
+  in_flight = 0
+  peak = 0
+  uploads: dict[str, bytes] = {}
+
+  async def _upload(hash_: str, payload: bytes) -> str:
+    nonlocal in_flight, peak
+    uploads[hash_] = payload
+    in_flight += 1
+    peak = max(peak, in_flight)
+    await asyncio.sleep(0.01)
+    in_flight -= 1
+    return f"sb://bucket/blobs/{hash_}"
+
+  monkeypatch.setattr(artifact_store, "upload_blob", _upload)
+  trades = [{"fill_time": datetime(2024, 1, 2, 21, tzinfo=timezone.utc), "qty": np.float64(10.0)}]
+  kpis = {"return_pct": 1.5}
+  kpis_hash, trades_hash, md_hash = (blob_hash(dumps(v)) for v in (kpis, trades, {"markdown": "# r"}))
+  db = _FakeDb()
+
+  await run_service._upsert_artifacts(db, uuid.uuid4(), _report_artifacts(trades, kpis))  # type: ignore[arg-type,attr-defined]
+
+  # Five artifacts, three distinct values.
+  assert sorted(uploads) == sorted([kpis_hash, trades_hash, md_hash])
+  assert peak == 2
+  assert db.commits == 1
+  [select_sql, blobs_sql, artifacts_sql] = [sql for sql, _ in db.statements]
+  assert select_sql.startswith("SELECT artifact_blobs.hash")
+  assert blobs_sql.startswith("INSERT INTO artifact_blobs") and blobs_sql.endswith("ON CONFLICT (hash) DO NOTHING")
+  assert artifacts_sql.startswith("INSERT INTO run_artifacts")
+  params = db.statements[2][1]
+  assert params["parts_m0"] == {"kpis": kpis_hash, "trades": trades_hash}
+  assert params["parts_m1"] == {"kpis": kpis_hash}
+  assert params["parts_m2"] == {"trades": trades_hash}
+  assert params["blob_hash_m3"] == md_hash
+  assert params["blob_hash_m4"] is None and params["parts_m4"] is None
+
+  # Re-running identical work writes only the artifact rows.
+  uploads.clear()
+  rerun = _FakeDb(stored={kpis_hash: kpis, trades_hash: trades, md_hash: {"markdown": "# r"}})
+  await run_service._upsert_artifacts(rerun, uuid.uuid4(), _report_artifacts(trades, kpis))  # type: ignore[arg-type,attr-defined]
+  assert uploads == {}
+  assert len(rerun.statements) == 2
+  assert rerun.statements[1][0].startswith("INSERT INTO run_artifacts")
+
+
+@pytest.mark.asyncio
+async def test_inline_blobs_are_bound_straight_into_jsonb(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(artifact_store, "storage_enabled", lambda: False)
+  db = _FakeDb()
+
+  await run_service._upsert_artifact(  # type: ignore[attr-defined]
+    db,  # type: ignore[arg-type]
+    uuid.uuid4(),
+    "ai_summary.json",
+    "json",
+    "/ai_summary",
+    {"equity": np.array([1.0, np.nan]), "by_day": {1: np.float32(0.5)}, "at": datetime(2024, 1, 2, tzinfo=timezone.utc)},
+  )
+
+  sql, params = db.statements[1]
+  assert "CAST(convert_from($3::BYTEA, $4::VARCHAR) AS JSONB)" in sql
+  assert params["uri_m0"] is None
+  assert orjson.loads(params["param_1"]) == {"equity": [1.0, None], "by_day": {"1": 0.5}, "at": "2024-01-02T00:00:00+00:00"}
+
+
+@pytest.mark.asyncio
+async def test_artifacts_are_assembled_from_parts_on_read() -> None:
+  kpis = {"return_pct": 1.5}
+  trades = [{"qty": 10.0}]
+  kpis_hash, trades_hash = blob_hash(dumps(kpis)), blob_hash(dumps(trades))
+  db = _FakeDb(stored={kpis_hash: kpis, trades_hash: trades})
+  report = SimpleNamespace(content=None, uri="/report", blob_hash=None, parts={"kpis": kpis_hash, "trades": trades_hash})
+  kpis_art = SimpleNamespace(content=None, uri="/kpis", blob_hash=None, parts={"kpis": kpis_hash})
+  missing = SimpleNamespace(content=None, uri="/x", blob_hash="0" * 64, parts=None)
+  legacy = SimpleNamespace(content={"start_date": "2024-01-02"}, uri="/request", blob_hash=None, parts=None)
+
+  contents = await load_artifact_contents(db, [report, kpis_art, missing, legacy])  # type: ignore[arg-type]
+
+  assert contents == [{"kpis": kpis, "trades": trades}, {"kpis": kpis}, None, {"start_date": "2024-01-02"}]
+  assert len(db.statements) == 1
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.core.errors import AppError, RunCancelled
+from app.services.market_data import BAR_DTYPE, MarketDataProvider, fetch_bar_arrays
+from app.services import run_control
+from app.services.run_control import RunControl, request_cancel, run_deadline_seconds
+
+
+def test_deadline_scales_with_range_and_stays_under_job_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "run_deadline_base_seconds", 300)
+  monkeypatch.setattr(settings, "run_deadline_seconds_per_year", 300)
+  monkeypatch.setattr(settings, "task_queue_job_timeout_seconds", 7200)
+
+  one_year = run_deadline_seconds("2024-01-01", "2024-12-31")
+  assert 590 < one_year < 600
+  assert run_deadline_seconds("2024-01-01", "2024-01-01") == 300
+  assert run_deadline_seconds("1990-01-01", "2024-12-31") == 7140
+
+
+class _FakeRedis:
+  def __init__(self) -> None:
+    self.keys: set[str] = set()
+    self.polls = 0
+
+  async def set(self, key: str, value: str, ex: int) -> None:
+    self.keys.add(key)
+
+  async def exists(self, key: str) -> int:
+    self.polls += 1
+    return int(key in self.keys)
+
+  async def delete(self, key: str) -> None:
+    self.keys.discard(key)
+
+  async def aclose(self) -> None:
+    pass
+
+
+@pytest.mark.asyncio
+async def test_local_cancel_stops_the_run_at_its_next_check(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "task_queue_enabled", False)
+  run_id = uuid.uuid4()
+  control = RunControl(run_id, deadline_seconds=60)
+  await control.check()
+
+  await request_cancel(run_id)
+  with pytest.raises(RunCancelled) as exc:
+    await control.check()
+  assert exc.value.reason == "cancelled"
+
+  await control.close()
+  await RunControl(run_id, deadline_seconds=60).check()
+
+
+@pytest.mark.asyncio
+async def test_deadline_raises_without_any_request() -> None:
+  with pytest.raises(RunCancelled) as exc:
+    await RunControl(uuid.uuid4(), deadline_seconds=0).check()
+  assert exc.value.reason == "deadline"
+
+
+@pytest.mark.asyncio
+async def test_redis_flag_is_polled_at_most_once_per_interval(monkeypatch: pytest.MonkeyPatch) -> None:
+  fake = _FakeRedis()
+  monkeypatch.setattr(settings, "task_queue_enabled", True)
+  monkeypatch.setattr(run_control.redis, "from_url", lambda *_, **__: fake)
+  run_id = uuid.uuid4()
+  control = RunControl(run_id, deadline_seconds=60, poll_seconds=3600)
+
+  for _ in range(100):
+    await control.check()
+  assert fake.polls == 1
+
+  # Set by another process (the API): seen at the next poll.
+  fake.keys.add(f"vibe:run:cancel:{run_id}")
+  control = RunControl(run_id, deadline_seconds=60, poll_seconds=0)
+  with pytest.raises(RunCancelled):
+    await control.check()
+  await control.close()
+  assert fake.keys == set()
+
+
+@pytest.mark.asyncio
+async def test_queued_runs_are_cancelled_through_redis_only(monkeypatch: pytest.MonkeyPatch) -> None:
+  fake = _FakeRedis()
+  monkeypatch.setattr(settings, "task_queue_enabled", True)
+  monkeypatch.setattr(run_control.redis, "from_url", lambda *_, **__: fake)
+  run_id = uuid.uuid4()
+
+  await request_cancel(run_id)
+
+  assert fake.keys == {f"vibe:run:cancel:{run_id}"}
+  assert run_id not in run_control._local_cancels
+
+
+@pytest.mark.asyncio
+async def test_watch_interrupts_a_stage_stuck_between_checkpoints(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "task_queue_enabled", False)
+  run_id = uuid.uuid4()
+  control = RunControl(run_id, deadline_seconds=60, poll_seconds=0.01)
+  stuck = asyncio.ensure_future(asyncio.sleep(3600))
+
+  assert await control.watch(asyncio.sleep(0, result="done")) == "done"
+  asyncio.get_running_loop().call_later(0.05, lambda: asyncio.ensure_future(request_cancel(run_id)))
+  with pytest.raises(RunCancelled) as exc:
+    await asyncio.wait_for(control.watch(stuck), timeout=1)
+  assert exc.value.reason == "cancelled"
+  assert stuck.cancelled()
+  await control.close()
+
+
+class _SlowProvider(MarketDataProvider):
+  name = "slow"
+
+  def __init__(self) -> None:
+    self.calls = 0
+    self.release = asyncio.Event()
+
+  async def get_bar_array(self, symbol: str, start: datetime, end: datetime, minutes: int = 1) -> np.ndarray:
+    self.calls += 1
+    await self.release.wait()
+    return np.zeros(3, dtype=BAR_DTYPE)
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_run_leaves_a_shared_fetch_to_the_others(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "task_queue_enabled", False)
+  provider = _SlowProvider()
+  start, end = datetime(2024, 1, 2, tzinfo=timezone.utc), datetime(2024, 1, 3, tzinfo=timezone.utc)
+  a, b = (RunControl(uuid.uuid4(), deadline_seconds=60, poll_seconds=0.01) for _ in range(2))
+  run_a = asyncio.ensure_future(a.watch(fetch_bar_arrays(provider, ["QQQ"], start, end)))
+  run_b = asyncio.ensure_future(b.watch(fetch_bar_arrays(provider, ["QQQ"], start, end)))
+  await asyncio.sleep(0.02)
+
+  await request_cancel(a.run_id)
+  with pytest.raises(RunCancelled):
+    await run_a
+  provider.release.set()
+
+  assert (await run_b)["QQQ"].size == 3
+  assert provider.calls == 1
+  await a.close()
+  await b.close()
+
+
+@pytest.mark.asyncio
+async def test_watch_fails_a_stage_cancelled_from_elsewhere() -> None:
+  control = RunControl(uuid.uuid4(), deadline_seconds=60, poll_seconds=0.01)
+
+  async def _stage() -> None:
+    raise asyncio.CancelledError
+
+  with pytest.raises(AppError) as exc:
+    await control.watch(_stage())
+  assert exc.value.code == "INTERNAL"
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import orjson
+import pytest
+
+from app.core.config import settings
+from app.services import run_events
+from app.services.run_events import RunEventPublisher, RunEventSubscription
+from app.services.run_steps import StepStateBuffer
+
+from tests.test_run_steps import _FakeDb
+
+
+class _FakePubSub:
+  def __init__(self, messages: list[bytes | None]) -> None:
+    self.messages = messages
+    self.subscribed: list[str] = []
+    self.closed = False
+
+  async def subscribe(self, channel: str) -> None:
+    self.subscribed.append(channel)
+
+  async def unsubscribe(self, channel: str) -> None:
+    self.subscribed.remove(channel)
+
+  async def get_message(self, *, ignore_subscribe_messages: bool, timeout: float) -> dict | None:
+    data = self.messages.pop(0)
+    return None if data is None else {"type": "message", "data": data}
+
+  async def aclose(self) -> None:
+    self.closed = True
+
+
+class _FakeRedis:
+  def __init__(self, messages: list[bytes | None] | None = None) -> None:
+    self.published: list[tuple[str, dict]] = []
+    self.pubsub_ = _FakePubSub(messages or [])
+
+  async def ping(self) -> bool:
+    return True
+
+  async def publish(self, channel: str, payload: bytes) -> None:
+    self.published.append((channel, orjson.loads(payload)))
+
+  def pubsub(self) -> _FakePubSub:
+    return self.pubsub_
+
+  async def aclose(self) -> None:
+    pass
+
+
+@pytest.mark.asyncio
+async def test_step_changes_are_published_as_they_happen(monkeypatch: pytest.MonkeyPatch) -> None:
+  fake = _FakeRedis()
+  monkeypatch.setattr(run_events.redis, "from_url", lambda *_, **__: fake)
+  monkeypatch.setattr(settings, "run_events_progress_interval_ms", 60_000)
+  run_id = uuid.uuid4()
+  events = RunEventPublisher(run_id)
+  assert await events.connect()
+  db = _FakeDb()
+  steps = StepStateBuffer(run_id, flush_interval_seconds=60.0, publish=events.publish)
+  await steps.load(db)  # type: ignore[arg-type]
+
+  await steps.set(db, "parse", "RUNNING", {"msg": "start"})  # type: ignore[arg-type]
+  for done in range(1, 100):
+    await steps.progress(db, "backtest", {"msg": "Backtest progress", "kv": {"processed": done}})  # type: ignore[arg-type]
+
+  # Every change goes out immediately (progress throttled); only the transition hit Postgres.
+  assert [event for _, event in fake.published] == [
+    {"type": "step", "step_id": "parse", "state": "RUNNING", "log": {"msg": "start"}},
+    {"type": "progress", "step_id": "backtest", "log": {"msg": "Backtest progress", "kv": {"processed": 1}}},
+  ]
+  assert {channel for channel, _ in fake.published} == {f"vibe:run:events:{run_id}"}
+  assert db.commits == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_relays_events_after_the_snapshot_until_the_run_ends(monkeypatch: pytest.MonkeyPatch) -> None:
+  step = orjson.dumps({"type": "step", "step_id": "backtest", "state": "DONE", "log": {"msg": "Backtest completed"}})
+  done = orjson.dumps({"type": "run", "state": "completed"})
+  fake = _FakeRedis([step, None, done])
+  monkeypatch.setattr(run_events.redis, "from_url", lambda *_, **__: fake)
+  subscription = RunEventSubscription(uuid.uuid4())
+  await subscription.open()
+
+  frames = [frame async for frame in subscription.stream({"run_id": "r", "state": "running", "steps": [], "artifacts": []})]
+
+  assert frames[0].startswith(b"event: snapshot\ndata: {")
+  assert frames[1:] == [b"event: step\ndata: " + step + b"\n\n", b": keepalive\n\n", b"event: run\ndata: " + done + b"\n\n"]
+  assert fake.pubsub_.closed and fake.pubsub_.subscribed == []
+
+
+@pytest.mark.asyncio
+async def test_stream_of_a_finished_run_is_just_the_snapshot(monkeypatch: pytest.MonkeyPatch) -> None:
+  fake = _FakeRedis()
+  monkeypatch.setattr(run_events.redis, "from_url", lambda *_, **__: fake)
+  subscription = RunEventSubscription(uuid.uuid4())
+  await subscription.open()
+
+  frames = [frame async for frame in subscription.stream({"state": "cancelled"})]
+
+  assert frames == [b'event: snapshot\ndata: {"state":"cancelled"}\n\n']
+
+
+@pytest.mark.asyncio
+async def test_stream_closes_when_a_heartbeat_poll_finds_the_run_ended(monkeypatch: pytest.MonkeyPatch) -> None:
+  # The worker died without publishing; only the heartbeat re-read notices.
+  fake = _FakeRedis([None, None, None])
+  monkeypatch.setattr(run_events.redis, "from_url", lambda *_, **__: fake)
+  polls = [None, {"type": "stale", "state": "running"}]
+
+  async def _poll() -> dict | None:
+    return polls.pop(0)
+
+  subscription = RunEventSubscription(uuid.uuid4())
+  await subscription.open()
+
+  frames = [frame async for frame in subscription.stream({"state": "running"}, poll=_poll)]
+
+  assert frames[1:] == [b": keepalive\n\n", b'event: stale\ndata: {"type":"stale","state":"running"}\n\n']
+  assert fake.pubsub_.closed and len(fake.pubsub_.messages) == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_when_its_lifetime_is_up(monkeypatch: pytest.MonkeyPatch) -> None:
+  fake = _FakeRedis([None] * 5)
+  monkeypatch.setattr(run_events.redis, "from_url", lambda *_, **__: fake)
+  monkeypatch.setattr(settings, "run_events_stream_max_seconds", 0)
+  subscription = RunEventSubscription(uuid.uuid4())
+  await subscription.open()
+
+  frames = [frame async for frame in subscription.stream({"state": "running"})]
+
+  assert frames == [b'event: snapshot\ndata: {"state":"running"}\n\n']
+  assert fake.pubsub_.closed
+
+
+class _Scalar:
+  def __init__(self, value: Any) -> None:
+    self._value = value
+
+  def scalar_one_or_none(self) -> Any:
+    return self._value
+
+
+class _StateDb:
+  def __init__(self, state: str | None, last_step: datetime | None) -> None:
+    self._values = [state, last_step]
+
+  async def __aenter__(self) -> _StateDb:
+    return self
+
+  async def __aexit__(self, *exc: object) -> None:
+    pass
+
+  async def execute(self, stmt: object) -> _Scalar:
+    return _Scalar(self._values.pop(0))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+  ("state", "step_age_seconds", "expected"),
+  [
+    ("completed", None, {"type": "run", "state": "completed"}),
+    ("running", 10, None),
+    ("running", 600, {"type": "stale", "state": "running"}),
+    (None, None, {"type": "stale", "state": None}),
+  ],
+)
+async def test_poll_run_state_reports_ended_and_stale_runs(
+  monkeypatch: pytest.MonkeyPatch, state: str | None, step_age_seconds: int | None, expected: dict | None
+) -> None:
+  now = datetime(2024, 1, 2, 15, 0, tzinfo=timezone.utc)
+  last_step = None if step_age_seconds is None else now - timedelta(seconds=step_age_seconds)
+  monkeypatch.setattr(run_events, "SessionLocal", lambda: _StateDb(state, last_step))
+  monkeypatch.setattr(settings, "result_cache_stale_seconds", 120)
+
+  assert await run_events.poll_run_state(uuid.uuid4(), now=now) == expected
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from app.core.config import settings
+from app.core.errors import AppError
+from app.services import run_service
+
+
+class _Result:
+  def __init__(self, value: Any = None, rows: list | None = None) -> None:
+    self._value = value
+    self._rows = rows or []
+
+  def scalar_one_or_none(self) -> Any:
+    return self._value
+
+  def scalar_one(self) -> Any:
+    return self._value
+
+  def all(self) -> list:
+    return self._rows
+
+  def scalars(self) -> _Result:
+    return self
+
+
+class _Driver:
+  def __init__(self, db: _FakeDb) -> None:
+    self._db = db
+
+  async def copy_records_to_table(self, table: str, *, records: list, columns: tuple) -> None:
+    self._db.pending.append(("copy", len(records)))
+
+
+class _Raw:
+  def __init__(self, driver: _Driver) -> None:
+    self.driver_connection = driver
+
+
+class _Connection:
+  def __init__(self, driver: _Driver) -> None:
+    self._driver = driver
+
+  async def get_raw_connection(self) -> _Raw:
+    return _Raw(self._driver)
+
+
+class _FakeDb:
+  # Keeps the trades table as a row count with transaction semantics: changes land on commit.
+  def __init__(self, run: Any, strategy: Any) -> None:
+    self._run = run
+    self._strategy = strategy
+    self.trades = 0
+    self.pending: list[tuple[str, int]] = []
+
+  async def __aenter__(self) -> _FakeDb:
+    return self
+
+  async def __aexit__(self, *exc: object) -> None:
+    pass
+
+  async def connection(self) -> _Connection:
+    return _Connection(_Driver(self))
+
+  async def execute(self, stmt: object, params: object = None) -> _Result:
+    sql = str(stmt)
+    if sql.startswith("DELETE FROM trades"):
+      self.pending.append(("delete", 0))
+    elif "FROM runs" in sql:
+      return _Result(self._run)
+    elif "FROM strategies" in sql:
+      return _Result(self._strategy)
+    elif "FROM run_steps" in sql:
+      return _Result(rows=[(step_id, "PENDING", None) for step_id in run_service.STEP_LABELS])
+    return _Result()
+
+  async def commit(self) -> None:
+    for op, n in self.pending:
+      self.trades = 0 if op == "delete" else self.trades + n
+    self.pending.clear()
+
+  async def rollback(self) -> None:
+    self.pending.clear()
+
+
+def _trade() -> dict[str, Any]:
+  at = datetime(2024, 1, 2, 21, 0, tzinfo=timezone.utc)
+  return {"decision_time": at, "fill_time": at, "symbol": "QQQ", "side": "BUY", "qty": 1.0, "fill_price": 400.0, "cost": {}, "why": {}}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [AppError("DATA_UNAVAILABLE", "No bars returned"), RuntimeError("boom")])
+async def test_failed_run_drops_trades_written_before_the_failure(monkeypatch: pytest.MonkeyPatch, error: Exception) -> None:
+  run = SimpleNamespace(id=uuid.uuid4(), state="running", mode="BACKTEST_ONLY", error=None, strategy_id=uuid.uuid4())
+  strategy = SimpleNamespace(spec={}, strategy_version="v0", prompt="", name="s")
+  db = _FakeDb(run, strategy)
+  monkeypatch.setattr(run_service, "SessionLocal", lambda: db)
+  monkeypatch.setattr(settings, "result_cache_enabled", False)
+  monkeypatch.setattr(settings, "run_events_enabled", False)
+  monkeypatch.setattr(settings, "task_queue_enabled", False)
+  # Every progress update flushes the step buffer, committing the trades written so far.
+  monkeypatch.setattr(settings, "run_step_flush_interval_ms", 0)
+
+  calls: list[dict] = []
+
+  async def _engine(spec: dict, *, progress_hook: Any, trade_hook: Any, **_: Any) -> None:
+    await trade_hook([_trade(), _trade()])
+    await progress_hook(1, 2, datetime(2024, 1, 2, 21, 0, tzinfo=timezone.utc))
+    assert db.trades == 2
+    calls.append(spec)
+    raise error
+
+  monkeypatch.setattr(run_service, "run_backtest_from_spec", _engine)
+
+  await run_service.execute_run(run.id)
+
+  assert calls and run.state == "failed"
+  assert db.trades == 0
+
+
+@pytest.mark.asyncio
+async def test_interrupted_run_is_marked_failed_before_the_cancellation_propagates(monkeypatch: pytest.MonkeyPatch) -> None:
+  run = SimpleNamespace(id=uuid.uuid4(), state="running", mode="BACKTEST_ONLY", error=None, strategy_id=uuid.uuid4())
+  db = _FakeDb(run, SimpleNamespace(spec={}, strategy_version="v0", prompt="", name="s"))
+  monkeypatch.setattr(run_service, "SessionLocal", lambda: db)
+  monkeypatch.setattr(settings, "result_cache_enabled", False)
+  monkeypatch.setattr(settings, "run_events_enabled", False)
+  monkeypatch.setattr(settings, "task_queue_enabled", False)
+  monkeypatch.setattr(settings, "run_step_flush_interval_ms", 0)
+  started = asyncio.Event()
+
+  async def _engine(spec: dict, *, progress_hook: Any, trade_hook: Any, **_: Any) -> None:
+    await trade_hook([_trade()])
+    await progress_hook(1, 2, datetime(2024, 1, 2, 21, 0, tzinfo=timezone.utc))
+    started.set()
+    await asyncio.sleep(3600)
+
+  monkeypatch.setattr(run_service, "run_backtest_from_spec", _engine)
+
+  task = asyncio.ensure_future(run_service.execute_run(run.id))
+  await started.wait()
+  task.cancel()
+  with pytest.raises(asyncio.CancelledError):
+    await task
+
+  assert run.state == "failed" and run.error["message"] == "Run was interrupted"
+  assert db.trades == 0
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import uuid
+
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.services.run_steps import StepStateBuffer
+
+
+class _Rows:
+  def __init__(self, rows: list[tuple]) -> None:
+    self._rows = rows
+
+  def all(self) -> list[tuple]:
+    return self._rows
+
+
+class _FakeDb:
+  def __init__(self) -> None:
+    self.statements: list[str] = []
+    self.commits = 0
+
+  async def execute(self, stmt: object, params: object = None) -> _Rows:
+    sql = str(stmt.compile(dialect=asyncpg.dialect()))  # type: ignore[attr-defined]
+    self.statements.append(sql)
+    if sql.startswith("SELECT"):
+      return _Rows([("parse", "PENDING", None), ("backtest", "RUNNING", "Backtest progress")])
+    return _Rows([])
+
+  async def commit(self) -> None:
+    self.commits += 1
+
+
+@pytest.mark.asyncio
+async def test_step_buffer_flushes_transitions_and_ships_only_new_log_entries() -> None:
+  db = _FakeDb()
+  steps = StepStateBuffer(uuid.uuid4(), flush_interval_seconds=60.0)
+  await steps.load(db)  # type: ignore[arg-type]
+
+  await steps.set(db, "parse", "RUNNING", {"msg": "start"})  # type: ignore[arg-type]
+  await steps.set(db, "parse", "RUNNING", {"msg": "artifact"})  # type: ignore[arg-type]
+  for done in range(1, 200):
+    await steps.progress(db, "backtest", {"msg": "Backtest progress", "kv": {"processed": done}})  # type: ignore[arg-type]
+  assert (steps.flushes, db.commits) == (1, 1)
+  # The stored progress line is replaced server-side by the latest one; nothing else is resent.
+  assert steps.pending_changes() == [
+    {"step_id": "backtest", "state": "RUNNING", "replace_msg": "Backtest progress", "append": [{"msg": "Backtest progress", "kv": {"processed": 199}}]},
+    {"step_id": "parse", "state": "RUNNING", "replace_msg": None, "append": [{"msg": "artifact"}]},
+  ]
+
+  await steps.set(db, "parse", "DONE", {"msg": "ready"})  # type: ignore[arg-type]
+
+  assert (steps.flushes, db.commits) == (2, 2)
+  assert steps.pending_changes() == []
+  update = db.statements[-1]
+  assert update.lstrip().startswith("UPDATE run_steps AS s")
+  assert "jsonb_to_recordset($2::JSONB)" in update
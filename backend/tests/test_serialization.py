@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.core.serialization import dumps, loads
+
+
+class _Model(BaseModel):
+  at: datetime
+
+
+def test_dumps_matches_jsonable_encoder_for_report_values() -> None:
+  value = {
+    "t": datetime(2024, 1, 2, 21, 0, tzinfo=timezone.utc),
+    "d": date(2024, 1, 2),
+    "id": uuid.UUID(int=1),
+    "px": np.float64(1.25),
+    "dec": Decimal("2.5"),
+    "model": _Model(at=datetime(2024, 1, 2, tzinfo=timezone.utc)),
+  }
+  assert loads(dumps(value)) == jsonable_encoder(value)
+
+
+def test_dumps_covers_numpy_int_keys_and_non_finite_floats() -> None:
+  # jsonable_encoder rejects numpy integers; these used to need manual float()/int() casts.
+  value = {"equity": np.array([1.0, np.nan]), 5: {"x": float("inf")}, "qty": np.int64(3), "tags": {"a"}, "ts": np.datetime64("2024-01-02T00:00")}
+  assert loads(dumps(value)) == {"equity": [1.0, None], "5": {"x": None}, "qty": 3, "tags": ["a"], "ts": "2024-01-02T00:00:00"}
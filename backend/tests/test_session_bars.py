@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.db.models import SessionBar
+from app.services.backtest_engine import run_backtest_from_spec
+from app.services.market_data import NS_PER_MINUTE, SyntheticProvider, from_epoch_ns, resample_bars, select_windows
+from app.services.session_bars import (
+  SessionFrame,
+  SessionSchedule,
+  _frame_from_rows,
+  build_session_schedule,
+  refresh_session_bars,
+  session_bar_rows,
+  session_edge_windows,
+  summarize_sessions,
+)
+from tests.test_backtest_engine import _minimal_strategy_spec
+
+
+async def _synthetic_frame(symbol: str, schedule: SessionSchedule) -> SessionFrame:
+  start = from_epoch_ns(int(schedule.opens_ns[0]))
+  end = from_epoch_ns(int(schedule.closes_ns[-1]))
+  bars = await SyntheticProvider().get_minute_bar_array(symbol, start, end)
+  return summarize_sessions(bars, schedule)
+
+
+@pytest.mark.asyncio
+async def test_summarize_sessions_splits_half_days_into_one_segment() -> None:
+  schedule = build_session_schedule("2024-11-27", "2024-12-02")
+  frame = await _synthetic_frame("QQQ", schedule)
+
+  assert schedule.dates == [date(2024, 11, 27), date(2024, 11, 29), date(2024, 12, 2)]
+  assert frame.day.has.all() and frame.has_decision.all()
+  assert frame.segments[0].has.tolist() == [True, True, True]
+  assert frame.segments[1].has.tolist() == [True, False, True]
+  assert np.allclose(frame.segments[1].c[[0, 2]], frame.day.c[[0, 2]])
+  assert np.allclose(frame.segments[0].c[1], frame.day.c[1])
+
+
+@pytest.mark.asyncio
+async def test_coarse_sessions_with_edge_minutes_match_the_minute_path() -> None:
+  # A full day, a half day (13:00 close) and a full day again.
+  schedule = build_session_schedule("2024-11-27", "2024-12-02")
+  start, end = from_epoch_ns(int(schedule.opens_ns[0])), from_epoch_ns(int(schedule.closes_ns[-1]))
+  session = await SyntheticProvider().get_minute_bar_array("QQQ", start, end)
+  # Vendor minute data carries the closing cross bar stamped at the close and after-hours bars.
+  after = np.zeros(3 * len(schedule.dates), dtype=session.dtype)
+  after["ts"] = (schedule.closes_ns[:, None] + np.arange(3) * NS_PER_MINUTE).ravel()
+  after["o"] = after["h"] = after["l"] = after["c"] = np.tile([500.0, 600.0, 700.0], len(schedule.dates))
+  after["v"] = 10.0
+  bars = np.concatenate([session, after])
+  bars = bars[np.argsort(bars["ts"], kind="stable")]
+  # No print at the first decision minute: the price is the minute before it.
+  bars = bars[bars["ts"] != schedule.decision_ns[0]]
+
+  minute = summarize_sessions(bars, schedule)
+  edges = select_windows(bars, session_edge_windows(schedule, 30))
+  coarse = summarize_sessions(resample_bars(bars, 30), schedule, bar_minutes=30, edges=edges)
+
+  assert minute.day.c.tolist() == [500.0, 500.0, 500.0]
+  for got, want in [(coarse.day, minute.day), *zip(coarse.segments, minute.segments)]:
+    for field in ("has", "o", "h", "l", "c", "v"):
+      assert np.array_equal(getattr(got, field), getattr(want, field), equal_nan=True), field
+  assert np.array_equal(coarse.has_decision, minute.has_decision)
+  assert np.array_equal(coarse.decision_close, minute.decision_close)
+  assert edges.size < bars.size / 2
+
+
+@pytest.mark.asyncio
+async def test_stored_rows_round_trip_and_detect_incomplete_ranges() -> None:
+  schedule = build_session_schedule("2024-11-27", "2024-12-02")
+  frame = await _synthetic_frame("QQQ", schedule)
+  rows = [SessionBar(**row) for row in session_bar_rows("synthetic", "QQQ", schedule, frame)]
+
+  loaded = _frame_from_rows(rows, schedule)
+
+  assert loaded is not None
+  assert np.array_equal(loaded.day.c, frame.day.c)
+  assert np.array_equal(loaded.decision_close, frame.decision_close)
+  assert np.array_equal(loaded.segments[1].has, frame.segments[1].has)
+  assert _frame_from_rows([r for r in rows if r.session_date != date(2024, 11, 29)], schedule) is None
+
+
+class _MemoryStore:
+  def __init__(self, frames: dict[str, SessionFrame]) -> None:
+    self.frames = frames
+
+  async def load(self, source: str, symbol: str, schedule: SessionSchedule) -> SessionFrame | None:
+    return self.frames.get(symbol)
+
+
+@pytest.mark.asyncio
+async def test_engine_reads_materialized_session_bars(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "market_data_provider", "synthetic")
+  spec = _minimal_strategy_spec()
+  computed = await run_backtest_from_spec(spec, start_date="2024-01-02", end_date="2024-01-31")
+
+  schedule = build_session_schedule("2024-01-02", "2024-01-31")
+  frames = {}
+  for symbol in ("QQQ", "TQQQ"):
+    rows = session_bar_rows("synthetic", symbol, schedule, await _synthetic_frame(symbol, schedule))
+    frames[symbol] = _frame_from_rows([SessionBar(**r) for r in rows], schedule)
+  materialized = await run_backtest_from_spec(spec, start_date="2024-01-02", end_date="2024-01-31", session_bar_store=_MemoryStore(frames))
+
+  assert materialized.artifacts["data_health"]["session_bars"] == "materialized"
+  assert materialized.trades == computed.trades
+  assert materialized.market == computed.market
+
+
+class _RowStore:
+  def __init__(self) -> None:
+    self.rows: dict[tuple[date, str, int], dict] = {}
+
+  async def last_session_date(self, source: str, symbol: str) -> date | None:
+    return max((d for d, _, _ in self.rows), default=None)
+
+  async def upsert(self, rows: list[dict]) -> int:
+    self.rows.update({(r["session_date"], r["timeframe"], r["seq"]): r for r in rows})
+    return len(rows)
+
+
+class _BackfillingProvider:
+  # Minute bars whose newest session stops at midday until the vendor catches up.
+  name = "test"
+  cache_namespace = "test"
+
+  def __init__(self) -> None:
+    self.cut_ns: int | None = None
+    self.starts: list[date] = []
+    self.bars = np.empty(0)
+
+  async def get_minute_bar_array(self, symbol: str, start: datetime, end: datetime) -> np.ndarray:
+    self.starts.append(start.date())
+    bars = await SyntheticProvider().get_minute_bar_array(symbol, start, end)
+    self.bars = bars if self.cut_ns is None else bars[bars["ts"] < self.cut_ns]
+    return self.bars
+
+
+@pytest.mark.asyncio
+async def test_truncated_last_session_is_rewritten_on_the_next_refresh(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "session_bars_backfill_start", "2024-12-02")
+  now = datetime(2024, 12, 6, 23, 0, tzinfo=timezone.utc)
+  store, provider = _RowStore(), _BackfillingProvider()
+
+  provider.cut_ns = int(build_session_schedule("2024-12-06", "2024-12-06").split_ns[0])
+  await refresh_session_bars(store, provider, "QQQ", now=now)  # type: ignore[arg-type]
+  assert sorted({d for d, _, _ in store.rows}) == [date(2024, 12, d) for d in (2, 3, 4, 5)]
+
+  provider.cut_ns = None
+  await refresh_session_bars(store, provider, "QQQ", now=now)  # type: ignore[arg-type]
+  # Starts three sessions back from the newest stored one.
+  assert provider.starts == [date(2024, 12, 2), date(2024, 12, 3)]
+  assert store.rows[(date(2024, 12, 6), "1d", 0)]["c"] == float(provider.bars["c"][-1])
+
+
+@pytest.mark.asyncio
+async def test_first_refresh_backfills_only_from_the_triggering_run(monkeypatch: pytest.MonkeyPatch) -> None:
+  monkeypatch.setattr(settings, "session_bars_backfill_start", "2019-01-01")
+  store, provider = _RowStore(), _BackfillingProvider()
+
+  await refresh_session_bars(store, provider, "QQQ", since=date(2024, 12, 4), now=datetime(2024, 12, 6, 23, 0, tzinfo=timezone.utc))  # type: ignore[arg-type]
+
+  assert provider.starts == [date(2024, 12, 4)]
+  assert sorted({d for d, _, _ in store.rows}) == [date(2024, 12, 4), date(2024, 12, 5), date(2024, 12, 6)]
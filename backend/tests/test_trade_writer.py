@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import orjson
+import pytest
+
+from app.services.trade_writer import COLUMNS, TradeWriter, copy_trade_records, trade_records
+
+
+def _trades(n: int) -> list[dict]:
+  at = datetime(2024, 1, 2, 21, 0, tzinfo=timezone.utc)
+  return [
+    {
+      "decision_time": at,
+      "fill_time": at,
+      "symbol": "QQQ",
+      "side": "SELL",
+      "qty": np.float64(10),
+      "fill_price": 400.5,
+      "cost": {"slippage_bps": 1.0},
+      "why": {"rule_id": "r1", "indicators": {"rsi": np.float64(71.5), "ma": None}},
+    }
+    for _ in range(n)
+  ]
+
+
+class _Driver:
+  def __init__(self) -> None:
+    self.copies: list[tuple[str, list, tuple]] = []
+
+  async def copy_records_to_table(self, table: str, *, records: list, columns: tuple) -> None:
+    self.copies.append((table, records, columns))
+
+
+class _Raw:
+  def __init__(self, driver: object) -> None:
+    self.driver_connection = driver
+
+
+class _Connection:
+  def __init__(self, driver: object) -> None:
+    self._driver = driver
+
+  async def get_raw_connection(self) -> _Raw:
+    return _Raw(self._driver)
+
+
+class _FakeDb:
+  def __init__(self, driver: object) -> None:
+    self._driver = driver
+    self.executes: list[tuple[str, object]] = []
+
+  async def connection(self) -> _Connection:
+    return _Connection(self._driver)
+
+  async def execute(self, stmt: object, params: object = None) -> None:
+    self.executes.append((str(stmt), params))
+
+
+def test_records_carry_preserialized_json() -> None:
+  run_id = uuid.uuid4()
+  [record] = trade_records(run_id, _trades(1))
+  row = dict(zip(COLUMNS, record))
+  assert row["run_id"] == run_id
+  assert row["action_id"] == "sell_trade_symbol_partial"
+  assert row["qty"] == 10.0 and type(row["qty"]) is float
+  assert orjson.loads(row["why"]) == {"rule_id": "r1", "indicators": {"rsi": 71.5, "ma": None}}
+
+
+@pytest.mark.asyncio
+async def test_writer_copies_batches_after_clearing_the_run() -> None:
+  driver = _Driver()
+  db = _FakeDb(driver)
+  writer = TradeWriter(uuid.uuid4())
+
+  await writer.clear(db)  # type: ignore[arg-type]
+  await writer.write(db, _trades(3))  # type: ignore[arg-type]
+  await writer.write(db, _trades(2))  # type: ignore[arg-type]
+
+  assert writer.written == 5
+  assert [len(records) for _, records, _ in driver.copies] == [3, 2]
+  assert {(table, columns) for table, _, columns in driver.copies} == {("trades", COLUMNS)}
+  [(sql, _)] = db.executes
+  assert sql.startswith("DELETE FROM trades")
+
+
+@pytest.mark.asyncio
+async def test_copy_falls_back_to_chunked_inserts(monkeypatch: pytest.MonkeyPatch) -> None:
+  from app.services import trade_writer
+
+  monkeypatch.setattr(trade_writer, "_INSERT_CHUNK", 2)
+  db = _FakeDb(object())
+
+  method = await copy_trade_records(db, trade_records(uuid.uuid4(), _trades(5)))  # type: ignore[arg-type]
+
+  assert method == "insert"
+  assert [len(params) for _, params in db.executes] == [2, 2, 1]  # type: ignore[arg-type]
+  sql = db.executes[0][0]
+  assert sql.startswith("INSERT INTO trades (id, run_id, action_id")
+  assert "CAST(:why AS JSONB)" in sql
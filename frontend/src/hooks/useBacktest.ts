@@ -48,6 +48,7 @@ const POLL_INTERVAL_FALLBACK = 12000;
 const POLL_INTERVAL_MAX = 20000;
 const POLL_INTERVAL_REALTIME_HEARTBEAT = 30000;
 const RUN_REALTIME_ENABLED = ((import.meta as any).env?.VITE_RUN_REALTIME_ENABLED ?? "true") !== "false";
+const RUN_EVENTS_ENABLED = ((import.meta as any).env?.VITE_RUN_EVENTS_ENABLED ?? "true") !== "false";
 const DEFAULT_INDICATOR_PREFERENCES: api.IndicatorPreferences = {
   indicatorKinds: ["MA", "MACD"],
   maWindowDays: 5,
@@ -111,10 +112,15 @@ export function useBacktest(): UseBacktestReturn {
   const inFlightRef = useRef(false);
   const errorStreakRef = useRef(0);
   const realtimeSubscribedRef = useRef(false);
+  const eventsAbortRef = useRef<AbortController | null>(null);
+  const eventsStreamingRef = useRef(false);
 
   useEffect(() => {
     return () => {
       if (pollingRef.current) clearTimeout(pollingRef.current);
+      eventsAbortRef.current?.abort();
+      eventsAbortRef.current = null;
+      eventsStreamingRef.current = false;
       if (realtimeRef.current) {
         void supabase.removeChannel(realtimeRef.current);
         realtimeRef.current = null;
@@ -131,6 +137,12 @@ export function useBacktest(): UseBacktestReturn {
     realtimeSubscribedRef.current = false;
   }, []);
 
+  const stopEvents = useCallback(() => {
+    eventsAbortRef.current?.abort();
+    eventsAbortRef.current = null;
+    eventsStreamingRef.current = false;
+  }, []);
+
   const stopPolling = useCallback(() => {
     if (pollingRef.current) {
       clearTimeout(pollingRef.current);
@@ -141,13 +153,16 @@ export function useBacktest(): UseBacktestReturn {
   }, []);
 
   const pollStatus = useCallback(
-    async (rid: string, source: "start" | "realtime" | "poll" = "poll") => {
-      if (inFlightRef.current) return;
-      inFlightRef.current = true;
+    async (rid: string, source: "start" | "realtime" | "poll" | "stream" = "poll", streamed?: RunStatusResponse) => {
+      // Streamed statuses need no request, so they never wait on one in flight.
+      if (!streamed) {
+        if (inFlightRef.current) return;
+        inFlightRef.current = true;
+      }
       let nextDelay = source === "start" ? POLL_INTERVAL_INITIAL : POLL_INTERVAL_FALLBACK;
       let shouldContinue = true;
       try {
-        const statusData = await api.getRunStatus(rid);
+        const statusData = streamed ?? (await api.getRunStatus(rid));
         if (currentRunIdRef.current !== rid) return;
         errorStreakRef.current = 0;
 
@@ -201,6 +216,7 @@ export function useBacktest(): UseBacktestReturn {
           setStatusMessage("Backtest completed successfully");
           stopPolling();
           stopRealtime();
+          stopEvents();
           shouldContinue = false;
 
           try {
@@ -216,6 +232,7 @@ export function useBacktest(): UseBacktestReturn {
           setArtifacts(statusData.artifacts);
           stopPolling();
           stopRealtime();
+          stopEvents();
           shouldContinue = false;
           const failedStep = statusData.steps.find((s) => s.status === "error");
           const errorMsg = failedStep
@@ -230,12 +247,12 @@ export function useBacktest(): UseBacktestReturn {
         nextDelay = backoff;
         console.error("Polling error:", e);
       } finally {
-        inFlightRef.current = false;
+        if (!streamed) inFlightRef.current = false;
         if (shouldContinue && currentRunIdRef.current === rid) {
           if (pollingRef.current) {
             clearTimeout(pollingRef.current);
           }
-          const realtimeHealthy = RUN_REALTIME_ENABLED && realtimeSubscribedRef.current;
+          const realtimeHealthy = (RUN_REALTIME_ENABLED && realtimeSubscribedRef.current) || eventsStreamingRef.current;
           const scheduleDelay = realtimeHealthy ? Math.max(nextDelay, POLL_INTERVAL_REALTIME_HEARTBEAT) : nextDelay;
           pollingRef.current = setTimeout(() => {
             void pollStatus(rid, "poll");
@@ -243,7 +260,7 @@ export function useBacktest(): UseBacktestReturn {
         }
       }
     },
-    [stopPolling, stopRealtime]
+    [stopEvents, stopPolling, stopRealtime]
   );
 
   const subscribeRealtime = useCallback(
@@ -290,13 +307,51 @@ export function useBacktest(): UseBacktestReturn {
     [pollStatus, stopRealtime]
   );
 
+  const subscribeEvents = useCallback(
+    (rid: string) => {
+      stopEvents();
+      const controller = new AbortController();
+      eventsAbortRef.current = controller;
+      api
+        .streamRunStatus(
+          rid,
+          (statusData) => {
+            if (currentRunIdRef.current !== rid) return;
+            eventsStreamingRef.current = true;
+            void pollStatus(rid, "stream", statusData);
+          },
+          controller.signal
+        )
+        .catch((e) => {
+          if (controller.signal.aborted || currentRunIdRef.current !== rid) return;
+          // No event stream (disabled or unreachable): fall back to Realtime + polling.
+          console.error("Run event stream error:", e);
+          subscribeRealtime(rid);
+          void pollStatus(rid, "start");
+        })
+        .finally(() => {
+          if (eventsAbortRef.current === controller) {
+            eventsAbortRef.current = null;
+            eventsStreamingRef.current = false;
+          }
+        });
+    },
+    [pollStatus, stopEvents, subscribeRealtime]
+  );
+
   const startTracking = useCallback(
     (rid: string) => {
       stopPolling();
+      if (RUN_EVENTS_ENABLED) {
+        // The stream opens with a snapshot, so no initial status poll is needed.
+        stopRealtime();
+        subscribeEvents(rid);
+        return;
+      }
       subscribeRealtime(rid);
       void pollStatus(rid, "start");
     },
-    [pollStatus, stopPolling, subscribeRealtime]
+    [pollStatus, stopPolling, stopRealtime, subscribeEvents, subscribeRealtime]
   );
 
   const runBacktest = useCallback(async () => {
@@ -366,6 +421,7 @@ export function useBacktest(): UseBacktestReturn {
   const revisePrompt = useCallback(() => {
     stopPolling();
     stopRealtime();
+    stopEvents();
     setStatus("idle");
     setRunId(null);
     setStrategyId(null);
@@ -377,7 +433,7 @@ export function useBacktest(): UseBacktestReturn {
     setActiveRunWindow(null);
     setError(null);
     setStatusMessage("");
-  }, [stopPolling, stopRealtime]);
+  }, [stopEvents, stopPolling, stopRealtime]);
 
   const deploy = useCallback(
     async (mode: "paper" | "live"): Promise<api.DeployResponse> => {
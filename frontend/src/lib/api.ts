@@ -246,7 +246,11 @@ type V0WorkspaceStepState = "PENDING" | "RUNNING" | "DONE" | "FAILED" | "SKIPPED
 type V0LogEntry = { ts: string; level: "DEBUG" | "INFO" | "WARN" | "ERROR"; msg: string; kv?: Record<string, unknown> };
 type V0WorkspaceStep = { id: "parse" | "plan" | "data" | "backtest" | "report" | "deploy"; state: V0WorkspaceStepState; label: string; logs: V0LogEntry[] };
 type V0ArtifactRef = { id: string; type: "json" | "markdown" | "image" | "csv" | "binary"; name: string; uri: string };
-type V0RunStatusResponse = { run_id: string; state: "running" | "completed" | "failed"; steps: V0WorkspaceStep[]; artifacts: V0ArtifactRef[] };
+type V0RunStatusResponse = { run_id: string; state: "running" | "completed" | "failed" | "cancelled"; steps: V0WorkspaceStep[]; artifacts: V0ArtifactRef[] };
+type V0RunEvent =
+  | { type: "step"; step_id: V0WorkspaceStep["id"]; state: V0WorkspaceStepState; log?: V0LogEntry | null }
+  | { type: "progress"; step_id: V0WorkspaceStep["id"]; log: V0LogEntry }
+  | { type: "run"; state: V0RunStatusResponse["state"] };
 type V0BacktestReportResponse = {
   kpis: {
     return_pct: number;
@@ -385,17 +389,15 @@ export async function createRun(prompt: string, options?: CreateRunOptions): Pro
   return { runId: data.run_id };
 }
 
-export async function getRunStatus(runId: string): Promise<RunStatusResponse> {
-  const res = await apiFetch(`/api/runs/${runId}/status`, undefined, { timeoutMs: 20000 });
-  if (!res.ok) throw new Error(await parseApiErrorMessage(res, "Failed to get status"));
-  const data = (await res.json()) as V0RunStatusResponse;
+function mapV0RunStatus(runId: string, data: V0RunStatusResponse): RunStatusResponse {
   const dslUri = findArtifactUri(data.artifacts, "dsl.json");
   const reportUrl = `${baseUrl}/api/runs/${runId}/artifacts/report.json?download=true`;
   const tradesCsvUrl = `${baseUrl}/api/runs/${runId}/artifacts/trades.csv?download=true`;
   const steps = data.steps.map(mapV0StepToStepInfo);
   return {
     runId: data.run_id,
-    state: data.state,
+    // A cancelled run ends like a failed one in the UI.
+    state: data.state === "cancelled" ? "failed" : data.state,
     steps,
     artifacts: {
       dsl: dslUri ? toAbsoluteApiUrl(dslUri) : "",
@@ -405,6 +407,76 @@ export async function getRunStatus(runId: string): Promise<RunStatusResponse> {
   };
 }
 
+export async function getRunStatus(runId: string): Promise<RunStatusResponse> {
+  const res = await apiFetch(`/api/runs/${runId}/status`, undefined, { timeoutMs: 20000 });
+  if (!res.ok) throw new Error(await parseApiErrorMessage(res, "Failed to get status"));
+  return mapV0RunStatus(runId, (await res.json()) as V0RunStatusResponse);
+}
+
+function applyV0RunEvent(snapshot: V0RunStatusResponse, event: V0RunEvent): V0RunStatusResponse {
+  if (event.type === "run") return { ...snapshot, state: event.state };
+  const steps = snapshot.steps.map((step) => {
+    if (step.id !== event.step_id) return step;
+    const logs = [...step.logs];
+    if (event.type === "progress") {
+      // The live progress line is replaced in place, as the backend stores it.
+      if (logs.length > 0 && logs[logs.length - 1].msg === event.log.msg) {
+        logs[logs.length - 1] = event.log;
+      } else {
+        logs.push(event.log);
+      }
+      return { ...step, logs };
+    }
+    if (event.log) logs.push(event.log);
+    return { ...step, state: event.state, logs };
+  });
+  return { ...snapshot, steps };
+}
+
+// Follows GET /api/runs/{id}/events: a snapshot, then step/progress/run events applied to it.
+// Resolves once the run has finished (or the stream closes); rejects if the stream is unavailable.
+export async function streamRunStatus(runId: string, onStatus: (status: RunStatusResponse) => void, signal: AbortSignal): Promise<void> {
+  const headers = await buildHeaders({ Accept: "text/event-stream" });
+  const res = await fetch(`${baseUrl}/api/runs/${runId}/events`, { headers, signal });
+  if (!res.ok || !res.body) throw new Error(await parseApiErrorMessage(res, "Failed to stream run events"));
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  let snapshot: V0RunStatusResponse | null = null;
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += value;
+    let end = buffer.indexOf("\n\n");
+    while (end >= 0) {
+      const frame = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      end = buffer.indexOf("\n\n");
+      let event = "message";
+      const data: string[] = [];
+      for (const line of frame.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data.push(line.slice(6));
+      }
+      if (data.length === 0) continue;
+      const payload = JSON.parse(data.join("\n"));
+      if (event === "snapshot") {
+        snapshot = payload as V0RunStatusResponse;
+      } else if (snapshot) {
+        snapshot = applyV0RunEvent(snapshot, payload as V0RunEvent);
+      } else {
+        continue;
+      }
+      if (snapshot.state !== "running") {
+        // Artifacts are not streamed; one status read picks up the final list.
+        onStatus(await getRunStatus(runId));
+        await reader.cancel();
+        return;
+      }
+      onStatus(mapV0RunStatus(runId, snapshot));
+    }
+  }
+}
+
 export async function getRunReport(runId: string): Promise<RunReportResponse> {
   const res = await apiFetch(`/api/runs/${runId}/report`, undefined, { timeoutMs: 30000 });
   if (!res.ok) throw new Error(await parseApiErrorMessage(res, "Failed to get report"));